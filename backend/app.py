@@ -1,26 +1,45 @@
 import os
 from flask import Flask
 from flask_cors import CORS
+from compression import install as install_compression
 from db import init_db, seed_db
+from jobs import start_workers
+from pipeline import MAX_REQUEST_BYTES
+from profiling import install as install_profiler
+from routes.admin import admin_bp
 from routes.extract import extract_bp
 from routes.health import health_bp
+from routes.jobs import jobs_bp
+from routes.metrics import metrics_bp
 from routes.orders import orders_bp
+from routes.search import search_bp
 
 
 def create_app():
     app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
     CORS(app)
     app.register_blueprint(health_bp)
     app.register_blueprint(orders_bp)
     app.register_blueprint(extract_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(metrics_bp)
+    install_compression(app)
+    install_profiler(app)  # no-op unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set
 
     init_db()  # initialize database and exe sql command
     seed_db()
+    start_workers()  # resume jobs left queued/running by a previous process
 
     return app
 
 
-app = create_app()
+# PDF worker processes are spawned and re-import this file as __mp_main__;
+# only the server process should build the app
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5000)), debug=True)
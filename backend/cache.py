@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import image_prep
+import llm
+import pdf_text
+from db import get_conn
+from llm import PROMPT_VERSION, current_model, current_provider
+from metrics import CACHE_LOOKUPS, PDF_TEXT_CACHE_LOOKUPS
+
+CACHE_ENABLED = os.getenv("EXTRACTION_CACHE", "1") not in ("0", "false", "FALSE")
+CACHE_MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", 256))
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 10000))
+CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL", 7 * 24 * 3600))
+
+# PDF page text by content hash and page window. It does not depend on the
+# provider, model or prompt, so it has its own table, limits and switch and
+# never evicts the (far more expensive) extraction results.
+PDF_TEXT_CACHE_ENABLED = os.getenv("PDF_TEXT_CACHE", "1") not in ("0", "false", "FALSE")
+PDF_TEXT_CACHE_MEMORY_ENTRIES = int(os.getenv("PDF_TEXT_CACHE_MEMORY_ENTRIES", 64))
+PDF_TEXT_CACHE_MAX_ENTRIES = int(os.getenv("PDF_TEXT_CACHE_MAX_ENTRIES", 10000))
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+PDF_TEXT_CACHE_TTL_SECONDS = int(os.getenv("PDF_TEXT_CACHE_TTL", 30 * 24 * 3600))
+
+# how many SQLite writes between eviction sweeps
+EVICT_EVERY = 32
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    # JSON values in a memory LRU in front of a SQLite table (CacheKey, Value,
+    # CreatedAt, AccessedAt), with a TTL and entry/byte limits
+    def __init__(self, table, enabled, memory_entries, max_entries, max_bytes, ttl_seconds,
+                 lookups):
+        self.table = table
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lookups = lookups
+        self._memory = LRUCache(memory_entries)
+        self._stats = {"memory_hits": 0, "sqlite_hits": 0, "misses": 0, "writes": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+            return self._stats[stat]
+
+    def lookup(self, key):
+        # returns (value, tier); value is a fresh copy the caller may mutate
+        raw = self._memory.get(key)
+        if raw is not None:
+            self._count("memory_hits")
+            self.lookups.inc(result="hit", tier="memory")
+            return json.loads(raw), "memory"
+
+        now = time.time()
+        with get_conn() as conn:
+            row = conn.execute(
+                f"SELECT Value, CreatedAt FROM {self.table} WHERE CacheKey = ?",
+                (key,),
+            ).fetchone()
+            if row is not None and now - row["CreatedAt"] > self.ttl_seconds:
+                conn.execute(f"DELETE FROM {self.table} WHERE CacheKey = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute(
+                    f"UPDATE {self.table} SET AccessedAt = ? WHERE CacheKey = ?",
+                    (now, key),
+                )
+
+        if row is None:
+            self._count("misses")
+            self.lookups.inc(result="miss", tier="sqlite")
+            return None, None
+        self._count("sqlite_hits")
+        self.lookups.inc(result="hit", tier="sqlite")
+        self._memory.put(key, row["Value"])
+        return json.loads(row["Value"]), "sqlite"
+
+    def store(self, key, value):
+        raw = json.dumps(value)
+        self._memory.put(key, raw)
+        now = time.time()
+        with get_conn() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (CacheKey, Value, CreatedAt, AccessedAt) "
+                "VALUES (?, ?, ?, ?)",
+                (key, raw, now, now),
+            )
+            if self._count("writes") % EVICT_EVERY == 0:
+                self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE CreatedAt < ?",
+            (now - self.ttl_seconds,),
+        )
+        row = conn.execute(
+            "SELECT COUNT(1) AS entries, COALESCE(SUM(LENGTH(Value)), 0) AS bytes "
+            f"FROM {self.table}"
+        ).fetchone()
+        entries, size = row["entries"], row["bytes"]
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        # least recently used first, until both limits hold again
+        rows = conn.execute(
+            f"SELECT CacheKey, LENGTH(Value) AS bytes FROM {self.table} ORDER BY AccessedAt"
+        )
+        doomed = []
+        for row in rows:
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            doomed.append((row["CacheKey"],))
+            entries -= 1
+            size -= row["bytes"] or 0
+        conn.executemany(f"DELETE FROM {self.table} WHERE CacheKey = ?", doomed)
+        for (key,) in doomed:
+            self._memory.pop(key)
+
+    def stats(self):
+        with get_conn() as conn:
+            row = conn.execute(
+                "SELECT COUNT(1) AS entries, COALESCE(SUM(LENGTH(Value)), 0) AS bytes "
+                f"FROM {self.table}"
+            ).fetchone()
+        with self._stats_lock:
+            counters = dict(self._stats)
+        hits = counters["memory_hits"] + counters["sqlite_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": len(self._memory),
+            "sqlite_entries": row["entries"],
+            "sqlite_bytes": row["bytes"],
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def purge(self):
+        self._memory.clear()
+        with get_conn() as conn:
+            cur = conn.execute(f"DELETE FROM {self.table}")
+        with self._stats_lock:
+            for stat in self._stats:
+                self._stats[stat] = 0
+        return cur.rowcount
+
+
+extraction_cache = TieredCache(
+    "ExtractionCache", CACHE_ENABLED, CACHE_MEMORY_ENTRIES, CACHE_MAX_ENTRIES,
+    CACHE_MAX_BYTES, CACHE_TTL_SECONDS, CACHE_LOOKUPS)
+pdf_text_cache = TieredCache(
+    "PdfTextCache", PDF_TEXT_CACHE_ENABLED, PDF_TEXT_CACHE_MEMORY_ENTRIES,
+    PDF_TEXT_CACHE_MAX_ENTRIES, PDF_TEXT_CACHE_MAX_BYTES, PDF_TEXT_CACHE_TTL_SECONDS,
+    PDF_TEXT_CACHE_LOOKUPS)
+
+# the module-level functions are the extraction cache
+lookup = extraction_cache.lookup
+store = extraction_cache.store
+stats = extraction_cache.stats
+purge = extraction_cache.purge
+
+
+def settings_fingerprint(mime_type=None):
+    # settings that change what reaches the model (PROMPT_VERSION covers the
+    # prompt and compaction), so results computed under other settings are not
+    # served; read at call time, like current_model()
+    if mime_type and mime_type.startswith("image/"):
+        settings = (image_prep.IMAGE_PREPROCESS, image_prep.IMAGE_MAX_DIMENSION,
+                    image_prep.IMAGE_FORMAT, image_prep.IMAGE_QUALITY,
+                    image_prep.IMAGE_GRAYSCALE, image_prep.IMAGE_CROP_BORDERS,
+                    image_prep.IMAGE_MIN_BYTES)
+    else:
+        settings = (llm.LLM_CHUNK_TOKENS, pdf_text.PDF_FIRST_PAGES, pdf_text.PDF_LAST_PAGES)
+    return hashlib.sha256(repr(settings).encode("utf-8")).hexdigest()[:12]
+
+
+def extraction_cache_key(digest, mime_type=None):
+    return (f"extract:{digest}:{current_provider()}:{current_model()}:{PROMPT_VERSION}:"
+            f"{settings_fingerprint(mime_type)}")
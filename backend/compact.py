@@ -0,0 +1,95 @@
+import os
+import re
+
+# Document text is compacted before it goes to the model: whitespace runs are
+# collapsed, header/footer lines repeated across pages are kept only once, page
+# numbers and known legal boilerplate are dropped. RawText, the cache and the
+# mock/rules providers still see the text as extracted.
+LLM_COMPACT = os.getenv("LLM_COMPACT", "1") not in ("0", "false", "FALSE")
+
+# lines at the top and bottom of a page: running headers, footers, page numbers
+EDGE_LINES = 3
+# an edge line or a line of prose (PROSE_WORDS or more) that appears once on each
+# of this many pages, and on at least half of them, is kept only the first time;
+# lines with amounts never are, so repeated line items survive
+REPEAT_MIN_PAGES = 3
+PROSE_WORDS = 6
+
+# blank-line blocks starting with one of these carry nothing the schema asks for
+BOILERPLATE_HEADINGS = re.compile(
+    r"(terms\s*(and|&)\s*conditions|general\s+terms|disclaimer|confidentiality"
+    r"|privacy\s+(notice|policy)|warranty|thank\s+you\s+for\s+your\s+business)\b",
+    re.IGNORECASE)
+_PAGE_NUMBER = re.compile(r"page\s*\d+(\s*(of|/)\s*\d+)?", re.IGNORECASE)
+_PAGE_NUMBER_LINE = re.compile(
+    r"(page\s*)?\d+\s*(of|/)\s*\d+|page\s*\d+|-\s*\d+\s*-", re.IGNORECASE)
+_BLOCKS = re.compile(r"\n{2,}")
+_AMOUNT = re.compile(r"\d[\d,]*\.\d{2}\b")
+
+
+def _repeat_key(line):
+    # running headers often carry the page number ("Acme Ltd   Page 3 of 9")
+    return _PAGE_NUMBER.sub("page #", line).lower()
+
+
+def _edge_indexes(page):
+    indexes = [i for i, line in enumerate(page) if line]
+    return set(indexes[:EDGE_LINES] + indexes[-EDGE_LINES:])
+
+
+def _repeated_lines(pages):
+    if len(pages) < REPEAT_MIN_PAGES:
+        return set()
+    seen = {}
+    for page in pages:
+        edges = _edge_indexes(page)
+        counts = {}
+        for i, line in enumerate(page):
+            if line and not _AMOUNT.search(line):
+                key = _repeat_key(line)
+                eligible = i in edges or len(line.split()) >= PROSE_WORDS
+                counts[key] = (counts.get(key, (0, False))[0] + 1, eligible)
+        for key, (count, eligible) in counts.items():
+            pages_seen, once_per_page = seen.get(key, (0, True))
+            seen[key] = (pages_seen + 1, once_per_page and count == 1 and eligible)
+    needed = max(REPEAT_MIN_PAGES, (len(pages) + 1) // 2)
+    return {key for key, (count, once) in seen.items() if once and count >= needed}
+
+
+def compact_text(text):
+    # returns (compacted text, stats); page breaks (form feeds) are kept for
+    # split_text
+    pages = [[" ".join(line.split()) for line in page.split("\n")]
+             for page in (text or "").split("\f")]
+    repeated = _repeated_lines(pages)
+    stats = {"repeated_lines": 0, "page_numbers": 0, "boilerplate_blocks": 0}
+
+    kept_repeats = set()
+    compacted_pages = []
+    for page in pages:
+        lines = []
+        edges = _edge_indexes(page)
+        for i, line in enumerate(page):
+            if i in edges and _PAGE_NUMBER_LINE.fullmatch(line):
+                stats["page_numbers"] += 1
+                continue
+            if repeated and line:
+                key = _repeat_key(line)
+                if key in repeated:
+                    if key in kept_repeats:
+                        stats["repeated_lines"] += 1
+                        continue
+                    kept_repeats.add(key)
+            lines.append(line)
+
+        blocks = []
+        for block in _BLOCKS.split("\n".join(lines).strip("\n")):
+            if BOILERPLATE_HEADINGS.match(block) and not _AMOUNT.search(block):
+                stats["boilerplate_blocks"] += 1
+                continue
+            blocks.append(block)
+        compacted_pages.append("\n\n".join(blocks))
+
+    compacted = "\f".join(page for page in compacted_pages if page)
+    stats.update(chars=len(text or ""), compacted_chars=len(compacted))
+    return compacted, stats
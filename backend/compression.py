@@ -0,0 +1,58 @@
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the brotli package is installed
+    brotli = None
+
+# JSON responses of at least COMPRESS_MIN_BYTES are gzip- or brotli-encoded for
+# clients that accept it. Streamed responses (SSE, NDJSON) are left alone.
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "1") not in ("0", "false", "FALSE")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain")
+
+
+def install(app):
+    if RESPONSE_COMPRESSION:
+        app.after_request(compress_response)
+
+
+def _encoding(request):
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or "Content-Encoding" in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding(request)
+    if encoding is None:
+        return response
+
+    if encoding == "br":
+        body = brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # a strong ETag names one exact byte sequence, so each encoding gets its own
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
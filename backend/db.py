@@ -1,12 +1,53 @@
+import hashlib
+import json
+import mmap
 import os
+import re
 import sqlite3
+import struct
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: the version lock is per process only
+    fcntl = None
+
+from metrics import DB_SECONDS, READ_CACHE_LOOKUPS
+
 DB_PATH = os.getenv(
     "DATABASE_PATH",
     os.path.join(os.path.dirname(__file__), "data", "app.db"),
 )
 
+# per-connection pragmas; WAL lets readers run alongside a writer, and NORMAL
+# only fsyncs at checkpoints (safe against corruption in WAL mode)
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", -16000))  # negative = KiB
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", 5000))  # ms
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", 256))
+
+# A counter bumped after every committed write to orders, kept in a small
+# memory-mapped file next to the database so every worker process reads it
+# without a query. The read endpoints derive their ETags from it.
+DATA_VERSION_PATH = os.getenv("DATA_VERSION_PATH", DB_PATH + ".version")
+# orders also get a version each, shared by SalesOrderIDs equal modulo this
+DATA_VERSION_SLOTS = 4096
+
+# Read-through cache for fetch_order, fetch_orders and db_snapshot, keyed by
+# query and parameters. Order details are checked against their order's
+# version, list views against the global one, so a write in any worker process
+# invalidates exactly what it touched. READ_CACHE_DIR adds a tier of files
+# shared by the workers on one host (e.g. under /dev/shm).
+READ_CACHE = os.getenv("READ_CACHE", "1") not in ("0", "false", "FALSE")
+READ_CACHE_ENTRIES = int(os.getenv("READ_CACHE_ENTRIES", 2048))
+READ_CACHE_BYTES = int(os.getenv("READ_CACHE_BYTES", 64 * 1024 * 1024))
+READ_CACHE_DIR = os.getenv("READ_CACHE_DIR", "")
+# shared-tier writes between eviction sweeps
+READ_CACHE_SWEEP_EVERY = 64
+
 HEADER_COLUMNS = [
     "SalesOrderID",
     "RevisionNumber",
@@ -70,6 +111,64 @@ DOCUMENT_COLUMNS = [
     "CreatedAt",
 ]
 
+JOB_COLUMNS = [
+    "JobID",
+    "Status",
+    "Filename",
+    "MimeType",
+    "FilePath",
+    "WorkerPID",
+    "Stages",
+    "Result",
+    "Error",
+    "CreatedAt",
+    "StartedAt",
+    "FinishedAt",
+]
+
+JOB_JSON_COLUMNS = ("Stages", "Result")
+
+ORDER_RANGE_INDEXES = {
+    "OrderDate": "idx_salesorderheader_orderdate",
+    "TotalDue": "idx_salesorderheader_totaldue",
+}
+ORDERS_RANGE_PROBE_ROWS = int(os.getenv("ORDERS_RANGE_PROBE_ROWS", 20000))
+
+# columns GET /api/orders can project, with the table alias they come from
+ORDER_LIST_FIELDS = {
+    **{col: "h" for col in HEADER_COLUMNS},
+    "InvoiceNumber": "d",
+    "VendorName": "d",
+}
+
+
+def _insert_sql(table, columns):
+    return (f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['?'] * len(columns))})")
+
+
+def _update_sql(table, columns, key):
+    return f"UPDATE {table} SET {', '.join(f'{col} = ?' for col in columns)} WHERE {key} = ?"
+
+
+# Fixed statement strings: built once so sqlite3's per-connection statement
+# cache keeps hitting the same prepared statements.
+HEADER_UPDATE_COLUMNS = [col for col in HEADER_COLUMNS if col != "SalesOrderID"]
+DETAIL_INSERT_COLUMNS = [col for col in DETAIL_COLUMNS if col != "SalesOrderDetailID"]
+DETAIL_UPDATE_COLUMNS = [col for col in DETAIL_INSERT_COLUMNS if col != "SalesOrderID"]
+DOCUMENT_INSERT_COLUMNS = [col for col in DOCUMENT_COLUMNS if col != "DocumentID"]
+DOCUMENT_UPDATE_COLUMNS = [
+    col for col in DOCUMENT_COLUMNS if col not in ("DocumentID", "CreatedAt")]
+
+INSERT_HEADER_SQL = _insert_sql("SalesOrderHeader", HEADER_COLUMNS)
+INSERT_DETAIL_SQL = _insert_sql("SalesOrderDetail", DETAIL_INSERT_COLUMNS)
+INSERT_DOCUMENT_SQL = _insert_sql("Documents", DOCUMENT_INSERT_COLUMNS)
+INSERT_JOB_SQL = _insert_sql("Jobs", JOB_COLUMNS)
+
+SELECT_HEADER_SQL = "SELECT * FROM SalesOrderHeader WHERE SalesOrderID = ?"
+SELECT_DOCUMENT_SQL = "SELECT * FROM Documents WHERE SalesOrderID = ?"
+SELECT_DETAILS_SQL = "SELECT * FROM SalesOrderDetail WHERE SalesOrderID = ?"
+
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS Documents (
     DocumentID INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -137,19 +236,490 @@ CREATE TABLE IF NOT EXISTS SalesOrderDetail (
 
 CREATE INDEX IF NOT EXISTS idx_salesorderdetail_salesorderid
     ON SalesOrderDetail (SalesOrderID);
+
+CREATE INDEX IF NOT EXISTS idx_documents_salesorderid
+    ON Documents (SalesOrderID);
+
+CREATE INDEX IF NOT EXISTS idx_documents_vendorname
+    ON Documents (VendorName, SalesOrderID);
+
+CREATE INDEX IF NOT EXISTS idx_salesorderheader_orderdate
+    ON SalesOrderHeader (OrderDate, SalesOrderID);
+
+CREATE INDEX IF NOT EXISTS idx_salesorderheader_totaldue
+    ON SalesOrderHeader (TotalDue, SalesOrderID);
+
+CREATE TABLE IF NOT EXISTS Jobs (
+    JobID TEXT PRIMARY KEY,
+    Status TEXT,
+    Filename TEXT,
+    MimeType TEXT,
+    FilePath TEXT,
+    WorkerPID INTEGER,
+    Stages TEXT,
+    Result TEXT,
+    Error TEXT,
+    CreatedAt TEXT,
+    StartedAt TEXT,
+    FinishedAt TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status
+    ON Jobs (Status, CreatedAt);
+
+CREATE TABLE IF NOT EXISTS ExtractionCache (
+    CacheKey TEXT PRIMARY KEY,
+    Value TEXT,
+    CreatedAt REAL,
+    AccessedAt REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_extractioncache_accessedat
+    ON ExtractionCache (AccessedAt);
+
+CREATE TABLE IF NOT EXISTS PdfTextCache (
+    CacheKey TEXT PRIMARY KEY,
+    Value TEXT,
+    CreatedAt REAL,
+    AccessedAt REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_pdftextcache_accessedat
+    ON PdfTextCache (AccessedAt);
+
+CREATE TABLE IF NOT EXISTS ImportCheckpoints (
+    Source TEXT,
+    Sheet TEXT,
+    RowNumber INTEGER,
+    Rows INTEGER,
+    UpdatedAt TEXT,
+    PRIMARY KEY (Source, Sheet)
+);
+
+CREATE TABLE IF NOT EXISTS IdSequences (
+    Name TEXT PRIMARY KEY,
+    NextID INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS VendorTemplates (
+    Fingerprint TEXT PRIMARY KEY,
+    VendorName TEXT,
+    Template TEXT,
+    CreatedAt TEXT,
+    UpdatedAt TEXT
+);
 """
 
+# Full-text search: one FTS5 row per order (rowid = SalesOrderID) so terms from
+# the document and from different line items can match together. Triggers on
+# Documents and SalesOrderDetail rebuild an order's row whenever its sources change.
+SEARCH_COLUMNS = ("VendorName", "InvoiceNumber", "ProductNames", "RawText")
+SEARCH_RANK = "bm25(4.0, 4.0, 2.0, 1.0)"  # same order as SEARCH_COLUMNS
+SEARCH_MAX_LIMIT = 100
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", 5000))
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+
+def _search_row_sql(order_id):
+    return f"""
+    SELECT {order_id},
+        (SELECT group_concat(VendorName, ' ') FROM Documents WHERE SalesOrderID = {order_id}),
+        (SELECT group_concat(InvoiceNumber, ' ') FROM Documents WHERE SalesOrderID = {order_id}),
+        (SELECT group_concat(ProductName, ' ') FROM SalesOrderDetail
+            WHERE SalesOrderID = {order_id}),
+        (SELECT group_concat(RawText, char(10)) FROM Documents WHERE SalesOrderID = {order_id})
+    """
+
+
+def _search_refresh_sql(order_id, condition=None):
+    guard = f"{condition} AND " if condition else ""
+    return f"""
+    DELETE FROM OrderSearch WHERE {guard}rowid = {order_id};
+    INSERT INTO OrderSearch (rowid, {', '.join(SEARCH_COLUMNS)})
+    {_search_row_sql(order_id)}
+    WHERE {guard}(
+        EXISTS (SELECT 1 FROM Documents WHERE SalesOrderID = {order_id})
+        OR EXISTS (SELECT 1 FROM SalesOrderDetail WHERE SalesOrderID = {order_id}));
+    """
+
+
+def _search_triggers_sql(table, columns):
+    name = table.lower()
+    moved = "OLD.SalesOrderID IS NOT NEW.SalesOrderID"
+    return f"""
+CREATE TRIGGER IF NOT EXISTS trg_{name}_search_insert AFTER INSERT ON {table}
+WHEN NEW.SalesOrderID IS NOT NULL BEGIN
+    {_search_refresh_sql("NEW.SalesOrderID")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{name}_search_update
+AFTER UPDATE OF SalesOrderID, {', '.join(columns)} ON {table} BEGIN
+    {_search_refresh_sql("OLD.SalesOrderID", moved)}
+    {_search_refresh_sql("NEW.SalesOrderID")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{name}_search_delete AFTER DELETE ON {table}
+WHEN OLD.SalesOrderID IS NOT NULL BEGIN
+    {_search_refresh_sql("OLD.SalesOrderID")}
+END;
+"""
+
+
+SEARCH_TRIGGERS = [f"trg_{table}_search_{event}"
+                   for table in ("documents", "salesorderdetail")
+                   for event in ("insert", "update", "delete")]
+
+SEARCH_SCHEMA_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS OrderSearch USING fts5(
+    {', '.join(SEARCH_COLUMNS)},
+    tokenize = 'porter unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+);
+{_search_triggers_sql("Documents", ["VendorName", "InvoiceNumber", "RawText"])}
+{_search_triggers_sql("SalesOrderDetail", ["ProductName"])}
+"""
+
+
+_local = threading.local()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, cached_statements=DB_STATEMENT_CACHE)
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
     return conn
 
 
+class _ConnectionScope:
+    # `with get_conn() as conn:` on the thread's connection. Only the outermost
+    # block commits or rolls back, so a helper that opens its own block inside a
+    # caller's transaction joins it instead of committing it early.
+    def __enter__(self):
+        if getattr(_local, "conn", None) is None:
+            _local.conn = _connect()
+            _local.depth = 0
+            _local.orders_changed = None
+        _local.depth += 1
+        return _local.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.depth -= 1
+        if _local.depth == 0:
+            changed, _local.orders_changed = _local.orders_changed, None
+            if exc_type is None:
+                try:
+                    _local.conn.commit()
+                except BaseException:
+                    # e.g. "database is locked": don't leave the transaction open
+                    # for the next block on this thread to commit
+                    _local.conn.rollback()
+                    raise
+                # only after the commit, so a reader that sees the new version
+                # also sees the new rows
+                if changed:
+                    bump_data_version(None if changed is True else changed)
+            else:
+                _local.conn.rollback()
+        return False
+
+
+def get_conn():
+    return _ConnectionScope()
+
+
+def close_conn():
+    # drop this thread's connection, e.g. before the database file is replaced
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+
+def mark_orders_changed(order_ids=None):
+    # call inside a get_conn() block that writes orders; the data version is
+    # bumped when the outermost block commits. Without ids every order counts
+    # as changed.
+    changed = getattr(_local, "orders_changed", None)
+    if order_ids is None or changed is True:
+        _local.orders_changed = True
+    else:
+        _local.orders_changed = (changed or set()) | {int(order_id) for order_id in order_ids}
+
+
+_version_lock = threading.Lock()
+_version_file = None
+_version_map = None
+
+
+def _get_version_map():
+    # slot 0 is the global data version, slots 1..DATA_VERSION_SLOTS version
+    # orders by SalesOrderID modulo the slot count
+    global _version_file, _version_map
+    if _version_map is None:
+        with _version_lock:
+            if _version_map is None:
+                size = 8 * (1 + DATA_VERSION_SLOTS)
+                os.makedirs(os.path.dirname(os.path.abspath(DATA_VERSION_PATH)), exist_ok=True)
+                f = open(DATA_VERSION_PATH, "a+b")
+                if os.fstat(f.fileno()).st_size < size:
+                    f.truncate(size)
+                _version_file = f
+                _version_map = mmap.mmap(f.fileno(), size)
+    return _version_map
+
+
+def _order_slot(order_id):
+    return 8 * (1 + int(order_id) % DATA_VERSION_SLOTS)
+
+
+def data_version():
+    return struct.unpack_from("<Q", _get_version_map())[0]
+
+
+def order_version(order_id):
+    # changes whenever this order (or one sharing its slot) is written
+    return struct.unpack_from("<Q", _get_version_map(), _order_slot(order_id))[0]
+
+
+def bump_data_version(order_ids=None):
+    version_map = _get_version_map()
+    if order_ids is None:
+        offsets = range(8, 8 * (1 + DATA_VERSION_SLOTS), 8)
+    else:
+        offsets = {_order_slot(order_id) for order_id in order_ids}
+    with _version_lock:
+        if fcntl:
+            fcntl.flock(_version_file.fileno(), fcntl.LOCK_EX)
+        try:
+            version = struct.unpack_from("<Q", version_map)[0] + 1
+            for offset in offsets:
+                struct.pack_into("<Q", version_map, offset,
+                                 struct.unpack_from("<Q", version_map, offset)[0] + 1)
+            struct.pack_into("<Q", version_map, 0, version)
+        finally:
+            if fcntl:
+                fcntl.flock(_version_file.fileno(), fcntl.LOCK_UN)
+    return version
+
+
+class _ReadCache:
+    # LRU of JSON-encoded results, bounded by entry count and bytes; an entry
+    # only counts as a hit at the version it was read at
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                del self._entries[key]
+                self.bytes -= len(entry[1])
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, raw):
+        if self.max_entries <= 0 or len(raw) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[1])
+            self._entries[key] = (version, raw)
+            self.bytes += len(raw)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_read_cache = _ReadCache(READ_CACHE_ENTRIES, READ_CACHE_BYTES)
+_read_stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0}
+_read_stats_lock = threading.Lock()
+_shared_writes = 0
+
+
+def _count_read(query, tier):
+    # tier is "memory", "shared" or None for a miss
+    with _read_stats_lock:
+        _read_stats[f"{tier}_hits" if tier else "misses"] += 1
+    READ_CACHE_LOOKUPS.inc(query=query, result="hit" if tier else "miss", tier=tier or "")
+
+
+def _shared_path(key):
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    return os.path.join(READ_CACHE_DIR, digest + ".json")
+
+
+def _shared_get(key, version):
+    # first line: the version the entry was read at
+    try:
+        with open(_shared_path(key), encoding="ascii") as f:
+            stored_version = f.readline()
+            if int(stored_version) != version:
+                return None
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+
+def _shared_put(key, version, raw):
+    global _shared_writes
+    path = _shared_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(READ_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write(f"{version}\n{raw}")
+        os.replace(tmp_path, path)
+    except OSError:
+        return
+    with _read_stats_lock:
+        _shared_writes += 1
+        sweep = _shared_writes % READ_CACHE_SWEEP_EVERY == 0
+    if sweep:
+        _sweep_shared()
+
+
+def _sweep_shared():
+    # oldest files first, until both limits hold again; workers race harmlessly
+    files = []
+    try:
+        with os.scandir(READ_CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    count, size = len(files), sum(file[1] for file in files)
+    for _, file_size, path in sorted(files):
+        if count <= READ_CACHE_ENTRIES and size <= READ_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        count -= 1
+        size -= file_size
+
+
+def _encode(value):
+    # what the routes send: compact, sorted keys, like Flask's jsonify
+    return json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+
+def _cache_lookup(key, version, read):
+    # returns (raw JSON, value); value is None on a hit, where nothing is decoded.
+    # version must be taken before read() runs: a write committed meanwhile
+    # leaves the new entry already stale.
+    raw = _read_cache.get(key, version)
+    if raw is not None:
+        _count_read(key[0], "memory")
+        return raw, None
+    if READ_CACHE_DIR:
+        raw = _shared_get(key, version)
+        if raw is not None:
+            _count_read(key[0], "shared")
+            _read_cache.put(key, version, raw)
+            return raw, None
+
+    _count_read(key[0], None)
+    value = read()
+    raw = _encode(value)
+    _read_cache.put(key, version, raw)
+    if READ_CACHE_DIR:
+        _shared_put(key, version, raw)
+    return raw, value
+
+
+def _cache_bypassed():
+    # reads inside a transaction may see uncommitted rows and are never cached
+    return not READ_CACHE or getattr(_local, "depth", 0)
+
+
+def _cached_read(key, version, read):
+    if _cache_bypassed():
+        return read()
+    raw, value = _cache_lookup(key, version, read)
+    return json.loads(raw) if value is None else value
+
+
+def _cached_json(key, version, read):
+    # the JSON text of the result; hits are served without decoding
+    if _cache_bypassed():
+        return _encode(read())
+    return _cache_lookup(key, version, read)[0]
+
+
+def read_cache_stats():
+    with _read_stats_lock:
+        counters = dict(_read_stats)
+    hits = counters["memory_hits"] + counters["shared_hits"]
+    lookups = hits + counters["misses"]
+    return {
+        "enabled": READ_CACHE,
+        **counters,
+        "hit_rate": round(hits / lookups, 4) if lookups else None,
+        "memory_entries": len(_read_cache),
+        "memory_bytes": _read_cache.bytes,
+        "shared_dir": READ_CACHE_DIR or None,
+        "data_version": data_version(),
+    }
+
+
+def clear_read_cache():
+    _read_cache.clear()
+    if READ_CACHE_DIR and os.path.isdir(READ_CACHE_DIR):
+        for name in os.listdir(READ_CACHE_DIR):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(READ_CACHE_DIR, name))
+                except OSError:
+                    pass
+    with _read_stats_lock:
+        for stat in _read_stats:
+            _read_stats[stat] = 0
+
+
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    # the database may have been replaced or edited while the app was down
+    bump_data_version()
     with get_conn() as conn:
-        conn.executescript(SCHEMA_SQL)
+        new_search_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'OrderSearch'").fetchone() is None
+        triggers = conn.execute(
+            f"SELECT COUNT(1) FROM sqlite_master WHERE type = 'trigger' "
+            f"AND name IN ({', '.join(['?'] * len(SEARCH_TRIGGERS))})",
+            SEARCH_TRIGGERS,
+        ).fetchone()[0]
+        new_pdf_text_cache = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'PdfTextCache'").fetchone() is None
+        conn.executescript(SCHEMA_SQL + SEARCH_SCHEMA_SQL)
+        if new_pdf_text_cache:
+            # page text used to share the extraction cache table
+            conn.execute("DELETE FROM ExtractionCache WHERE CacheKey LIKE 'pdftext:%'")
+        if new_search_index or triggers < len(SEARCH_TRIGGERS):
+            # existing databases get their orders indexed once, on upgrade, and so
+            # does one left behind by a bulk load that died with its triggers off
+            rebuild_search_index(conn)
 
 
 def seed_db():  # initialized data to th db if none
@@ -157,6 +727,7 @@ def seed_db():  # initialized data to th db if none
         cur = conn.execute("SELECT COUNT(1) AS count FROM SalesOrderHeader")
         if cur.fetchone()["count"] > 0:
             return
+        mark_orders_changed()
         headers = [
             {
                 "SalesOrderID": 60001,
@@ -323,35 +894,158 @@ def _row_to_dict(row):
     return {k: row[k] for k in row.keys()}
 
 
-def fetch_orders(limit=25):
-    with get_conn() as conn:
-        rows = conn.execute(
-            """
-            SELECT h.*, d.InvoiceNumber, d.VendorName
-            FROM SalesOrderHeader h
+def _order_list_columns(fields):
+    if not fields:
+        return "h.*, d.InvoiceNumber, d.VendorName"
+    unknown = [field for field in fields if field not in ORDER_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # the cursor needs SalesOrderID even when the caller did not ask for it
+    fields = ["SalesOrderID", *[field for field in fields if field != "SalesOrderID"]]
+    return ", ".join(f"{ORDER_LIST_FIELDS[field]}.{field}" for field in fields)
+
+
+def _range_row_counts(conn, ranges):
+    # SQLite keeps no range statistics, so count (up to a cap) how many rows each
+    # range filter matches, narrowest first
+    counts = []
+    for column, low, high in ranges:
+        clauses = [f"{column} {op} ?" for op, value in ((">=", low), ("<=", high))
+                   if value is not None]
+        params = [value for value in (low, high) if value is not None]
+        count = conn.execute(
+            f"SELECT COUNT(1) FROM (SELECT 1 FROM SalesOrderHeader "
+            f"INDEXED BY {ORDER_RANGE_INDEXES[column]} "
+            f"WHERE {' AND '.join(clauses)} LIMIT ?)",
+            (*params, ORDERS_RANGE_PROBE_ROWS),
+        ).fetchone()[0]
+        counts.append((count, column))
+    return sorted(counts)
+
+
+@DB_SECONDS.time(operation="fetch_orders")
+def fetch_orders(limit=25, after=None, vendor=None, date_from=None, date_to=None,
+                 min_total=None, max_total=None, fields=None):
+    return _cached_read(*_orders_query(limit, after, vendor, date_from, date_to,
+                                       min_total, max_total, fields))
+
+
+@DB_SECONDS.time(operation="fetch_orders")
+def fetch_orders_json(**filters):
+    # fetch_orders as JSON text, for GET /api/orders
+    return _cached_json(*_orders_query(**filters))
+
+
+def _orders_query(limit=25, after=None, vendor=None, date_from=None, date_to=None,
+                  min_total=None, max_total=None, fields=None):
+    # (cache key, version, read) for one page
+    args = (limit, after, vendor, date_from, date_to, min_total, max_total,
+            tuple(fields) if fields else None)
+    return ("fetch_orders", *args), data_version(), lambda: _fetch_orders(*args)
+
+
+def _fetch_orders(limit, after, vendor, date_from, date_to, min_total, max_total, fields):
+    # keyset pagination: newest first, the next page starts below next_cursor.
+    # With a vendor filter the documents index yields rows already in key order.
+    key = "d.SalesOrderID" if vendor is not None else "h.SalesOrderID"
+    clauses = []
+    params = []
+    for clause, value in (
+        (f"{key} < ?", after),
+        ("d.VendorName = ?", vendor),
+        ("h.OrderDate >= ?", date_from),
+        ("h.OrderDate <= ?", date_to),
+        ("h.TotalDue >= ?", min_total),
+        ("h.TotalDue <= ?", max_total),
+    ):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    columns = _order_list_columns(fields)
+
+    def page(conn, source, extra=None, extra_params=()):
+        where = " AND ".join(clauses + ([extra] if extra else []))
+        return conn.execute(
+            f"""
+            SELECT {columns}
+            FROM {source}
             LEFT JOIN Documents d ON d.SalesOrderID = h.SalesOrderID
-            ORDER BY h.SalesOrderID DESC
+            {f"WHERE {where}" if where else ""}
+            ORDER BY {key} DESC
             LIMIT ?
             """,
-            (limit,),
+            (*params, *extra_params, limit + 1),
         ).fetchall()
-        return [_row_to_dict(row) for row in rows]
 
+    ranges = [(column, low, high) for column, low, high in (
+        ("OrderDate", date_from, date_to), ("TotalDue", min_total, max_total))
+        if low is not None or high is not None]
 
-def fetch_order(order_id):
     with get_conn() as conn:
-        header = conn.execute(
-            "SELECT * FROM SalesOrderHeader WHERE SalesOrderID = ?",
-            (order_id,),
-        ).fetchone()
-        document = conn.execute(
-            "SELECT * FROM Documents WHERE SalesOrderID = ?",
-            (order_id,),
-        ).fetchone()
-        details = conn.execute(
-            "SELECT * FROM SalesOrderDetail WHERE SalesOrderID = ?",
-            (order_id,),
-        ).fetchall()
+        if not ranges or vendor is not None:
+            rows = page(conn, "SalesOrderHeader h")
+        else:
+            # narrow range: read it from its index and sort. Wide range: walk the
+            # newest ORDERS_RANGE_PROBE_ROWS keys, which usually fill a page; if
+            # they do not, matches are clustered further back and the index is
+            # the faster way to them.
+            count, column = _range_row_counts(conn, ranges)[0]
+            rows = None
+            if count >= ORDERS_RANGE_PROBE_ROWS:
+                floor = conn.execute(
+                    "SELECT SalesOrderID FROM SalesOrderHeader WHERE SalesOrderID < ? "
+                    "ORDER BY SalesOrderID DESC LIMIT 1 OFFSET ?",
+                    (after if after is not None else 2 ** 63 - 1, ORDERS_RANGE_PROBE_ROWS),
+                ).fetchone()
+                if floor is None:
+                    rows = page(conn, "SalesOrderHeader h NOT INDEXED")
+                else:
+                    rows = page(conn, "SalesOrderHeader h NOT INDEXED",
+                                "h.SalesOrderID > ?", (floor[0],))
+                    if len(rows) <= limit:
+                        rows = None
+            if rows is None:
+                # pick the page's keys from the (covering) index, then load rows
+                ids = [row[0] for row in conn.execute(
+                    f"SELECT h.SalesOrderID FROM SalesOrderHeader h "
+                    f"INDEXED BY {ORDER_RANGE_INDEXES[column]} "
+                    f"WHERE {' AND '.join(clauses)} "
+                    f"ORDER BY h.SalesOrderID DESC LIMIT ?",
+                    (*params, limit + 1),
+                )]
+                rows = page(conn, "SalesOrderHeader h",
+                            f"h.SalesOrderID IN ({', '.join(['?'] * len(ids))})", ids)
+
+    orders = [_row_to_dict(row) for row in rows[:limit]]
+    next_cursor = orders[-1]["SalesOrderID"] if len(rows) > limit else None
+    return {"orders": orders, "next_cursor": next_cursor}
+
+
+@DB_SECONDS.time(operation="fetch_order")
+def fetch_order(order_id, conn=None):
+    if conn is None:
+        return _cached_read(*_order_query(order_id))
+    return _fetch_order(conn, order_id)
+
+
+@DB_SECONDS.time(operation="fetch_order")
+def fetch_order_json(order_id):
+    # fetch_order as JSON text, for GET /api/orders/<id>
+    return _cached_json(*_order_query(order_id))
+
+
+def _order_query(order_id):
+    def read():
+        with get_conn() as conn:
+            return _fetch_order(conn, order_id)
+
+    return ("fetch_order", order_id), order_version(order_id), read
+
+
+def _fetch_order(conn, order_id):
+    header = conn.execute(SELECT_HEADER_SQL, (order_id,)).fetchone()
+    document = conn.execute(SELECT_DOCUMENT_SQL, (order_id,)).fetchone()
+    details = conn.execute(SELECT_DETAILS_SQL, (order_id,)).fetchall()
 
     return {
         "header": _row_to_dict(header),
@@ -360,118 +1054,447 @@ def fetch_order(order_id):
     }
 
 
-def next_sales_order_id(conn):
-    cur = conn.execute("SELECT MAX(SalesOrderID) AS max_id FROM SalesOrderHeader")
-    row = cur.fetchone()
-    max_id = row["max_id"] if row and row["max_id"] is not None else 50000
-    return int(max_id) + 1
+# sequence -> (table, column, first id); NextID never falls below MAX(column) + 1,
+# so rows inserted with explicit ids (seed data, data.xlsx) are skipped
+ID_SEQUENCES = {"SalesOrderID": ("SalesOrderHeader", "SalesOrderID", 50001)}
+# IDs a process reserves per round trip to IdSequences; unused ids in a block
+# are lost when the process exits
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", 100))
 
+_id_blocks = {}  # sequence -> [[next, end), ...] reserved by this process
+_id_blocks_pid = None
+_id_lock = threading.Lock()
+
+
+def _reserve_ids(conn, name, count, floor=None):
+    # must run inside a write transaction on conn; returns the first id of count
+    table, column, first_id = ID_SEQUENCES[name]
+    row = conn.execute("SELECT NextID FROM IdSequences WHERE Name = ?", (name,)).fetchone()
+    top = conn.execute(f"SELECT MAX({column}) AS max_id FROM {table}").fetchone()["max_id"]
+    start = max(row["NextID"] if row else first_id,
+                int(top) + 1 if top is not None else first_id, floor or 0)
+    conn.execute(
+        "INSERT OR REPLACE INTO IdSequences (Name, NextID) VALUES (?, ?)",
+        (name, start + count),
+    )
+    return start
 
-def insert_order(payload):
-    header = payload.get("header", {}) or {}
-    document = payload.get("document", {}) or {}
-    details = payload.get("details", []) or []
 
+def _reserve_id_block(name, count):
+    # own connection and BEGIN IMMEDIATE: the block is committed before any id in
+    # it is handed out, whatever happens to the caller's transaction
+    conn = _connect()
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            start = _reserve_ids(conn, name, count)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return start, start + count
+
+
+def allocate_ids(name, count, conn=None):
+    global _id_blocks, _id_blocks_pid
+    if count <= 0:
+        return []
+    if conn is not None and conn.in_transaction:
+        # the caller already holds the write lock, so a second connection would
+        # wait on it; take exactly count ids in the caller's transaction instead,
+        # nothing is kept in memory in case it rolls back
+        start = _reserve_ids(conn, name, count)
+        return list(range(start, start + count))
+
+    ids = []
+    with _id_lock:
+        if _id_blocks_pid != os.getpid():
+            # a forked worker must not hand out its parent's block
+            _id_blocks = {}
+            _id_blocks_pid = os.getpid()
+        blocks = _id_blocks.setdefault(name, [])
+        while len(ids) < count:
+            if not blocks:
+                blocks.append(list(_reserve_id_block(
+                    name, max(ID_BLOCK_SIZE, count - len(ids)))))
+            block = blocks[0]
+            take = min(count - len(ids), block[1] - block[0])
+            ids.extend(range(block[0], block[0] + take))
+            block[0] += take
+            if block[0] >= block[1]:
+                blocks.pop(0)
+    return ids
+
+
+def sync_id_sequences(conn=None):
+    # move every sequence past rows inserted with explicit ids
+    if conn is None:
+        with get_conn() as conn:
+            return sync_id_sequences(conn=conn)
+    for name in ID_SEQUENCES:
+        _reserve_ids(conn, name, 0)
+
+
+@DB_SECONDS.time(operation="insert_order")
+def insert_order(payload, conn=None):
+    # with conn, the insert joins the caller's transaction (see /api/extract/batch)
+    if conn is None:
+        with get_conn() as conn:
+            sales_order_id = _insert_order_rows(conn, payload)
+        return fetch_order(sales_order_id)
+    sales_order_id = _insert_order_rows(conn, payload)
+    return fetch_order(sales_order_id, conn=conn)
+
+
+@DB_SECONDS.time(operation="insert_orders")
+def insert_orders(payloads, return_full=False):
+    # all orders in one transaction: IDs are allocated up front and each table is
+    # written with a single executemany
     with get_conn() as conn:
-        sales_order_id = header.get("SalesOrderID") or next_sales_order_id(conn)
-        header["SalesOrderID"] = sales_order_id
+        ids = _insert_orders_rows(conn, payloads)
+        if return_full:
+            return fetch_orders_by_id(ids, conn=conn)
+    return ids
+
+
+def _insert_order_rows(conn, payload):
+    return _insert_orders_rows(conn, [payload])[0]
 
-        header_values = {col: header.get(col) for col in HEADER_COLUMNS}
-        cols = ", ".join(header_values.keys())
-        placeholders = ", ".join(["?"] * len(header_values))
-        conn.execute(
-            f"INSERT INTO SalesOrderHeader ({cols}) VALUES ({placeholders})",
-            list(header_values.values()),
-        )
 
+def _allocate_order_ids(conn, headers):
+    # explicit IDs are kept; the rest come from the SalesOrderID sequence
+    explicit = {int(header["SalesOrderID"]) for header in headers
+                if header.get("SalesOrderID")}
+    missing = [header for header in headers if not header.get("SalesOrderID")]
+    ids = []
+    while len(ids) < len(missing):
+        candidates = [new_id for new_id in allocate_ids(
+            "SalesOrderID", len(missing) - len(ids), conn=conn) if new_id not in explicit]
+        if not conn.in_transaction:
+            # hold the write lock from the check below to the insert, so no other
+            # writer can take one of the candidates in between
+            conn.execute("BEGIN IMMEDIATE")
+        # an explicit id written by another request can fall inside a block this
+        # process reserved earlier; skip it rather than fail on the primary key
+        marks = ", ".join(["?"] * len(candidates))
+        taken = {row[0] for row in conn.execute(
+            f"SELECT SalesOrderID FROM SalesOrderHeader WHERE SalesOrderID IN ({marks})",
+            candidates,
+        )} if candidates else set()
+        ids.extend(new_id for new_id in candidates if new_id not in taken)
+    for header, new_id in zip(missing, ids):
+        header["SalesOrderID"] = new_id
+    if explicit:
+        # keep other writers' future blocks clear of the explicit ids
+        _reserve_ids(conn, "SalesOrderID", 0, floor=max(explicit) + 1)
+    return [header["SalesOrderID"] for header in headers]
+
+
+def _insert_orders_rows(conn, payloads):
+    headers = []
+    for payload in payloads:
+        if payload.get("header") is None:
+            payload["header"] = {}
+        headers.append(payload["header"])
+    ids = _allocate_order_ids(conn, headers)
+    mark_orders_changed(ids)
+
+    created_at = datetime.utcnow().isoformat()
+    document_rows = []
+    detail_rows = []
+    for payload, sales_order_id in zip(payloads, ids):
+        document = payload.get("document", {}) or {}
         if document:
-            document = {**document}
-            document["SalesOrderID"] = sales_order_id
-            document["CreatedAt"] = datetime.utcnow().isoformat()
-            doc_values = {col: document.get(col)
-                          for col in DOCUMENT_COLUMNS if col != "DocumentID"}
-            cols = ", ".join(doc_values.keys())
-            placeholders = ", ".join(["?"] * len(doc_values))
-            conn.execute(
-                f"INSERT INTO Documents ({cols}) VALUES ({placeholders})",
-                list(doc_values.values()),
-            )
-        for item in details:
-            item = {**item, "SalesOrderID": sales_order_id}
-            detail_values = {
-                col: item.get(col) for col in DETAIL_COLUMNS if col != "SalesOrderDetailID"}
-            cols = ", ".join(detail_values.keys())
-            placeholders = ", ".join(["?"] * len(detail_values))
-            conn.execute(
-                f"INSERT INTO SalesOrderDetail ({cols}) VALUES ({placeholders})",
-                list(detail_values.values()),
-            )
-    return fetch_order(sales_order_id)
+            document = {**document, "SalesOrderID": sales_order_id, "CreatedAt": created_at}
+            document_rows.append([document.get(col) for col in DOCUMENT_INSERT_COLUMNS])
+        for item in payload.get("details", []) or []:
+            detail_rows.append(_detail_values(item, sales_order_id))
+
+    conn.executemany(
+        INSERT_HEADER_SQL,
+        [[header.get(col) for col in HEADER_COLUMNS] for header in headers],
+    )
+    # details first: each row refreshes its order's search entry, which is
+    # cheap while the (large) RawText document is not there yet
+    if detail_rows:
+        conn.executemany(INSERT_DETAIL_SQL, detail_rows)
+    if document_rows:
+        conn.executemany(INSERT_DOCUMENT_SQL, document_rows)
+    return ids
+
+
+def _detail_values(item, sales_order_id):
+    item = {**item, "SalesOrderID": sales_order_id}
+    return [item.get(col) for col in DETAIL_INSERT_COLUMNS]
+
+
+def _id_chunks(ids, size=500):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+@DB_SECONDS.time(operation="fetch_orders_by_id")
+def fetch_orders_by_id(order_ids, conn=None):
+    # fetch_order for many IDs: three IN queries per chunk instead of three per order
+    if conn is None:
+        with get_conn() as conn:
+            return fetch_orders_by_id(order_ids, conn=conn)
+
+    orders = {
+        order_id: {"header": None, "document": None, "details": []} for order_id in order_ids}
+    for chunk in _id_chunks(list(orders)):
+        marks = ", ".join(["?"] * len(chunk))
+        for row in conn.execute(
+                f"SELECT * FROM SalesOrderHeader WHERE SalesOrderID IN ({marks})", chunk):
+            orders[row["SalesOrderID"]]["header"] = _row_to_dict(row)
+        for row in conn.execute(
+                f"SELECT * FROM Documents WHERE SalesOrderID IN ({marks}) "
+                "ORDER BY DocumentID DESC", chunk):
+            # fetch_order's fetchone() returns the first document row
+            orders[row["SalesOrderID"]]["document"] = _row_to_dict(row)
+        for row in conn.execute(
+                f"SELECT * FROM SalesOrderDetail WHERE SalesOrderID IN ({marks}) "
+                "ORDER BY SalesOrderDetailID", chunk):
+            orders[row["SalesOrderID"]]["details"].append(_row_to_dict(row))
+    return [orders[order_id] for order_id in order_ids]
+
+
+def _same_value(old, new):
+    # SQLite hands back 5.0 for a REAL written as 5 and "12" for a TEXT written as 12
+    return old == new or (old is not None and new is not None and str(old) == str(new))
+
 
+def _changed_columns(row, values, columns):
+    return tuple(col for col, value in zip(columns, values)
+                 if not _same_value(row[col], value))
 
+
+def _update_changed(conn, table, key, updates):
+    # updates: [(key value, {column: value})]; SETs only the changed columns, so
+    # "AFTER UPDATE OF" triggers (search index) fire only when their columns change
+    groups = {}
+    for key_value, changed in updates:
+        groups.setdefault(tuple(changed), []).append([*changed.values(), key_value])
+    for columns, rows in groups.items():
+        conn.executemany(_update_sql(table, columns, key), rows)
+    return len(updates)
+
+
+def _detail_id(item):
+    try:
+        return int(item.get("SalesOrderDetailID"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _detail_key(item):
+    return (str(item.get("ProductID") or ""), str(item.get("ProductName") or "").strip())
+
+
+def _match_details(existing, details):
+    # pairs incoming lines with existing rows: by SalesOrderDetailID first, then by
+    # (ProductID, ProductName) in order of appearance; returns (pairs, added, removed)
+    by_id = {row["SalesOrderDetailID"]: row for row in existing}
+    pairs, unmatched = [], []
+    for item in details:
+        row = by_id.pop(_detail_id(item), None)
+        if row is None:
+            unmatched.append(item)
+        else:
+            pairs.append((row, item))
+
+    by_key = {}
+    for row in by_id.values():
+        by_key.setdefault(_detail_key(row), []).append(row)
+    added = []
+    for item in unmatched:
+        rows = by_key.get(_detail_key(item))
+        if rows:
+            pairs.append((rows.pop(0), item))
+        else:
+            added.append(item)
+    removed = [row for rows in by_key.values() for row in rows]
+    return pairs, added, removed
+
+
+@DB_SECONDS.time(operation="update_order")
 def update_order(order_id, payload):
+    # writes only what differs from the stored order; details keep their
+    # SalesOrderDetailIDs unless a line was really added or removed
     header = payload.get("header", {}) or {}
     document = payload.get("document", {}) or {}
     details = payload.get("details", []) or []
+    changes = {"header": 0, "document": 0, "details_updated": 0,
+               "details_inserted": 0, "details_deleted": 0}
 
     with get_conn() as conn:
         header["SalesOrderID"] = order_id
-        assignments = ", ".join(
-            [f"{col} = ?" for col in HEADER_COLUMNS if col != "SalesOrderID"])
-        values = [header.get(col) for col in HEADER_COLUMNS if col != "SalesOrderID"]
-        values.append(order_id)
-        conn.execute(
-            f"UPDATE SalesOrderHeader SET {assignments} WHERE SalesOrderID = ?",
-            values,
-        )
+        existing_header = conn.execute(SELECT_HEADER_SQL, (order_id,)).fetchone()
+        if existing_header:
+            values = [header.get(col) for col in HEADER_UPDATE_COLUMNS]
+            changed = _changed_columns(existing_header, values, HEADER_UPDATE_COLUMNS)
+            if changed:
+                changes["header"] = _update_changed(conn, "SalesOrderHeader", "SalesOrderID", [
+                    (order_id, {col: header.get(col) for col in changed})])
 
-        existing_doc = conn.execute(
-            "SELECT DocumentID FROM Documents WHERE SalesOrderID = ?",
-            (order_id,),
-        ).fetchone()
+        existing_doc = conn.execute(SELECT_DOCUMENT_SQL, (order_id,)).fetchone()
 
         if document:
             document = {**document}
             document["SalesOrderID"] = order_id
             if existing_doc:
-                assignments = ", ".join(
-                    [f"{col} = ?" for col in DOCUMENT_COLUMNS if col not in ("DocumentID", "CreatedAt")]
-                )
-                values = [
-                    document.get(col) for col in DOCUMENT_COLUMNS if col not in (
-                        "DocumentID", "CreatedAt")]
-                values.append(order_id)
-                conn.execute(
-                    f"UPDATE Documents SET {assignments} WHERE SalesOrderID = ?",
-                    values,
-                )
+                values = [document.get(col) for col in DOCUMENT_UPDATE_COLUMNS]
+                changed = _changed_columns(existing_doc, values, DOCUMENT_UPDATE_COLUMNS)
+                if changed:
+                    changes["document"] = _update_changed(conn, "Documents", "SalesOrderID", [
+                        (order_id, {col: document.get(col) for col in changed})])
             else:
                 document["CreatedAt"] = datetime.utcnow().isoformat()
-                doc_values = {col: document.get(
-                    col) for col in DOCUMENT_COLUMNS if col != "DocumentID"}
-                cols = ", ".join(doc_values.keys())
-                placeholders = ", ".join(["?"] * len(doc_values))
                 conn.execute(
-                    f"INSERT INTO Documents ({cols}) VALUES ({placeholders})",
-                    list(doc_values.values()),
+                    INSERT_DOCUMENT_SQL,
+                    [document.get(col) for col in DOCUMENT_INSERT_COLUMNS],
                 )
+                changes["document"] = 1
 
-        conn.execute("DELETE FROM SalesOrderDetail WHERE SalesOrderID = ?", (order_id,))
-        for item in details:
-            item = {**item, "SalesOrderID": order_id}
-            detail_values = {
-                col: item.get(col) for col in DETAIL_COLUMNS if col != "SalesOrderDetailID"}
-            cols = ", ".join(detail_values.keys())
-            placeholders = ", ".join(["?"] * len(detail_values))
-            conn.execute(
-                f"INSERT INTO SalesOrderDetail ({cols}) VALUES ({placeholders})",
-                list(detail_values.values()),
+        existing = [dict(row) for row in conn.execute(
+            SELECT_DETAILS_SQL + " ORDER BY SalesOrderDetailID", (order_id,))]
+        pairs, added, removed = _match_details(existing, details)
+        updates = []
+        for row, item in pairs:
+            values = [item.get(col) for col in DETAIL_UPDATE_COLUMNS]
+            changed = _changed_columns(row, values, DETAIL_UPDATE_COLUMNS)
+            if changed:
+                updates.append((row["SalesOrderDetailID"], {col: item.get(col) for col in changed}))
+        changes["details_updated"] = _update_changed(
+            conn, "SalesOrderDetail", "SalesOrderDetailID", updates)
+        if removed:
+            conn.executemany(
+                "DELETE FROM SalesOrderDetail WHERE SalesOrderDetailID = ?",
+                [(row["SalesOrderDetailID"],) for row in removed],
+            )
+            changes["details_deleted"] = len(removed)
+        if added:
+            conn.executemany(
+                INSERT_DETAIL_SQL,
+                [_detail_values(item, order_id) for item in added],
             )
+            changes["details_inserted"] = len(added)
+        if any(changes.values()):
+            mark_orders_changed([order_id])
+
+    order = fetch_order(order_id)
+    order["changes"] = {**changes, "rows": sum(changes.values())}
+    return order
+
+
+def rebuild_search_index(conn=None):
+    if conn is None:
+        with get_conn() as conn:
+            return rebuild_search_index(conn=conn)
+    conn.execute("DELETE FROM OrderSearch")
+    conn.execute(
+        "INSERT INTO OrderSearch (OrderSearch, rank) VALUES ('rank', ?)", (SEARCH_RANK,))
+    cur = conn.execute(
+        f"""
+        INSERT INTO OrderSearch (rowid, {', '.join(SEARCH_COLUMNS)})
+        {_search_row_sql("ids.SalesOrderID")}
+        FROM (
+            SELECT SalesOrderID FROM Documents WHERE SalesOrderID IS NOT NULL
+            UNION
+            SELECT SalesOrderID FROM SalesOrderDetail WHERE SalesOrderID IS NOT NULL
+        ) ids
+        """
+    )
+    conn.execute("INSERT INTO OrderSearch (OrderSearch) VALUES ('optimize')")
+    return cur.rowcount
+
+
+def suspend_search_triggers():
+    # for bulk loads: the triggers re-aggregate an order's documents and line
+    # items on every inserted row. resume_search_triggers() (or the next
+    # init_db()) recreates them and reindexes everything once.
+    with get_conn() as conn:
+        for name in SEARCH_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
 
-    return fetch_order(order_id)
 
+def resume_search_triggers():
+    with get_conn() as conn:
+        conn.executescript(SEARCH_SCHEMA_SQL)
+        return rebuild_search_index(conn)
+
+
+def _search_match(query):
+    # user text -> FTS5 query: "quoted phrases" and hyphenated words (INV-1042)
+    # become phrases, everything is ANDed, and a trailing * keeps prefix search
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query or ""):
+        tokens = re.findall(r"\w+", phrase or word)
+        if not tokens:
+            continue
+        term = '"' + " ".join(tokens) + '"'
+        if word.endswith("*") and len(tokens) == 1:
+            term += "*"
+        terms.append(term)
+    return " ".join(terms)
 
+
+@DB_SECONDS.time(operation="search_orders")
+def search_orders(query, limit=20, offset=0):
+    match = _search_match(query)
+    if not match:
+        return {"results": [], "next_offset": None}
+    with get_conn() as conn:
+        # bm25 has to score every match before sorting, so very common terms
+        # only rank the newest SEARCH_RANK_WINDOW matches; walking matches in
+        # rowid order is cheap and FTS5 applies the rowid bound while matching
+        floor = conn.execute(
+            "SELECT rowid FROM OrderSearch WHERE OrderSearch MATCH ? "
+            "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (match, SEARCH_RANK_WINDOW - 1),
+        ).fetchone()
+        # exactly SEARCH_RANK_WINDOW matches still have a floor, so only a row
+        # past the window means some matches were left unranked
+        truncated = floor is not None and conn.execute(
+            "SELECT 1 FROM OrderSearch WHERE OrderSearch MATCH ? "
+            "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (match, SEARCH_RANK_WINDOW),
+        ).fetchone() is not None
+        # ORDER BY rank is handled inside FTS5, so snippets are only built for
+        # the rows on this page
+        rows = conn.execute(
+            """
+            SELECT rowid AS SalesOrderID, VendorName, InvoiceNumber, rank AS score,
+                snippet(OrderSearch, -1, '<mark>', '</mark>', '…', 12) AS snippet
+            FROM OrderSearch
+            WHERE OrderSearch MATCH ? AND rowid >= ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+            """,
+            (match, floor[0] if floor else -2 ** 63, limit + 1, offset),
+        ).fetchall()
+    results = [_row_to_dict(row) for row in rows[:limit]]
+    return {
+        "results": results,
+        "next_offset": offset + limit if len(rows) > limit else None,
+        "truncated": truncated,
+    }
+
+
+@DB_SECONDS.time(operation="db_snapshot")
 def db_snapshot(limit=10):
+    return _cached_read(("db_snapshot", limit), data_version(), lambda: _db_snapshot(limit))
+
+
+@DB_SECONDS.time(operation="db_snapshot")
+def db_snapshot_json(limit=10):
+    return _cached_json(("db_snapshot", limit), data_version(), lambda: _db_snapshot(limit))
+
+
+def _db_snapshot(limit):
     with get_conn() as conn:
         headers = conn.execute(
             "SELECT * FROM SalesOrderHeader ORDER BY SalesOrderID DESC LIMIT ?",
@@ -491,3 +1514,103 @@ def db_snapshot(limit=10):
         "details": [_row_to_dict(row) for row in details],
         "documents": [_row_to_dict(row) for row in documents],
     }
+
+
+def _job_row_to_dict(row):
+    job = _row_to_dict(row)
+    if job is None:
+        return None
+    for col in JOB_JSON_COLUMNS:
+        if job.get(col):
+            job[col] = json.loads(job[col])
+    return job
+
+
+def _job_values(fields):
+    return {
+        col: json.dumps(value) if col in JOB_JSON_COLUMNS and value is not None else value
+        for col, value in fields.items()
+    }
+
+
+def insert_job(job):
+    job_values = _job_values({col: job.get(col) for col in JOB_COLUMNS})
+    with get_conn() as conn:
+        conn.execute(INSERT_JOB_SQL, list(job_values.values()))
+
+
+def update_job(job_id, **fields):
+    job_values = _job_values(fields)
+    assignments = ", ".join([f"{col} = ?" for col in job_values])
+    with get_conn() as conn:
+        conn.execute(
+            f"UPDATE Jobs SET {assignments} WHERE JobID = ?",
+            [*job_values.values(), job_id],
+        )
+
+
+def claim_job(job_id, worker_pid):
+    # queued -> running in one statement so concurrent workers never share a job
+    with get_conn() as conn:
+        cur = conn.execute(
+            """
+            UPDATE Jobs SET Status = 'running', WorkerPID = ?, StartedAt = ?
+            WHERE JobID = ? AND Status = 'queued'
+            """,
+            (worker_pid, datetime.utcnow().isoformat(), job_id),
+        )
+        return cur.rowcount == 1
+
+
+def release_job(job_id, worker_pid):
+    # running -> queued, for a job this worker claimed but could not finish
+    # recording; a no-op when the claim never went through
+    with get_conn() as conn:
+        conn.execute(
+            """
+            UPDATE Jobs SET Status = 'queued', WorkerPID = NULL, StartedAt = NULL
+            WHERE JobID = ? AND Status = 'running' AND WorkerPID = ?
+            """,
+            (job_id, worker_pid),
+        )
+
+
+def fetch_job(job_id):
+    with get_conn() as conn:
+        row = conn.execute("SELECT * FROM Jobs WHERE JobID = ?", (job_id,)).fetchone()
+    return _job_row_to_dict(row)
+
+
+def fetch_jobs(limit=25, status=None):
+    cols = ", ".join(col for col in JOB_COLUMNS if col not in ("FilePath", "Result"))
+    with get_conn() as conn:
+        if status:
+            rows = conn.execute(
+                f"SELECT {cols} FROM Jobs WHERE Status = ? ORDER BY CreatedAt DESC LIMIT ?",
+                (status, limit),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT {cols} FROM Jobs ORDER BY CreatedAt DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+    return [_job_row_to_dict(row) for row in rows]
+
+
+def requeue_interrupted_jobs(is_alive):
+    # jobs left "running" by a dead worker process go back to the queue
+    with get_conn() as conn:
+        running = conn.execute(
+            "SELECT JobID, WorkerPID FROM Jobs WHERE Status = 'running'"
+        ).fetchall()
+        for row in running:
+            if row["WorkerPID"] is None or not is_alive(row["WorkerPID"]):
+                conn.execute(
+                    "UPDATE Jobs SET Status = 'queued', WorkerPID = NULL "
+                    "WHERE JobID = ? AND Status = 'running'",
+                    (row["JobID"],),
+                )
+        rows = conn.execute(
+            "SELECT JobID FROM Jobs WHERE Status = 'queued' ORDER BY CreatedAt"
+        ).fetchall()
+    return [row["JobID"] for row in rows]
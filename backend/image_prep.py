@@ -0,0 +1,136 @@
+import io
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# Image uploads are re-encoded before they go to the vision model as a data URL:
+# auto-oriented, grayscale, borders cropped, downsampled and saved as a compact
+# JPEG/WebP. The request thread still waits for the result; the small thread
+# pool (IMAGE_WORKERS) only caps how many images are decoded at once, bounding
+# the memory and CPU that concurrent uploads take. Pillow releases the GIL
+# while it works, so other requests keep running meanwhile.
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "1") not in ("0", "false", "FALSE")
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 1600))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()  # jpeg or webp
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 75))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "1") not in ("0", "false", "FALSE")
+IMAGE_CROP_BORDERS = os.getenv("IMAGE_CROP_BORDERS", "1") not in ("0", "false", "FALSE")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+# smaller uploads are sent as-is; re-encoding them rarely pays for itself
+IMAGE_MIN_BYTES = int(os.getenv("IMAGE_MIN_BYTES", 200 * 1024))
+
+# pixels within this distance of the corner colour count as border
+CROP_THRESHOLD = 40
+# share of each side kept around the cropped content
+CROP_MARGIN = 0.02
+
+OUTPUT_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, IMAGE_WORKERS),
+                                       thread_name_prefix="image-prep")
+        return _pool
+
+
+def _crop_borders(image):
+    from PIL import Image, ImageChops
+
+    width, height = image.size
+    corners = [image.getpixel(point) for point in
+               ((0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1))]
+    background = max(corners, key=corners.count)
+    diff = ImageChops.difference(image, Image.new(image.mode, image.size, background))
+    lut = [255 if value > CROP_THRESHOLD else 0 for value in range(256)]
+    box = diff.point(lut * len(image.getbands())).getbbox()
+    if not box:
+        return image, None
+    margin_x, margin_y = int(width * CROP_MARGIN), int(height * CROP_MARGIN)
+    box = (max(box[0] - margin_x, 0), max(box[1] - margin_y, 0),
+           min(box[2] + margin_x, width), min(box[3] + margin_y, height))
+    if box == (0, 0, width, height):
+        return image, None
+    return image.crop(box), box
+
+
+def _prepare(file_path, max_dimension, output_format, quality, grayscale, crop):
+    # returns (bytes, mime type, meta)
+    from PIL import Image, ImageOps
+
+    save_format, mime_type = OUTPUT_FORMATS[output_format]
+    mode = "L" if grayscale else "RGB"
+    with Image.open(file_path) as source:
+        original_size = source.size
+        scale = max_dimension / max(source.size)
+        if scale < 1:
+            # JPEG decodes straight to a reduced size (and grayscale) via DCT scaling
+            source.draft(mode, (math.ceil(source.width * scale),
+                                math.ceil(source.height * scale)))
+        image = ImageOps.exif_transpose(source)
+        if image.mode != mode:
+            image = image.convert(mode)
+
+    box = None
+    if crop:
+        image, box = _crop_borders(image)
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if save_format == "JPEG":
+        image.save(buffer, save_format, quality=quality, optimize=True)
+    else:
+        image.save(buffer, save_format, quality=quality, method=4)
+    meta = {"original_size": list(original_size), "size": list(image.size),
+            "format": output_format, "cropped": box is not None}
+    return buffer.getvalue(), mime_type, meta
+
+
+def prepare_image(file_path, mime_type):
+    # returns (data, mime type, meta); data is None when the upload should be sent
+    # as-is (disabled, small, Pillow missing, unreadable image, or no smaller result)
+    bytes_in = os.path.getsize(file_path)
+    meta = {"preprocessed": False, "bytes_in": bytes_in, "bytes_out": bytes_in}
+    if not IMAGE_PREPROCESS:
+        return None, mime_type, meta
+    if bytes_in < IMAGE_MIN_BYTES:
+        meta["skipped"] = "small upload"
+        return None, mime_type, meta
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        meta["skipped"] = "Pillow is not installed"
+        return None, mime_type, meta
+
+    start = perf_counter()
+    # blocks this thread; the pool is a concurrency cap, not background work
+    future = _get_pool().submit(
+        _prepare, file_path, IMAGE_MAX_DIMENSION, IMAGE_FORMAT, IMAGE_QUALITY,
+        IMAGE_GRAYSCALE, IMAGE_CROP_BORDERS)
+    try:
+        data, prepared_mime, prepared_meta = future.result()
+    except Exception as exc:
+        logger.warning("Image preprocessing failed for %s: %s", file_path, exc)
+        meta["skipped"] = str(exc)
+        return None, mime_type, meta
+    meta["preprocess_ms"] = round((perf_counter() - start) * 1000, 1)
+    meta.update(prepared_meta)
+
+    if len(data) >= bytes_in:
+        meta["skipped"] = "not smaller than the upload"
+        return None, mime_type, meta
+    meta.update(preprocessed=True, bytes_out=len(data))
+    logger.info("Image %s: %d -> %d bytes (%sx%s -> %sx%s) in %.0f ms",
+                os.path.basename(file_path), bytes_in, len(data),
+                *meta["original_size"], *meta["size"], meta["preprocess_ms"])
+    return data, prepared_mime, meta
@@ -0,0 +1,126 @@
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+from time import perf_counter
+
+from db import (
+    claim_job, fetch_job, insert_job, release_job, requeue_interrupted_jobs, update_job,
+)
+from pipeline import elapsed_ms, run_extraction, stream_upload
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# delay before a job whose claim or bookkeeping failed is tried again
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", 5))
+
+_queue = queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        # a previous process that happened to have our pid
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def start_workers(count=JOB_WORKERS):
+    with _workers_lock:
+        if _workers or count <= 0:
+            return
+        for i in range(count):
+            worker = threading.Thread(
+                target=_worker_loop, name=f"extract-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+    for job_id in requeue_interrupted_jobs(_pid_alive):
+        _queue.put(job_id)
+
+
+def submit_job(source, filename, mime_type):
+    job_id = uuid.uuid4().hex
+    start = perf_counter()
+    file_path = stream_upload(source, filename, prefix=job_id).path
+    insert_job(
+        {
+            "JobID": job_id,
+            "Status": "queued",
+            "Filename": filename,
+            "MimeType": mime_type,
+            "FilePath": file_path,
+            "Stages": {"upload_ms": elapsed_ms(start)},
+            "CreatedAt": datetime.utcnow().isoformat(),
+        }
+    )
+    start_workers()
+    _queue.put(job_id)
+    return job_id
+
+
+def _worker_loop():
+    while True:
+        job_id = _queue.get()
+        try:
+            _run_job(job_id)
+        except Exception:
+            # e.g. a locked database while claiming or recording the job. The
+            # extraction itself did not fail, so the job goes back to the queue
+            # and the worker lives on.
+            logger.exception(
+                "Could not run job %s, retrying in %ss", job_id, JOB_RETRY_SECONDS)
+            _retry_later(job_id)
+        finally:
+            _queue.task_done()
+
+
+def _retry_later(job_id):
+    def retry():
+        try:
+            release_job(job_id, os.getpid())
+        except Exception:
+            logger.exception("Could not requeue job %s", job_id)
+            _retry_later(job_id)
+            return
+        _queue.put(job_id)
+
+    timer = threading.Timer(JOB_RETRY_SECONDS, retry)
+    timer.daemon = True
+    timer.start()
+
+
+def _run_job(job_id):
+    if not claim_job(job_id, os.getpid()):
+        return
+    job = fetch_job(job_id)
+    if job is None:
+        return
+    try:
+        result = run_extraction(
+            job["FilePath"], job["Filename"], job["MimeType"], stages=job.get("Stages"))
+    except Exception as exc:
+        update_job(
+            job_id,
+            Status="failed",
+            Error=str(exc),
+            FinishedAt=datetime.utcnow().isoformat(),
+        )
+        return
+    update_job(
+        job_id,
+        Status="done",
+        Stages=result["meta"]["stages"],
+        Result=result,
+        FinishedAt=datetime.utcnow().isoformat(),
+    )
@@ -1,80 +1,209 @@
+import hashlib
 import json
 import os
 import re
-import requests
-
-from datetime import datetime, timedelta
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from compact import LLM_COMPACT, compact_text
+from llm_client import LLM_MAX_CONCURRENCY, get_client
+from partial_json import PartialJSONParser
+from rules import rules_extract
+
+
+PROMPT_SCHEMA = {
+    "document": {
+        "VendorName": "",
+        "InvoiceNumber": "",
+        "InvoiceDate": "YYYY-MM-DD",
+        "DueDate": "YYYY-MM-DD",
+        "Terms": "",
+        "BillToName": "",
+        "BillToAddress": "",
+        "ShipToName": "",
+        "ShipToAddress": "",
+        "Currency": "",
+        "Notes": "",
+        "Subtotal": 0,
+        "Tax": 0,
+        "Freight": 0,
+        "Total": 0
+    },
+    "header": {
+        "SalesOrderNumber": "",
+        "OrderDate": "YYYY-MM-DD",
+        "DueDate": "YYYY-MM-DD",
+        "ShipDate": "YYYY-MM-DD",
+        "PurchaseOrderNumber": "",
+        "AccountNumber": "",
+        "CustomerID": "",
+        "SalesPersonID": "",
+        "TerritoryID": "",
+        "BillToAddressID": "",
+        "ShipToAddressID": "",
+        "ShipMethodID": "",
+        "CreditCardID": "",
+        "CreditCardApprovalCode": "",
+        "CurrencyRateID": "",
+        "SubTotal": 0,
+        "TaxAmt": 0,
+        "Freight": 0,
+        "TotalDue": 0
+    },
+    "details": [
+        {
+            "OrderQty": 0,
+            "ProductID": "",
+            "ProductName": "",
+            "UnitPrice": 0,
+            "UnitPriceDiscount": 0,
+            "LineTotal": 0,
+            "CarrierTrackingNumber": "",
+            "SpecialOfferID": ""
+        }
+    ]
+}
 
-SYSTEM_PROMPT = """You are an expert data extractor for sales invoices.
+PROMPT_INSTRUCTIONS = """You are an expert data extractor for sales invoices.
 Extract structured fields and return ONLY valid JSON matching this schema:
-{
-  "document": {
-    "VendorName": "",
-    "InvoiceNumber": "",
-    "InvoiceDate": "YYYY-MM-DD",
-    "DueDate": "YYYY-MM-DD",
-    "Terms": "",
-    "BillToName": "",
-    "BillToAddress": "",
-    "ShipToName": "",
-    "ShipToAddress": "",
-    "Currency": "",
-    "Notes": "",
-    "Subtotal": 0,
-    "Tax": 0,
-    "Freight": 0,
-    "Total": 0
-  },
-  "header": {
-    "SalesOrderNumber": "",
-    "OrderDate": "YYYY-MM-DD",
-    "DueDate": "YYYY-MM-DD",
-    "ShipDate": "YYYY-MM-DD",
-    "PurchaseOrderNumber": "",
-    "AccountNumber": "",
-    "CustomerID": "",
-    "SalesPersonID": "",
-    "TerritoryID": "",
-    "BillToAddressID": "",
-    "ShipToAddressID": "",
-    "ShipMethodID": "",
-    "CreditCardID": "",
-    "CreditCardApprovalCode": "",
-    "CurrencyRateID": "",
-    "SubTotal": 0,
-    "TaxAmt": 0,
-    "Freight": 0,
-    "TotalDue": 0
-  },
-  "details": [
-    {
-      "OrderQty": 0,
-      "ProductID": "",
-      "ProductName": "",
-      "UnitPrice": 0,
-      "UnitPriceDiscount": 0,
-      "LineTotal": 0,
-      "CarrierTrackingNumber": "",
-      "SpecialOfferID": ""
-    }
-  ]
-}
-Use null for any unknown value. Provide decimals as numbers, not strings.
 """
+PROMPT_RULES = "Use null for any unknown value. Provide decimals as numbers, not strings.\n"
+
+
+def build_system_prompt(compact):
+    # minified, the schema is about 30% shorter; either way the system message is
+    # byte-identical on every call, a prefix providers can cache
+    if compact:
+        schema = json.dumps(PROMPT_SCHEMA, separators=(",", ":"))
+    else:
+        schema = json.dumps(PROMPT_SCHEMA, indent=2)
+    return f"{PROMPT_INSTRUCTIONS}{schema}\n{PROMPT_RULES}"
+
+
+SYSTEM_PROMPT = build_system_prompt(LLM_COMPACT)
+_UNCOMPACTED_SYSTEM_PROMPT = build_system_prompt(False)
+
+# any edit to SYSTEM_PROMPT or the compaction switch changes the extraction cache key
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + ("compact" if LLM_COMPACT else "")).encode("utf-8")).hexdigest()[:12]
+
+# Text longer than LLM_CHUNK_TOKENS (0 disables) is split at page breaks, blank
+# lines or lines into chunks that are extracted concurrently and merged
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", 4000))
+LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", LLM_MAX_CONCURRENCY))
+# rough size of a token in English text; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+# printed at the end of an invoice, so the last chunk that has them wins; other
+# fields come from the first chunk that has a value
+MERGE_LAST_FIELDS = {"Subtotal", "Tax", "Freight", "Total", "SubTotal", "TaxAmt", "TotalDue"}
+# With a progress callback, single-request extractions use the provider's
+# streaming mode and report fields as soon as the partial JSON completes them
+LLM_STREAM = os.getenv("LLM_STREAM", "1") not in ("0", "false", "FALSE")
+# seconds between "tokens" progress events while a completion streams
+STREAM_PROGRESS_INTERVAL = 0.25
+
 
+def current_provider():
+    return os.getenv("LLM_PROVIDER", "mock").lower()
 
-def extract_invoice(text=None, image_b64=None, mime_type=None):
-    provider = os.getenv("LLM_PROVIDER", "mock").lower()
+
+def current_model():
+    if current_provider() == "openai_compatible":
+        return os.getenv("LLM_MODEL") or "gpt-4o-mini"
+    return current_provider()
+
+
+def extract_invoice(text=None, image_b64=None, mime_type=None, meta=None, progress=None):
+    provider = current_provider()
     # print(provider)
     if provider == "mock":
         return mock_extract(text or "")
+    if provider == "rules":
+        return rules_extract(text or "")
     if provider == "openai_compatible":
-        return openai_compatible_extract(text, image_b64, mime_type)
+        return openai_compatible_extract(
+            text, image_b64, mime_type, meta=meta, progress=progress)
     raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
 
 
-def openai_compatible_extract(text, image_b64, mime_type):
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def _split_long(block, limit, separator):
+    # pieces of block no longer than limit, cut at separator where possible
+    pieces = []
+    current = ""
+    for part in block.split(separator) if separator else [block]:
+        while len(part) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(part[:limit])
+            part = part[limit:]
+        if current and len(current) + len(separator) + len(part) > limit:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current}{separator}{part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text(text, max_tokens):
+    # pages (form feeds), then blank-line blocks such as a run of line items, then
+    # lines; chunks never cut a line unless a single line is over the budget
+    limit = max(1, max_tokens * CHARS_PER_TOKEN)
+    blocks = []
+    for page in text.split("\f"):
+        for block in re.split(r"\n[ \t]*\n", page):
+            if block.strip():
+                blocks.extend(_split_long(block, limit, "\n"))
+    chunks = []
+    current = ""
+    for block in blocks:
+        if current and len(current) + 2 + len(block) > limit:
+            chunks.append(current)
+            current = block
+        else:
+            current = f"{current}\n\n{block}" if current else block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def merge_extractions(results):
+    merged = {"document": {}, "header": {}, "details": []}
+    for result in results:
+        result = result or {}
+        for section in ("document", "header"):
+            fields = merged[section]
+            for key, value in (result.get(section) or {}).items():
+                if value is None or value == "":
+                    fields.setdefault(key, value)
+                elif key in MERGE_LAST_FIELDS or fields.get(key) in (None, ""):
+                    fields[key] = value
+        merged["details"].extend(
+            item for item in result.get("details") or [] if isinstance(item, dict))
+    return merged
+
+
+_chunk_pool = None
+_chunk_pool_lock = threading.Lock()
+
+
+def _get_chunk_pool():
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            _chunk_pool = ThreadPoolExecutor(
+                max_workers=max(1, LLM_CHUNK_CONCURRENCY), thread_name_prefix="llm-chunk")
+        return _chunk_pool
+
+
+def openai_compatible_extract(text, image_b64, mime_type, meta=None, progress=None):
     api_key = os.getenv("LLM_API_KEY")
     base_url = os.getenv("LLM_BASE_URL") or "https://api.openai.com/v1"
     model = os.getenv("LLM_MODEL") or "gpt-4o-mini"
@@ -82,8 +211,6 @@ def openai_compatible_extract(text, image_b64, mime_type):
         raise ValueError("LLM_API_KEY is required for openai_compatible provider")
 
     user_prompt = "Extract the invoice data from the document."
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-
     if image_b64:
         content = [
             {"type": "text", "text": user_prompt},
@@ -92,10 +219,60 @@ def openai_compatible_extract(text, image_b64, mime_type):
                 "image_url": {"url": f"data:{mime_type};base64,{image_b64}"},
             },
         ]
-        messages.append({"role": "user", "content": content})
+        if progress and LLM_STREAM:
+            return _stream_extract(base_url, api_key, model, content, progress, meta)
+        data, parse_ms = _chat_extract(base_url, api_key, model, content)
+        _record_parse_ms(meta, parse_ms)
+        return data
+
+    prompt_text = text
+    if LLM_COMPACT:
+        compacted, compaction = compact_text(text)
+        prompt_text = compacted or text
+        if meta is not None:
+            meta["compaction"] = compaction
+    chunks = [prompt_text]
+    if LLM_CHUNK_TOKENS > 0 and estimate_tokens(prompt_text) > LLM_CHUNK_TOKENS:
+        chunks = split_text(prompt_text, LLM_CHUNK_TOKENS)
+    if len(chunks) == 1:
+        prompts = [f"{user_prompt}\n\n{prompt_text}"]
     else:
-        messages.append({"role": "user", "content": f"{user_prompt}\n\n{text}"})
-
+        prompts = [
+            f"{user_prompt} This is part {i} of {len(chunks)}; extract only what appears "
+            f"in this part.\n\n{chunk}"
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+    if meta is not None:
+        # estimates for what is sent and what the verbatim text and pretty-printed
+        # schema would have cost in as many requests
+        meta["llm"] = {
+            "chunks": len(chunks),
+            "tokens": estimate_tokens(text),
+            "input_tokens": sum(estimate_tokens(SYSTEM_PROMPT + prompt) for prompt in prompts),
+            "uncompacted_tokens": estimate_tokens(text) + len(chunks) * estimate_tokens(
+                _UNCOMPACTED_SYSTEM_PROMPT + user_prompt),
+        }
+    if len(chunks) == 1:
+        if progress and LLM_STREAM:
+            return _stream_extract(base_url, api_key, model, prompts[0], progress, meta)
+        data, parse_ms = _chat_extract(base_url, api_key, model, prompts[0])
+        _record_parse_ms(meta, parse_ms)
+        return data
+
+    # every chunk is a standalone request; the client's concurrency cap and rate
+    # limit still apply across them
+    futures = [_get_chunk_pool().submit(_chat_extract, base_url, api_key, model, prompt)
+               for prompt in prompts]
+    results = [future.result() for future in futures]
+    _record_parse_ms(meta, sum(parse_ms for _, parse_ms in results))
+    return merge_extractions([data for data, _ in results])
+
+
+def _chat_payload(model, user_content):
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
     payload = {
         "model": model,
         "temperature": 0,
@@ -104,20 +281,73 @@ def openai_compatible_extract(text, image_b64, mime_type):
 
     if os.getenv("LLM_DISABLE_RESPONSE_FORMAT") not in ("1", "true", "TRUE"):
         payload["response_format"] = {"type": "json_object"}
+    return payload
 
-    url = base_url.rstrip("/") + "/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
-    response = requests.post(url, headers=headers, json=payload, timeout=90)
-    if response.status_code >= 400 and "response_format" in payload:
-        payload.pop("response_format", None)
-        response = requests.post(url, headers=headers, json=payload, timeout=90)
-
-    response.raise_for_status()
-    data = response.json()
+def _chat_extract(base_url, api_key, model, user_content):
+    payload = _chat_payload(model, user_content)
+    data = get_client().chat_completion(base_url, api_key, payload)
     content = data["choices"][0]["message"]["content"]
 
-    return parse_json_content(content)
+    # (extraction, ms spent parsing the answer)
+    start = perf_counter()
+    parsed = parse_json_content(content)
+    return parsed, (perf_counter() - start) * 1000
+
+
+def _record_parse_ms(meta, parse_ms):
+    # the pipeline moves this into its stages as parse_ms
+    if meta is not None:
+        meta.setdefault("llm", {})["parse_ms"] = round(parse_ms, 3)
+
+
+def report_fields(progress, path, value):
+    # document/header scalars as "field" events, finished line items as "line_item"
+    if len(path) != 2:
+        return False
+    section, key = path
+    if section in ("document", "header") and not isinstance(value, (dict, list)):
+        progress("field", {"section": section, "name": key, "value": value})
+        return True
+    if section == "details" and isinstance(value, dict):
+        progress("line_item", {"index": key, "item": value})
+        return True
+    return False
+
+
+def _stream_extract(base_url, api_key, model, user_content, progress, meta=None):
+    payload = _chat_payload(model, user_content)
+    parser = PartialJSONParser()
+    parts = []
+    chars = 0
+    first_field_ms = None
+    start = last_report = perf_counter()
+    for delta in get_client().chat_completion_stream(base_url, api_key, payload):
+        parts.append(delta)
+        chars += len(delta)
+        if parser is not None:
+            try:
+                events = parser.feed(delta)
+            except json.JSONDecodeError:
+                # not JSON after all; parse_json_content below has the final say
+                parser, events = None, []
+            for path, value in events:
+                if report_fields(progress, path, value) and first_field_ms is None:
+                    first_field_ms = round((perf_counter() - start) * 1000, 1)
+        now = perf_counter()
+        if now - last_report >= STREAM_PROGRESS_INTERVAL:
+            last_report = now
+            progress("tokens", {"tokens": chars // CHARS_PER_TOKEN})
+
+    if meta is not None:
+        meta["llm"] = {**meta.get("llm", {"chunks": 1}), "stream": True,
+                       "first_field_ms": first_field_ms,
+                       "output_tokens": chars // CHARS_PER_TOKEN}
+    # only the final parse counts; the incremental parser overlaps the stream
+    start = perf_counter()
+    data = parse_json_content("".join(parts))
+    _record_parse_ms(meta, (perf_counter() - start) * 1000)
+    return data
 
 
 def parse_json_content(content):
@@ -133,144 +363,6 @@ def parse_json_content(content):
         return json.loads(match.group(0))
 
 
-def normalize_extraction(data, raw_text=None, filename=None, mime_type=None):
-    data = data or {}
-    document = data.get("document") or {}
-    header = data.get("header") or {}
-    details = data.get("details") or []
-
-    if raw_text and not document.get("RawText"):
-        document["RawText"] = raw_text[:20000]
-    if filename:
-        document.setdefault("Filename", filename)
-    if mime_type:
-        document.setdefault("MimeType", mime_type)
-
-    def safe_float(value):  # sanitize to float
-        if value is None or value == "":
-            return None
-        if isinstance(value, (int, float)):
-            return float(value)
-        value = str(value).replace(",", "")
-        value = re.sub(r"[^0-9.\-]", "", value)
-        try:
-            return float(value)
-        except ValueError:
-            return None
-
-    def safe_int(value):  # sanitize to int
-        if value is None or value == "":
-            return None
-        if isinstance(value, int):
-            return value
-        value = str(value).strip()
-        value = re.sub(r"[^0-9\-]", "", value)
-        try:
-            return int(value)
-        except ValueError:
-            return None
-
-    def parse_date(value):  # sanitize to date
-        if not value:
-            return None
-        if isinstance(value, datetime):
-            return value.date().isoformat()
-        value = str(value).strip()
-        for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%b %d, %Y"):
-            try:
-                return datetime.strptime(value, fmt).date().isoformat()
-            except ValueError:
-                continue
-        return None
-
-    def apply_terms(invoice_date, terms):
-        if not invoice_date or not terms:
-            return None
-        match = re.search(r"net\s*(\d+)", terms, re.IGNORECASE)
-        if not match:
-            return None
-        try:
-            days = int(match.group(1))
-        except ValueError:
-            return None
-        date_obj = datetime.strptime(invoice_date, "%Y-%m-%d")
-        return (date_obj + timedelta(days=days)).date().isoformat()
-
-    # Normalize document fields
-    for key in ["Subtotal", "Tax", "Freight", "Total"]:
-        document[key] = safe_float(document.get(key))
-
-    if document.get("InvoiceDate"):
-        document["InvoiceDate"] = parse_date(document.get("InvoiceDate"))
-    if document.get("DueDate"):
-        document["DueDate"] = parse_date(document.get("DueDate"))
-
-    if not document.get("DueDate"):
-        due_from_terms = apply_terms(document.get("InvoiceDate"), document.get("Terms"))
-        if due_from_terms:
-            document["DueDate"] = due_from_terms
-
-    # sanitize header fields
-    header["OrderDate"] = parse_date(
-        header.get("OrderDate") or document.get("InvoiceDate"))
-    header["DueDate"] = parse_date(header.get("DueDate") or document.get("DueDate"))
-    header["ShipDate"] = parse_date(header.get("ShipDate"))
-    header["SalesOrderNumber"] = header.get(
-        "SalesOrderNumber") or document.get("InvoiceNumber")
-
-    header["CustomerID"] = safe_int(header.get("CustomerID"))
-
-    header["SubTotal"] = safe_float(header.get("SubTotal") or document.get("Subtotal"))
-    header["TaxAmt"] = safe_float(header.get("TaxAmt") or document.get("Tax"))
-    header["Freight"] = safe_float(header.get("Freight") or document.get("Freight"))
-    header["TotalDue"] = safe_float(header.get("TotalDue") or document.get("Total"))
-
-    if header.get("RevisionNumber") is None:
-        header["RevisionNumber"] = 0
-    if header.get("Status") is None:
-        header["Status"] = 5
-    if header.get("OnlineOrderFlag") is None:
-        header["OnlineOrderFlag"] = 1
-
-    normalized_details = []
-    for item in details:
-        item = item or {}
-        item["OrderQty"] = safe_int(item.get("OrderQty"))
-        item["UnitPrice"] = safe_float(item.get("UnitPrice"))
-        item["UnitPriceDiscount"] = safe_float(item.get("UnitPriceDiscount")) or 0.0
-        item["LineTotal"] = safe_float(item.get("LineTotal"))
-        if item.get("LineTotal") is None and item.get(
-                "OrderQty") and item.get("UnitPrice") is not None:
-            item["LineTotal"] = item["OrderQty"] * item["UnitPrice"]
-        normalized_details.append(item)
-
-    details = normalized_details
-
-    if header.get("SubTotal") is None:
-        line_sum = sum([item.get("LineTotal") or 0 for item in details])
-        header["SubTotal"] = line_sum if line_sum else None
-
-    if header.get("TotalDue") is None:
-        subtotal = header.get("SubTotal") or 0
-        tax = header.get("TaxAmt") or 0
-        freight = header.get("Freight") or 0
-        total = subtotal + tax + freight
-        header["TotalDue"] = total if total else None
-
-    if document.get("Subtotal") is None:
-        document["Subtotal"] = header.get("SubTotal")
-
-    if document.get("Tax") is None:
-        document["Tax"] = header.get("TaxAmt")
-
-    if document.get("Freight") is None:
-        document["Freight"] = header.get("Freight")
-
-    if document.get("Total") is None:
-        document["Total"] = header.get("TotalDue")
-    return {"document": document, "header": header, "details": details}
-
-
 def mock_extract(text):
     text = text or ""
     result = {
@@ -0,0 +1,212 @@
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LLM_ERRORS, LLM_REQUESTS, LLM_RESPONSE_FORMAT_FALLBACKS
+
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 10))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", 0))  # 0 disables the limiter
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 20))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 90))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, response=None):
+    # Retry-After wins when the server sends one; otherwise full-jitter exponential
+    delay = retry_after_seconds(response)
+    if delay is not None:
+        return min(delay, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class LLMClient:
+    def __init__(
+        self,
+        pool_size=LLM_POOL_SIZE,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        rate_per_sec=LLM_RATE_PER_SEC,
+        burst=LLM_RATE_BURST,
+        max_retries=LLM_MAX_RETRIES,
+        timeout=LLM_TIMEOUT,
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._bucket = TokenBucket(rate_per_sec, burst) if rate_per_sec > 0 else None
+        self._capabilities = {}
+        self._capabilities_lock = threading.Lock()
+
+    def supports(self, base_url, model, capability):
+        return self._capabilities.get((base_url, model, capability), True)
+
+    def set_capability(self, base_url, model, capability, supported):
+        with self._capabilities_lock:
+            self._capabilities[(base_url, model, capability)] = supported
+
+    def post(self, url, headers, payload, stream=False):
+        # retries only cover getting a response. A streamed response keeps its
+        # concurrency slot until it is closed, since its body is the generation.
+        attempt = 0
+        while True:
+            if self._bucket:
+                self._bucket.acquire()
+            LLM_REQUESTS.inc()
+            self._slots.acquire()
+            try:
+                response = self.session.post(
+                    url, headers=headers, json=payload, timeout=self.timeout,
+                    stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self._slots.release()
+                LLM_ERRORS.inc(reason="timeout" if isinstance(exc, requests.Timeout)
+                               else "connection")
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                self._slots.release()
+                raise
+            if stream:
+                self._release_on_close(response)
+            else:
+                self._slots.release()
+            if response.status_code >= 400:
+                LLM_ERRORS.inc(reason=str(response.status_code))
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                response.close()
+                time.sleep(backoff_delay(attempt, response))
+                attempt += 1
+                continue
+            return response
+
+    def _release_on_close(self, response):
+        close = response.close
+        released = []
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    self._slots.release()
+
+        response.close = close_and_release
+
+    def _post_chat(self, base_url, api_key, payload, stream=False):
+        url = base_url.rstrip("/") + "/chat/completions"
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        model = payload.get("model")
+        payload = {**payload}
+
+        if "response_format" in payload and not self.supports(
+                base_url, model, "response_format"):
+            payload.pop("response_format")
+
+        response = self.post(url, headers, payload, stream=stream)
+        if (400 <= response.status_code < 500 and response.status_code not in RETRY_STATUSES
+                and "response_format" in payload):
+            response.close()
+            LLM_RESPONSE_FORMAT_FALLBACKS.inc()
+            payload.pop("response_format")
+            response = self.post(url, headers, payload, stream=stream)
+            if response.ok:
+                # remember for the rest of the process so we pay for the fallback once
+                self.set_capability(base_url, model, "response_format", False)
+
+        if not response.ok:
+            # a streamed response holds its concurrency slot until closed
+            response.close()
+        response.raise_for_status()
+        return response
+
+    def chat_completion(self, base_url, api_key, payload):
+        return self._post_chat(base_url, api_key, payload).json()
+
+    def chat_completion_stream(self, base_url, api_key, payload):
+        # yields content deltas from a server-sent-events completion; the
+        # concurrency slot is held until the body is read or the generator closed
+        response = self._post_chat(base_url, api_key, {**payload, "stream": True}, stream=True)
+        with response:
+            # decode per line: providers often omit the charset on text/event-stream
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    # read on to the end of the body so the connection is reused
+                    continue
+                choices = json.loads(data).get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
@@ -0,0 +1,200 @@
+import bisect
+import threading
+from contextlib import ContextDecorator
+from time import perf_counter
+
+# In-process Prometheus metrics, rendered in the text exposition format by
+# GET /api/metrics. An update is a dict lookup and a few additions under one
+# lock. Each process keeps its own values, so scrape every worker.
+
+# seconds; covers a fast SQLite fetch up to a slow vision call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def track(self, **labels):
+        # with GAUGE.track(): ... counts the block while it runs
+        return _Tracked(self, labels)
+
+
+class _Tracked(ContextDecorator):
+    def __init__(self, gauge, labels):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec(**self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        # context manager and decorator observing the elapsed seconds
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, [list(series[0]), series[1], series[2]])
+                            for key, series in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # as a decorator, every call gets its own start time
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start, **self.labels)
+        return False
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "extraction_stage_seconds",
+    "Time spent in each extraction stage (upload, cache, text, image, template, llm, "
+    "parse, normalize).", ["stage"])
+DB_SECONDS = Histogram(
+    "db_operation_seconds", "Time spent in order reads and writes.", ["operation"])
+EXTRACTIONS_IN_FLIGHT = Gauge(
+    "extractions_in_flight", "Extractions currently running in this process.")
+EXTRACTIONS = Counter(
+    "extractions_total", "Finished extractions by outcome.", ["status"])
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes of uploads written to UPLOAD_DIR.")
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "Chat completion HTTP attempts, retries included.")
+LLM_ERRORS = Counter(
+    "llm_provider_errors_total",
+    "Failed chat completion attempts by reason (status code, timeout, connection).",
+    ["reason"])
+LLM_RESPONSE_FORMAT_FALLBACKS = Counter(
+    "llm_response_format_fallbacks_total",
+    "Requests retried without response_format after the provider rejected it.")
+CACHE_LOOKUPS = Counter(
+    "extraction_cache_lookups_total", "Extraction cache lookups by result and tier.",
+    ["result", "tier"])
+PDF_TEXT_CACHE_LOOKUPS = Counter(
+    "pdf_text_cache_lookups_total", "PDF page text cache lookups by result and tier.",
+    ["result", "tier"])
+READ_CACHE_LOOKUPS = Counter(
+    "db_read_cache_lookups_total",
+    "Order read cache lookups by query, result and tier (memory, shared).",
+    ["query", "result", "tier"])
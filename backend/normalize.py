@@ -0,0 +1,236 @@
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from db import DETAIL_COLUMNS, DOCUMENT_COLUMNS, HEADER_COLUMNS
+
+# Field-by-field version of the original normalize_extraction with identical
+# output, compiled once instead of redefining its helpers on every call.
+# `fallback` is a document field used when the value is empty (header only);
+# `default` replaces a converted value that is empty, or a raw value that is
+# None; `only_if_set` leaves empty values untouched instead of clearing them.
+
+Field = namedtuple("Field", "name kind fallback default only_if_set")
+Field.__new__.__defaults__ = (None, None, False)
+
+DOCUMENT_FIELDS = [
+    Field("Subtotal", "float"),
+    Field("Tax", "float"),
+    Field("Freight", "float"),
+    Field("Total", "float"),
+    Field("InvoiceDate", "date", only_if_set=True),
+    Field("DueDate", "date", only_if_set=True),
+]
+
+HEADER_FIELDS = [
+    Field("OrderDate", "date", fallback="InvoiceDate"),
+    Field("DueDate", "date", fallback="DueDate"),
+    Field("ShipDate", "date"),
+    Field("SalesOrderNumber", None, fallback="InvoiceNumber"),
+    Field("CustomerID", "int"),
+    Field("SubTotal", "float", fallback="Subtotal"),
+    Field("TaxAmt", "float", fallback="Tax"),
+    Field("Freight", "float", fallback="Freight"),
+    Field("TotalDue", "float", fallback="Total"),
+    Field("RevisionNumber", None, default=0),
+    Field("Status", None, default=5),
+    Field("OnlineOrderFlag", None, default=1),
+]
+
+DETAIL_FIELDS = [
+    Field("OrderQty", "int"),
+    Field("UnitPrice", "float"),
+    Field("UnitPriceDiscount", "float", default=0.0),
+    Field("LineTotal", "float"),
+]
+
+# document total <- header total when the extraction left it empty
+DOCUMENT_BACKFILL = [("Subtotal", "SubTotal"), ("Tax", "TaxAmt"), ("Freight", "Freight"),
+                     ("Total", "TotalDue")]
+
+RAW_TEXT_LIMIT = 20000
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%b %d, %Y")
+# separators a date format needs literally; no directive matches them, so a value
+# can only parse with formats whose separators are exactly the ones it contains
+_DATE_SEPARATORS = frozenset("-/,")
+_FORMATS_BY_SEPARATORS = {}
+for _fmt in DATE_FORMATS:
+    _FORMATS_BY_SEPARATORS.setdefault(
+        frozenset(_fmt) & _DATE_SEPARATORS, []).append(_fmt)
+_ISO_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})", re.ASCII)
+_TERMS_DAYS = re.compile(r"net\s*(\d+)", re.IGNORECASE)
+_NOT_FLOAT = re.compile(r"[^0-9.\-]")
+_NOT_INT = re.compile(r"[^0-9\-]")
+
+
+def safe_float(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = _NOT_FLOAT.sub("", str(value).replace(",", ""))
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def safe_int(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    if not (value.isdigit() and value.isascii()):
+        value = _NOT_INT.sub("", value)
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_text(text):
+    match = _ISO_DATE.fullmatch(text)
+    if match:
+        try:
+            return date(*map(int, match.groups())).isoformat()
+        except ValueError:
+            pass
+    for fmt in _FORMATS_BY_SEPARATORS.get(frozenset(text) & _DATE_SEPARATORS, ()):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return _parse_date_text(str(value).strip())
+
+
+@lru_cache(maxsize=1024)
+def apply_terms(invoice_date, terms):
+    # invoice_date is already ISO (parse_date output)
+    if not invoice_date or not terms:
+        return None
+    match = _TERMS_DAYS.search(terms)
+    if not match:
+        return None
+    try:
+        days = int(match.group(1))
+    except ValueError:
+        return None
+    return (date.fromisoformat(invoice_date) + timedelta(days=days)).isoformat()
+
+
+CONVERTERS = {"float": safe_float, "int": safe_int, "date": parse_date, None: None}
+
+
+def _compile(fields, columns, section):
+    # runs of plain conversions become one (None, [(name, convert), ...]) step so
+    # the common case skips the fallback/default checks
+    compiled = []
+    for field in fields:
+        if field.name not in columns:
+            raise ValueError(f"{section} field {field.name} is not a {section} column")
+        convert = CONVERTERS[field.kind]
+        if convert and not (field.fallback or field.default is not None or field.only_if_set):
+            if not compiled or compiled[-1][0] is not None:
+                compiled.append((None, []))
+            compiled[-1][1].append((field.name, convert))
+        else:
+            compiled.append((field.name, (convert, field.fallback, field.default,
+                                          field.only_if_set)))
+    return compiled
+
+
+_DOCUMENT_STEPS = _compile(DOCUMENT_FIELDS, DOCUMENT_COLUMNS, "document")
+_HEADER_STEPS = _compile(HEADER_FIELDS, HEADER_COLUMNS, "header")
+_DETAIL_STEPS = _compile(DETAIL_FIELDS, DETAIL_COLUMNS, "detail")
+
+
+def _apply(record, steps, document=None):
+    for name, step in steps:
+        if name is None:
+            for field, convert in step:
+                record[field] = convert(record.get(field))
+            continue
+        convert, fallback, default, only_if_set = step
+        value = record.get(name)
+        if only_if_set and not value:
+            continue
+        if fallback:
+            value = value or document.get(fallback)
+        if convert is None:
+            if value is None and default is not None:
+                value = default
+        else:
+            value = convert(value)
+            if default is not None:
+                value = value or default
+        record[name] = value
+
+
+def normalize_extraction(data, raw_text=None, filename=None, mime_type=None):
+    # mutates and returns the document/header/detail dicts of data, like before
+    data = data or {}
+    document = data.get("document") or {}
+    header = data.get("header") or {}
+    details = data.get("details") or []
+
+    if raw_text and not document.get("RawText"):
+        document["RawText"] = raw_text[:RAW_TEXT_LIMIT]
+    if filename:
+        document.setdefault("Filename", filename)
+    if mime_type:
+        document.setdefault("MimeType", mime_type)
+
+    _apply(document, _DOCUMENT_STEPS)
+    if not document.get("DueDate"):
+        due_from_terms = apply_terms(document.get("InvoiceDate"), document.get("Terms"))
+        if due_from_terms:
+            document["DueDate"] = due_from_terms
+
+    _apply(header, _HEADER_STEPS, document)
+
+    normalized_details = []
+    for item in details:
+        item = item or {}
+        _apply(item, _DETAIL_STEPS)
+        if item.get("LineTotal") is None and item.get(
+                "OrderQty") and item.get("UnitPrice") is not None:
+            item["LineTotal"] = item["OrderQty"] * item["UnitPrice"]
+        normalized_details.append(item)
+
+    if header.get("SubTotal") is None:
+        line_sum = sum([item.get("LineTotal") or 0 for item in normalized_details])
+        header["SubTotal"] = line_sum if line_sum else None
+
+    if header.get("TotalDue") is None:
+        total = (header.get("SubTotal") or 0) + (header.get("TaxAmt") or 0) + (
+            header.get("Freight") or 0)
+        header["TotalDue"] = total if total else None
+
+    for document_field, header_field in DOCUMENT_BACKFILL:
+        if document.get(document_field) is None:
+            document[document_field] = header.get(header_field)
+    return {"document": document, "header": header, "details": normalized_details}
+
+
+def normalize_extractions(items, raw_texts=None, filenames=None, mime_types=None):
+    # batch form for bulk paths; the optional lists line up with items
+    count = len(items)
+    raw_texts = raw_texts or [None] * count
+    filenames = filenames or [None] * count
+    mime_types = mime_types or [None] * count
+    return [
+        normalize_extraction(item, raw_text, filename, mime_type)
+        for item, raw_text, filename, mime_type in zip(items, raw_texts, filenames, mime_types)
+    ]
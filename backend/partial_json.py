@@ -0,0 +1,108 @@
+import json
+import re
+from json.decoder import scanstring
+
+# Incremental JSON parser for streamed model output. feed() takes text as it
+# arrives and returns (path, value) for every value completed so far, e.g.
+# (("document", "VendorName"), "Acme") or (("details", 0), {...}), so callers can
+# act on fields long before the closing brace. Text before the first "{" (a code
+# fence, a preamble) and after the top-level object is ignored.
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_SCALAR = re.compile(r"-?[0-9][0-9.eE+\-]*|true|false|null")
+_LITERALS = ("true", "false", "null")
+
+
+class PartialJSONParser:
+    def __init__(self):
+        self._buffer = ""
+        # frames of [container, key]; key is the pending object key, or None
+        self._stack = []
+        self._expect_key = False
+        self.started = False
+        self.done = False
+        self.value = None
+
+    def _path(self):
+        path = []
+        for container, key in self._stack:
+            path.append(key if isinstance(container, dict) else len(container))
+        return tuple(path)
+
+    def _complete(self, value, events):
+        if not self._stack:
+            self.value = value
+            self.done = True
+            return
+        path = self._path()
+        container, key = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+            self._stack[-1][1] = None
+        else:
+            container.append(value)
+        events.append((path, value))
+
+    def feed(self, text):
+        events = []
+        if self.done:
+            return events
+        buffer = self._buffer + text
+        pos = 0
+        if not self.started:
+            pos = buffer.find("{")
+            if pos < 0:
+                self._buffer = ""
+                return events
+            self.started = True
+
+        while not self.done:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if char in "{[":
+                self._stack.append([{} if char == "{" else [], None])
+                self._expect_key = char == "{"
+                pos += 1
+            elif char in "}]":
+                container, _ = self._stack.pop()
+                pos += 1
+                self._complete(container, events)
+                self._expect_key = False
+            elif char == ",":
+                self._expect_key = isinstance(self._stack[-1][0], dict)
+                pos += 1
+            elif char == ":":
+                pos += 1
+            elif char == '"':
+                try:
+                    value, end = scanstring(buffer, pos + 1)
+                except json.JSONDecodeError:
+                    break  # unterminated, wait for the rest
+                pos = end
+                if self._expect_key:
+                    self._stack[-1][1] = value
+                    self._expect_key = False
+                else:
+                    self._complete(value, events)
+            else:
+                match = _SCALAR.match(buffer, pos)
+                if not match:
+                    rest = buffer[pos:]
+                    if rest == "-" or any(literal.startswith(rest) for literal in _LITERALS):
+                        break
+                    raise json.JSONDecodeError("Unexpected character", buffer, pos)
+                # a scalar that runs to the end of the buffer may still be growing
+                if match.end() >= len(buffer):
+                    break
+                pos = match.end()
+                self._complete(json.loads(match.group(0)), events)
+
+        # keep only what has not been consumed
+        self._buffer = buffer[pos:]
+        return events
+
+    def close(self):
+        # flush a trailing scalar the buffer ended on
+        return self.feed(" ") if self.started and not self.done else []
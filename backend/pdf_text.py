@@ -0,0 +1,169 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from time import perf_counter
+
+# Keep this module free of app imports: pool workers are spawned processes that
+# import it fresh and only need pypdf.
+
+# 0 keeps extraction in the request thread; even 1 worker moves page parsing
+# off the GIL the request and job threads share
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+# documents with at most this many selected pages are extracted by a single
+# worker (or in-thread when no timeout applies) instead of split across workers
+PDF_INLINE_PAGES = int(os.getenv("PDF_INLINE_PAGES", 4))
+# 0 means no limit; with either set, only the first N and last M pages are read
+PDF_FIRST_PAGES = int(os.getenv("PDF_FIRST_PAGES", 0))
+PDF_LAST_PAGES = int(os.getenv("PDF_LAST_PAGES", 0))
+# 0 disables it. Only enforced with PDF_WORKERS > 0: a thread cannot be stopped,
+# so with PDF_WORKERS=0 a pathological document can hold the request thread.
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", 60))
+
+
+class PdfTimeout(Exception):
+    pass
+
+
+def select_pages(page_count, first=PDF_FIRST_PAGES, last=PDF_LAST_PAGES):
+    if first <= 0 and last <= 0:
+        return list(range(page_count))
+    head = range(min(max(first, 0), page_count))
+    tail = range(max(page_count - max(last, 0), 0), page_count)
+    return sorted(set(head) | set(tail))
+
+
+def _open(file_path):
+    from pypdf import PdfReader
+
+    return PdfReader(file_path)
+
+
+def _extract_pages(file_path, page_numbers, reader=None):
+    # returns [(page_number, text, ms)]; runs in pool workers and inline
+    reader = reader or _open(file_path)
+    results = []
+    for number in page_numbers:
+        start = perf_counter()
+        text = reader.pages[number].extract_text() or ""
+        results.append((number, text, round((perf_counter() - start) * 1000, 1)))
+    return results
+
+
+def _extract_small(file_path, first, last, inline_pages):
+    # runs in a pool worker: (page_count, results), or (page_count, None) when
+    # the document has enough pages to be split across workers
+    reader = _open(file_path)
+    page_count = len(reader.pages)
+    page_numbers = select_pages(page_count, first, last)
+    if len(page_numbers) > inline_pages:
+        return page_count, None
+    return page_count, _extract_pages(file_path, page_numbers, reader=reader)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking a process that already runs request and
+            # job threads can copy locks held mid-operation into the child
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(pool):
+    # a timed-out page can keep a worker busy forever; kill the pool and let the
+    # next document start a fresh one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _chunks(items, count):
+    size, extra = divmod(len(items), count)
+    chunks = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _run_pooled(pool, futures, timeout):
+    done, pending = wait(futures, timeout=timeout)
+    if pending:
+        _reset_pool(pool)
+        raise PdfTimeout(f"PDF text extraction exceeded {timeout:g}s")
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            raise
+    return results
+
+
+def _submit(pool, fn, *args):
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+
+def _extract_parallel(file_path, page_numbers, timeout):
+    pool = _get_pool()
+    chunks = _chunks(page_numbers, min(PDF_WORKERS, len(page_numbers)))
+    futures = [_submit(pool, _extract_pages, file_path, chunk) for chunk in chunks]
+    return [page for pages in _run_pooled(pool, futures, timeout) for page in pages]
+
+
+def extract_pdf(file_path, first=PDF_FIRST_PAGES, last=PDF_LAST_PAGES,
+                timeout=PDF_TIMEOUT_SECONDS):
+    # returns (text or None, meta) with page count and per-page timings
+    start = perf_counter()
+    if PDF_WORKERS > 0 and timeout > 0:
+        # with a timeout even opening the document happens in a worker, so no
+        # part of it can run unbounded on the request thread
+        pool = _get_pool()
+        future = _submit(pool, _extract_small, file_path, first, last, PDF_INLINE_PAGES)
+        page_count, results = _run_pooled(pool, [future], timeout)[0]
+        page_numbers = select_pages(page_count, first, last)
+        parallel = results is None
+        if parallel:
+            remaining = max(timeout - (perf_counter() - start), 0.001)
+            results = _extract_parallel(file_path, page_numbers, remaining)
+    else:
+        reader = _open(file_path)
+        page_count = len(reader.pages)
+        page_numbers = select_pages(page_count, first, last)
+        parallel = PDF_WORKERS > 0 and len(page_numbers) > PDF_INLINE_PAGES
+        if parallel:
+            results = _extract_parallel(file_path, page_numbers, None)
+        else:
+            results = _extract_pages(file_path, page_numbers, reader=reader)
+
+    # pages are separated by form feeds, which chunking and compaction split on
+    text = "\f".join(text for _, text, _ in results).strip() or None
+    meta = {
+        "page_count": page_count,
+        "pages": [number + 1 for number, _, _ in results],
+        "page_ms": [ms for _, _, ms in results],
+        "parallel": parallel,
+        "workers": min(PDF_WORKERS, len(page_numbers)) if parallel else 1,
+        "extract_ms": round((perf_counter() - start) * 1000, 1),
+    }
+    return text, meta
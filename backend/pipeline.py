@@ -0,0 +1,232 @@
+import base64
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from time import perf_counter
+
+import cache
+import vendor_templates
+from metrics import EXTRACTIONS, EXTRACTIONS_IN_FLIGHT, STAGE_SECONDS, UPLOAD_BYTES
+from image_prep import prepare_image
+from llm import extract_invoice, report_fields
+from normalize import normalize_extraction
+from pdf_text import PDF_FIRST_PAGES, PDF_LAST_PAGES, extract_pdf
+
+UPLOAD_DIR = os.getenv(
+    "UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "data", "uploads")
+)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+# whole request body, so a batch can carry many files of up to MAX_UPLOAD_BYTES
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", 512 * 1024 * 1024))
+
+# base64 works on 3-byte groups, so chunk reads must be a multiple of 3
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+Upload = namedtuple("Upload", "path size sha256")
+
+
+class UnsupportedUpload(ValueError):
+    pass
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def elapsed_ms(start):
+    return round((perf_counter() - start) * 1000, 1)
+
+
+def stream_upload(source, filename, prefix=None, max_bytes=MAX_UPLOAD_BYTES):
+    # copy a file-like object to UPLOAD_DIR in fixed-size chunks, hashing as we
+    # go; without a prefix the stored name is keyed by content so concurrent
+    # uploads sharing a filename never read each other's bytes
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+        file_path = os.path.join(UPLOAD_DIR, f"{prefix or sha256[:16]}_{filename}")
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    UPLOAD_BYTES.inc(size)
+    return Upload(file_path, size, sha256)
+
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_file_base64(file_path):
+    with open(file_path, "rb") as f:
+        return "".join(
+            base64.b64encode(chunk).decode("ascii")
+            for chunk in iter(lambda: f.read(BASE64_CHUNK_SIZE), b"")
+        )
+
+
+def read_text_file(file_path):
+    with open(file_path, "rb") as f:
+        data = f.read()
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1", errors="ignore")
+
+
+def extract_text_from_pdf(file_path, digest=None, meta=None):
+    try:
+        import pypdf  # noqa: F401
+    except Exception:
+        return None
+    # page text only depends on the bytes and the page window, so it has its own
+    # cache that outlives extraction results tied to a provider/model/prompt
+    cache_key = None
+    if cache.PDF_TEXT_CACHE_ENABLED:
+        digest = digest or hash_file(file_path)
+        cache_key = f"{digest}:{PDF_FIRST_PAGES}:{PDF_LAST_PAGES}"
+        cached, _ = cache.pdf_text_cache.lookup(cache_key)
+        if cached is not None:
+            if meta is not None:
+                meta["pdf"] = {**cached["pdf"], "cached": True}
+            return cached["text"]
+
+    text, pdf_meta = extract_pdf(file_path)
+    if cache_key:
+        cache.pdf_text_cache.store(cache_key, {"text": text, "pdf": pdf_meta})
+    if meta is not None:
+        meta["pdf"] = {**pdf_meta, "cached": False}
+    return text
+
+
+def load_text_from_file(file_path, filename, mime_type, digest=None, meta=None):
+    if mime_type and mime_type.startswith("text/"):
+        return read_text_file(file_path)
+    if filename and filename.lower().endswith((".txt", ".md", ".csv")):
+        return read_text_file(file_path)
+    if filename and filename.lower().endswith(".pdf"):
+        return extract_text_from_pdf(file_path, digest=digest, meta=meta)
+    return None
+
+
+def _report_extracted(progress, extracted):
+    # the field events a streamed completion would have sent, all at once
+    for section in ("document", "header"):
+        for name, value in ((extracted or {}).get(section) or {}).items():
+            report_fields(progress, (section, name), value)
+    for index, item in enumerate((extracted or {}).get("details") or []):
+        report_fields(progress, ("details", index), item)
+
+
+def run_extraction(file_path, filename, mime_type, stages=None, digest=None, progress=None):
+    # upload -> text -> extract_invoice -> normalize_extraction, timing each stage;
+    # progress(event, data) is called as stages finish (see /api/extract/stream)
+    with EXTRACTIONS_IN_FLIGHT.track():
+        try:
+            normalized = _run_extraction(file_path, filename, mime_type, stages, digest, progress)
+        except Exception:
+            EXTRACTIONS.inc(status="error")
+            raise
+    EXTRACTIONS.inc(status="ok")
+    for stage, ms in normalized["meta"]["stages"].items():
+        STAGE_SECONDS.observe(ms / 1000, stage=stage[:-3])
+    return normalized
+
+
+def _run_extraction(file_path, filename, mime_type, stages, digest, progress):
+    stages = dict(stages or {})
+    meta = {}
+
+    start = perf_counter()
+    cache_key = None
+    cached = None
+    if cache.CACHE_ENABLED:
+        digest = digest or hash_file(file_path)
+        cache_key = cache.extraction_cache_key(digest, mime_type)
+        cached, tier = cache.lookup(cache_key)
+        meta["cache"] = {"hit": cached is not None, "tier": tier}
+        stages["cache_ms"] = elapsed_ms(start)
+
+    if cached is not None:
+        text = cached["text"]
+        extracted = cached["extracted"]
+    else:
+        text_start = perf_counter()
+        text = load_text_from_file(file_path, filename, mime_type, digest=digest, meta=meta)
+        stages["text_ms"] = elapsed_ms(text_start)
+        if progress and text:
+            progress("text", {"chars": len(text), "text_ms": stages["text_ms"]})
+        image_b64 = None
+        image_mime = mime_type
+        if mime_type.startswith("image/"):
+            image_start = perf_counter()
+            image_data, image_mime, meta["image"] = prepare_image(file_path, mime_type)
+            if image_data is None:
+                image_b64 = encode_file_base64(file_path)
+            else:
+                image_b64 = base64.b64encode(image_data).decode("ascii")
+            stages["image_ms"] = elapsed_ms(image_start)
+            if progress:
+                progress("image", {**meta["image"], "image_ms": stages["image_ms"]})
+
+        if not text and not image_b64:
+            raise UnsupportedUpload("Unsupported file type or empty content")
+
+        template_start = perf_counter()
+        extracted = None
+        if text and vendor_templates.TEMPLATES_ENABLED:
+            extracted, meta["template"] = vendor_templates.apply_template(text)
+            stages["template_ms"] = elapsed_ms(template_start)
+
+        if extracted is None:
+            llm_start = perf_counter()
+            extracted = extract_invoice(text=text, image_b64=image_b64, mime_type=image_mime,
+                                        meta=meta, progress=progress)
+            stages["llm_ms"] = elapsed_ms(llm_start)
+            if "parse_ms" in meta.get("llm", {}):
+                # part of llm_ms
+                stages["parse_ms"] = meta["llm"].pop("parse_ms")
+                if not meta["llm"]:
+                    del meta["llm"]
+            vendor_templates.record_llm_call(stages["llm_ms"])
+            if cache_key:
+                cache.store(cache_key, {"text": text, "extracted": extracted})
+
+    if progress and not meta.get("llm", {}).get("stream"):
+        _report_extracted(progress, extracted)
+
+    normalize_start = perf_counter()
+    normalized = normalize_extraction(
+        extracted,
+        raw_text=text,
+        filename=filename,
+        mime_type=mime_type)
+    stages["normalize_ms"] = elapsed_ms(normalize_start)
+
+    normalized["meta"] = {
+        "processing_ms": int((perf_counter() - start) * 1000),
+        "stages": stages,
+        **meta,
+    }
+    return normalized
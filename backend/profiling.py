@@ -0,0 +1,239 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# Opt-in request profiling. A request is profiled when it carries
+# "X-Profile: <PROFILE_SECRET>" or is picked by PROFILE_SAMPLE_RATE (0..1).
+# With neither set the WSGI app is not wrapped at all.
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(os.path.dirname(__file__), "data", "profiles")
+)
+# only the slowest PROFILE_KEEP profiles are kept
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 20))
+PROFILE_HEADER = "HTTP_X_PROFILE"
+
+# collapsed stacks below this share of the request are dropped
+COLLAPSED_MIN_FRACTION = 0.0005
+
+_ID = re.compile(r"^[0-9T]+-[0-9a-f]+$")
+
+# one profiled request at a time: cProfile cannot run two profilers at once on
+# newer Pythons, and it keeps the overhead to a single request
+_profile_lock = threading.Lock()
+_prune_lock = threading.Lock()
+
+
+def enabled():
+    return bool(PROFILE_SECRET) or PROFILE_SAMPLE_RATE > 0
+
+
+def install(app):
+    if enabled():
+        app.wsgi_app = ProfilerMiddleware(app.wsgi_app)
+
+
+def secret_matches(header):
+    # WSGI header values are latin-1 decoded str; compare_digest rejects non-ASCII
+    # str, so compare bytes
+    return bool(header and PROFILE_SECRET) and hmac.compare_digest(
+        header.encode("latin-1", "replace"), PROFILE_SECRET.encode())
+
+
+def _trigger(environ):
+    if secret_matches(environ.get(PROFILE_HEADER)):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+class ProfilerMiddleware:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        trigger = _trigger(environ)
+        if trigger is None or not _profile_lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}"
+        response = {}
+
+        def profiled_start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            return start_response(status, headers + [("X-Profile-Id", profile_id)], exc_info)
+
+        profiler = cProfile.Profile()
+        start = perf_counter()
+        try:
+            profiler.enable()
+            try:
+                body = self.wsgi_app(environ, profiled_start_response)
+            finally:
+                profiler.disable()
+        except BaseException:
+            _profile_lock.release()
+            raise
+        # streamed bodies (SSE, NDJSON) do their work while being iterated
+        return _ProfiledBody(body, profiler, start, {
+            "id": profile_id,
+            "method": environ.get("REQUEST_METHOD"),
+            "path": environ.get("PATH_INFO"),
+            "query": environ.get("QUERY_STRING", ""),
+            "trigger": trigger,
+        }, response)
+
+
+class _ProfiledBody:
+    # a class rather than a generator: servers call close() even when they never
+    # iterated, and the profile is saved there
+    def __init__(self, body, profiler, start, info, response):
+        self.body = body
+        self.profiler = profiler
+        self.start = start
+        self.info = info
+        self.response = response
+        self.closed = False
+
+    def __iter__(self):
+        iterator = iter(self.body)
+        while True:
+            self.profiler.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.profiler.disable()
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.info.update(status=self.response.get("status"),
+                             duration_ms=round((perf_counter() - self.start) * 1000, 1))
+            _profile_lock.release()
+            try:
+                save_profile(self.profiler, self.info)
+            except Exception:
+                logger.exception("Failed to save profile %s", self.info["id"])
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        # builtins: ('~', 0, "<built-in method time.sleep>")
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{line})"
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(stats):
+    # cProfile only records caller -> callee edges, so each function's time is
+    # split across the stacks above it in proportion to the time spent on each
+    # edge (the approximation flameprof and similar tools make)
+    callees = {}
+    roots = []
+    total = 0.0
+    for func, (_, _, tottime, _, callers) in stats.stats.items():
+        total += tottime
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    if total <= 0:
+        return []
+
+    min_time = total * COLLAPSED_MIN_FRACTION
+    lines = {}
+
+    def visit(func, stack, cumtime):
+        _, _, tottime, func_cumtime, _ = stats.stats[func]
+        stack = stack + [_label(func)]
+        share = cumtime / func_cumtime if func_cumtime else 0.0
+        self_time = tottime * share
+        if self_time >= min_time:
+            key = ";".join(stack)
+            lines[key] = lines.get(key, 0.0) + self_time
+        for callee, edge_cumtime in callees.get(func, ()):
+            child_time = edge_cumtime * share
+            if child_time >= min_time and _label(callee) not in stack:
+                visit(callee, stack, child_time)
+
+    for root in roots:
+        visit(root, [], stats.stats[root][3])
+    # microseconds, the integer weights flamegraph.pl and speedscope expect
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(lines.items())
+            if round(seconds * 1e6) > 0]
+
+
+def save_profile(profiler, info):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, info["id"])
+    profiler.dump_stats(base + ".prof")
+    stats = pstats.Stats(profiler)
+    with open(base + ".collapsed", "w", encoding="utf-8") as f:
+        f.write("\n".join(collapsed_stacks(stats)) + "\n")
+    info = {**info, "created_at": time.time(), "total_calls": stats.total_calls}
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    logger.info("Profiled %s %s in %.0f ms: %s", info["method"], info["path"],
+                info["duration_ms"], info["id"])
+    _prune()
+
+
+def _prune():
+    with _prune_lock:
+        for info in list_profiles()[PROFILE_KEEP:]:
+            for ext in (".json", ".prof", ".collapsed"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, info["id"] + ext))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles():
+    # slowest first
+    profiles = []
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return profiles
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda info: info.get("duration_ms") or 0, reverse=True)
+    return profiles
+
+
+def profile_path(profile_id, kind):
+    # None for unknown ids, so the route can 404
+    ext = {"prof": ".prof", "collapsed": ".collapsed"}.get(kind)
+    if ext is None or not _ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,75 @@
+import os
+
+from flask import Blueprint, jsonify, request, send_file
+
+import cache
+import db
+import profiling
+
+admin_bp = Blueprint("admin", __name__)
+
+
+@admin_bp.route("/api/admin/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(cache.stats())
+
+
+@admin_bp.route("/api/admin/cache", methods=["DELETE"])
+def cache_purge():
+    return jsonify({"purged": cache.purge()})
+
+
+@admin_bp.route("/api/admin/pdf-text-cache", methods=["GET"])
+def pdf_text_cache_stats():
+    return jsonify(cache.pdf_text_cache.stats())
+
+
+@admin_bp.route("/api/admin/pdf-text-cache", methods=["DELETE"])
+def pdf_text_cache_purge():
+    return jsonify({"purged": cache.pdf_text_cache.purge()})
+
+
+@admin_bp.route("/api/admin/read-cache", methods=["GET"])
+def read_cache_stats():
+    return jsonify(db.read_cache_stats())
+
+
+@admin_bp.route("/api/admin/read-cache", methods=["DELETE"])
+def read_cache_clear():
+    db.clear_read_cache()
+    return jsonify({"cleared": True})
+
+
+def _profiles_denied():
+    # profiles expose source paths and timings, so reading them takes the same
+    # secret as the X-Profile trigger (in its own header, so that the read is
+    # not profiled itself); without PROFILE_SECRET the endpoints do not exist
+    if not profiling.PROFILE_SECRET:
+        return jsonify({"error": "Not found"}), 404
+    if not profiling.secret_matches(request.headers.get("X-Profile-Secret")):
+        return jsonify({"error": "Missing or wrong X-Profile-Secret"}), 403
+    return None
+
+
+@admin_bp.route("/api/admin/profiles", methods=["GET"])
+def profiles():
+    denied = _profiles_denied()
+    if denied:
+        return denied
+    return jsonify({
+        "enabled": profiling.enabled(),
+        "keep": profiling.PROFILE_KEEP,
+        "profiles": profiling.list_profiles(),
+    })
+
+
+@admin_bp.route("/api/admin/profiles/<profile_id>", methods=["GET"])
+def profile_download(profile_id):
+    denied = _profiles_denied()
+    if denied:
+        return denied
+    # ?format=prof (pstats, for snakeviz/pstats) or collapsed (flamegraph.pl, speedscope)
+    path = profiling.profile_path(profile_id, request.args.get("format", "prof"))
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
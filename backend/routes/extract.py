@@ -1,52 +1,62 @@
-import base64
+import json
 import mimetypes
 import os
-from io import BytesIO
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from time import perf_counter
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
-from llm import extract_invoice, normalize_extraction
+from db import insert_order, insert_orders
+from jobs import submit_job
+from pdf_text import PdfTimeout
+from pipeline import (
+    MAX_UPLOAD_BYTES,
+    UnsupportedUpload,
+    UploadTooLarge,
+    elapsed_ms,
+    run_extraction,
+    stream_upload,
+)
 
 extract_bp = Blueprint("extract", __name__)
 
-UPLOAD_DIR = os.getenv(
-    "UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "uploads")
-)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 32))
+BATCH_SAVE_GROUP = int(os.getenv("BATCH_SAVE_GROUP", 50))
+# files per batch request, zip members included, and the total uncompressed
+# size of a zip's members; checked against the archive directory up front
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 500))
+BATCH_MAX_UNZIPPED_BYTES = int(os.getenv("BATCH_MAX_UNZIPPED_BYTES", 1024 * 1024 * 1024))
+# extractions running behind /api/extract/stream at once; further streams wait
+# (after their "stored" event) for a free worker
+STREAM_CONCURRENCY = int(os.getenv("STREAM_CONCURRENCY", 8))
 
+ZIP_MIME_TYPES = ("application/zip", "application/x-zip-compressed")
+
+# room for multipart boundaries and form fields around a single file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@extract_bp.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(exc):
+    return jsonify({"error": "Request body too large"}), 413
 
-def extract_text_from_pdf(data):
-    try:
-        from pypdf import PdfReader
-    except Exception:
-        return None
-    reader = PdfReader(BytesIO(data))
-    parts = []
-    for page in reader.pages:
-        text = page.extract_text() or ""
-        parts.append(text)
-    return "\n".join(parts).strip() or None
-
-
-def load_text_from_file(data, filename, mime_type):
-    if mime_type and mime_type.startswith("text/"):
-        try:
-            return data.decode("utf-8")
-        except UnicodeDecodeError:
-            return data.decode("latin-1", errors="ignore")
-    if filename and filename.lower().endswith((".txt", ".md", ".csv")):
-        try:
-            return data.decode("utf-8")
-        except UnicodeDecodeError:
-            return data.decode("latin-1", errors="ignore")
-    if filename and filename.lower().endswith(".pdf"):
-        return extract_text_from_pdf(data)
-    return None
+
+def _wants_async():
+    value = request.args.get("async") or request.form.get("async") or ""
+    return value.lower() in ("1", "true", "yes")
 
 
 @extract_bp.route("/api/extract", methods=["POST"])
 def extract():
+    # refuse before werkzeug parses (and spools) the multipart body
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        return jsonify({"error": f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit"}), 413
     if "file" not in request.files:
         return jsonify({"error": "Missing file"}), 400
 
@@ -56,34 +66,255 @@ def extract():
         return jsonify({"error": "Empty filename"}), 400
 
     filename = secure_filename(file.filename)
-    data = file.read()
-    # print(data)
     mime_type = file.mimetype or mimetypes.guess_type(
         filename)[0] or "application/octet-stream"
     # print(mime_type)
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    with open(file_path, "wb") as f:
-        f.write(data)
 
-    text = load_text_from_file(data, filename, mime_type)
-    image_b64 = None
-    # print(text)
+    if _wants_async():
+        try:
+            job_id = submit_job(file.stream, filename, mime_type)
+        except UploadTooLarge as exc:
+            return jsonify({"error": str(exc)}), 413
+        return jsonify({"job_id": job_id, "status": "queued",
+                        "url": f"/api/jobs/{job_id}"}), 202
+
+    start = perf_counter()
+    try:
+        upload = stream_upload(file.stream, filename)
+    except UploadTooLarge as exc:
+        return jsonify({"error": str(exc)}), 413
+    stages = {"upload_ms": elapsed_ms(start)}
+
+    try:
+        normalized = run_extraction(
+            upload.path, filename, mime_type, stages=stages, digest=upload.sha256)
+    except UnsupportedUpload as exc:
+        return jsonify({"error": str(exc)}), 400
+    except PdfTimeout as exc:
+        return jsonify({"error": str(exc)}), 504
+
+    return jsonify(normalized)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+_stream_pool = None
+_stream_pool_lock = threading.Lock()
+
+
+def _get_stream_pool():
+    global _stream_pool
+    with _stream_pool_lock:
+        if _stream_pool is None:
+            _stream_pool = ThreadPoolExecutor(
+                max_workers=max(1, STREAM_CONCURRENCY), thread_name_prefix="extract-stream")
+        return _stream_pool
+
+
+def _stream_extraction(events, upload, filename, mime_type, stages, save):
+    # runs on the stream pool; every progress call becomes an SSE event
+    def progress(event, data):
+        events.put((event, data))
+
+    try:
+        normalized = run_extraction(upload.path, filename, mime_type, stages=stages,
+                                    digest=upload.sha256, progress=progress)
+        progress("result", normalized)
+        if save:
+            inserted = insert_order(normalized)
+            progress("saved", {"SalesOrderID": inserted["header"]["SalesOrderID"]})
+    except UnsupportedUpload as exc:
+        progress("error", {"error": str(exc), "status": 400})
+    except PdfTimeout as exc:
+        progress("error", {"error": str(exc), "status": 504})
+    except Exception as exc:
+        progress("error", {"error": str(exc), "status": 500})
+    finally:
+        events.put(None)
+
+
+@extract_bp.route("/api/extract/stream", methods=["POST"])
+def extract_stream():
+    # same upload as /api/extract, answered as server-sent events: stored, text or
+    # image, field/line_item/tokens while the model writes, result, saved (?save=1)
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        return jsonify({"error": f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit"}), 413
+    if "file" not in request.files:
+        return jsonify({"error": "Missing file"}), 400
+    file = request.files["file"]
+    if not file.filename:
+        return jsonify({"error": "Empty filename"}), 400
+
+    filename = secure_filename(file.filename)
+    mime_type = _guess_mime_type(filename, file.mimetype)
+    save = (request.args.get("save") or "").lower() in ("1", "true", "yes")
+    start = perf_counter()
+    try:
+        upload = stream_upload(file.stream, filename)
+    except UploadTooLarge as exc:
+        return jsonify({"error": str(exc)}), 413
+    stages = {"upload_ms": elapsed_ms(start)}
+
+    events = queue.Queue()
+    _get_stream_pool().submit(_stream_extraction, events, upload, filename, mime_type,
+                              stages, save)
 
-    if mime_type.startswith("image/"):
-        image_b64 = base64.b64encode(data).decode("ascii")
-        # print(image_b64)
+    def generate():
+        yield _sse("stored", {"filename": filename, "size": upload.size,
+                              "sha256": upload.sha256, **stages})
+        # if the client disconnects the extraction still finishes (and is cached)
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            yield _sse(*item)
+        yield _sse("done", {"elapsed_ms": elapsed_ms(start)})
 
-    if not text and not image_b64:
-        return jsonify({"error": "Unsupported file type or empty content"}), 400
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
+
+def _guess_mime_type(filename, mime_type=None):
+    if mime_type and mime_type != "application/octet-stream":
+        return mime_type
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def _store_batch_upload(source, filename, mime_type):
     start = perf_counter()
-    extracted = extract_invoice(text=text, image_b64=image_b64, mime_type=mime_type)
-    normalized = normalize_extraction(
-        extracted,
-        raw_text=text,
-        filename=filename,
-        mime_type=mime_type)
-    normalized["meta"] = {"processing_ms": int((perf_counter() - start) * 1000)}
+    upload = stream_upload(source, filename)
+    return filename, upload, mime_type, elapsed_ms(start)
 
-    return jsonify(normalized)
+
+def _unzip_uploads(stream, uploads):
+    # werkzeug spools large parts to a temp file, so the archive is read in place.
+    # zipfile never reads past a member's declared file_size, so checking the
+    # directory bounds what is written before anything is extracted.
+    with zipfile.ZipFile(stream) as archive:
+        members = []
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            filename = secure_filename(os.path.basename(info.filename))
+            if filename:
+                members.append((info, filename))
+        if len(uploads) + len(members) > BATCH_MAX_FILES:
+            raise UploadTooLarge(f"Batch exceeds the {BATCH_MAX_FILES} file limit")
+        if sum(info.file_size for info, _ in members) > BATCH_MAX_UNZIPPED_BYTES:
+            raise UploadTooLarge(
+                f"Archive exceeds the {BATCH_MAX_UNZIPPED_BYTES} byte uncompressed limit")
+        for info, filename in members:
+            if info.file_size > MAX_UPLOAD_BYTES:
+                raise UploadTooLarge(f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+
+        for info, filename in members:
+            with archive.open(info) as member:
+                uploads.append(
+                    _store_batch_upload(member, filename, _guess_mime_type(filename)))
+
+
+def _collect_batch_uploads():
+    uploads = []
+    try:
+        for file in request.files.getlist("files") + request.files.getlist("file"):
+            if not file.filename:
+                continue
+            filename = secure_filename(file.filename)
+            if filename.lower().endswith(".zip") or file.mimetype in ZIP_MIME_TYPES:
+                _unzip_uploads(file.stream, uploads)
+                continue
+            if len(uploads) >= BATCH_MAX_FILES:
+                raise UploadTooLarge(f"Batch exceeds the {BATCH_MAX_FILES} file limit")
+            uploads.append(_store_batch_upload(
+                file.stream, filename, _guess_mime_type(filename, file.mimetype)))
+    except BaseException:
+        # nothing will extract what was already stored
+        for _, upload, _, _ in uploads:
+            try:
+                os.remove(upload.path)
+            except OSError:
+                pass
+        raise
+    return uploads
+
+
+def _extract_one(index, filename, upload, mime_type, upload_ms):
+    line = {"type": "result", "index": index, "filename": filename}
+    try:
+        line["result"] = run_extraction(
+            upload.path, filename, mime_type,
+            stages={"upload_ms": upload_ms}, digest=upload.sha256)
+        line["status"] = "ok"
+    except Exception as exc:
+        line["status"] = "error"
+        line["error"] = str(exc)
+    return line
+
+
+def _save_group(lines):
+    # one transaction per group: either every order in the group lands or none do
+    try:
+        ids = insert_orders([line["result"] for line in lines])
+    except Exception as exc:
+        return {"type": "saved", "status": "error", "error": str(exc),
+                "indexes": [line["index"] for line in lines]}
+    return {"type": "saved", "status": "ok",
+            "indexes": [line["index"] for line in lines], "SalesOrderIDs": ids}
+
+
+@extract_bp.route("/api/extract/batch", methods=["POST"])
+def extract_batch():
+    # before anything is stored, so a bad parameter leaves no uploads behind
+    try:
+        concurrency = int(request.args.get("concurrency", BATCH_CONCURRENCY))
+        group_size = int(request.args.get("group", BATCH_SAVE_GROUP))
+    except ValueError:
+        return jsonify({"error": "concurrency and group must be integers"}), 400
+    try:
+        uploads = _collect_batch_uploads()
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Invalid zip archive"}), 400
+    except UploadTooLarge as exc:
+        return jsonify({"error": str(exc)}), 413
+    if not uploads:
+        return jsonify({"error": "Missing files"}), 400
+
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY, len(uploads)))
+    save = (request.args.get("save") or "").lower() in ("1", "true", "yes")
+    group_size = max(1, min(group_size, len(uploads)))
+
+    def generate():
+        start = perf_counter()
+        counts = {"ok": 0, "error": 0, "saved": 0}
+        pending = []
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            futures = [
+                pool.submit(_extract_one, index, *upload)
+                for index, upload in enumerate(uploads)
+            ]
+            for future in as_completed(futures):
+                line = future.result()
+                counts[line["status"]] += 1
+                yield json.dumps(line) + "\n"
+                if save and line["status"] == "ok":
+                    pending.append(line)
+                    if len(pending) >= group_size:
+                        saved = _save_group(pending)
+                        counts["saved"] += len(saved.get("SalesOrderIDs", []))
+                        pending = []
+                        yield json.dumps(saved) + "\n"
+            if pending:
+                saved = _save_group(pending)
+                counts["saved"] += len(saved.get("SalesOrderIDs", []))
+                yield json.dumps(saved) + "\n"
+        finally:
+            # client went away mid-stream: drop files that have not started yet
+            pool.shutdown(wait=False, cancel_futures=True)
+        yield json.dumps({"type": "done", "files": len(uploads), **counts,
+                          "concurrency": concurrency,
+                          "elapsed_ms": elapsed_ms(start)}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
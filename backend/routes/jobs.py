@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, request
+from db import fetch_job, fetch_jobs
+
+jobs_bp = Blueprint("jobs", __name__)
+
+JOBS_MAX_LIMIT = 200
+
+
+@jobs_bp.route("/api/jobs", methods=["GET"])
+def jobs():
+    try:
+        limit = int(request.args.get("limit", 25))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, JOBS_MAX_LIMIT))
+    return jsonify(fetch_jobs(limit=limit, status=request.args.get("status")))
+
+
+@jobs_bp.route("/api/jobs/<job_id>", methods=["GET"])
+def job_detail(job_id):
+    job = fetch_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job.pop("FilePath", None)
+    return jsonify(job)
@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+
+from metrics import render
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/api/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text exposition format; values are per process
+    return Response(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,32 +1,101 @@
-from flask import Blueprint, jsonify, request
-from db import db_snapshot, fetch_order, fetch_orders, insert_order, update_order
-from llm import normalize_extraction
+import sqlite3
+
+from flask import Blueprint, Response, jsonify, request
+from db import (
+    data_version,
+    db_snapshot_json,
+    fetch_order_json,
+    fetch_orders_json,
+    insert_order,
+    insert_orders,
+    order_version,
+    update_order,
+)
+from normalize import normalize_extraction, normalize_extractions
+from vendor_templates import learn_template_safely
 
 orders_bp = Blueprint("orders", __name__)
 
+MAX_PAGE_SIZE = 200
+
+
+def _conditional_json(build, etag=None):
+    # strong ETag from the data version; a matching If-None-Match is answered
+    # before SQLite is touched. The compressed variants carry a -gzip/-br suffix.
+    # build() returns JSON text, so a read cache hit is sent as stored.
+    etag = etag or f"v{data_version()}"
+    for candidate in (etag, f"{etag}-gzip", f"{etag}-br"):
+        if request.if_none_match.contains_weak(candidate):
+            response = Response(status=304)
+            response.set_etag(candidate)
+            break
+    else:
+        response = Response(build() + "\n", mimetype="application/json")
+        response.set_etag(etag)
+    # cache, but revalidate every time
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 
 @orders_bp.route("/api/orders", methods=["GET", "POST"])
 def orders():
     if request.method == "GET":
-        limit = int(request.args.get("limit", 15))
-        return jsonify(fetch_orders(limit=limit))
+        args = request.args
+        fields = args.get("fields")
+        try:
+            return _conditional_json(lambda: fetch_orders_json(
+                limit=max(1, min(int(args.get("limit", 15)), MAX_PAGE_SIZE)),
+                after=args.get("after", type=int),
+                vendor=args.get("vendor") or None,
+                date_from=args.get("date_from") or None,
+                date_to=args.get("date_to") or None,
+                min_total=args.get("min_total", type=float),
+                max_total=args.get("max_total", type=float),
+                fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            ))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
     payload = request.get_json(force=True, silent=True) or {}
     payload = normalize_extraction(payload)
     inserted = insert_order(payload)
+    learn_template_safely(payload)
     return jsonify(inserted), 201
 
 
+@orders_bp.route("/api/orders/bulk", methods=["POST"])
+def orders_bulk():
+    # a JSON list of orders, or {"orders": [...]}; all land in one transaction
+    payload = request.get_json(force=True, silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get("orders")
+    if not isinstance(payload, list) or not all(isinstance(p, dict) for p in payload):
+        return jsonify({"error": "Expected a list of orders"}), 400
+
+    payloads = normalize_extractions(payload)
+    full = request.args.get("return") == "full"
+    try:
+        inserted = insert_orders(payloads, return_full=full)
+    except sqlite3.IntegrityError as exc:
+        return jsonify({"error": str(exc)}), 409
+    if full:
+        return jsonify({"count": len(inserted), "orders": inserted}), 201
+    return jsonify({"count": len(inserted), "SalesOrderIDs": inserted}), 201
+
+
 @orders_bp.route("/api/orders/<int:order_id>", methods=["GET", "PUT"])
 def order_detail(order_id):
     if request.method == "GET":
-        return jsonify(fetch_order(order_id))
+        # versioned per order, so writes to other orders keep it valid
+        return _conditional_json(lambda: fetch_order_json(order_id),
+                                 f"o{order_version(order_id)}")
     payload = request.get_json(force=True, silent=True) or {}
     payload = normalize_extraction(payload)
     updated = update_order(order_id, payload)
+    learn_template_safely(payload)
     return jsonify(updated)
 
 
 @orders_bp.route("/api/db_snapshot", methods=["GET"])
 def snapshot():
     limit = int(request.args.get("limit", 10))
-    return jsonify(db_snapshot(limit=limit))
+    return _conditional_json(lambda: db_snapshot_json(limit=limit))
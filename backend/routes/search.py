@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify, request
+
+from db import SEARCH_MAX_LIMIT, search_orders
+
+search_bp = Blueprint("search", __name__)
+
+
+@search_bp.route("/api/search", methods=["GET"])
+def search():
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Missing q"}), 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), SEARCH_MAX_LIMIT))
+    offset = max(0, request.args.get("offset", 0, type=int))
+    return jsonify({"query": query, **search_orders(query, limit=limit, offset=offset)})
@@ -0,0 +1,201 @@
+import re
+from collections import namedtuple
+from operator import itemgetter
+
+# Declarative version of mock_extract with identical output. Field rules keep
+# mock_extract's regexes and first-match semantics but are compiled once and
+# only tried where their keyword occurs; line items come from one pass over the
+# lines, running a grammar only on lines that contain its trigger instead of two
+# regex searches on every line.
+
+FieldRule = namedtuple("FieldRule", "section field keyword patterns")
+LineItemGrammar = namedtuple(
+    "LineItemGrammar", "name trigger pattern keys values strip_keys")
+
+FIELD_RULES = [
+    FieldRule("document", "InvoiceNumber", "invoice",
+              [r"Invoice\s*(?:No|#|Number)[:\s]*([A-Za-z0-9-]+)"]),
+    FieldRule("document", "InvoiceDate", "invoice",
+              [r"Invoice\s*Date[:\s]*([A-Za-z0-9/\-]+)"]),
+    FieldRule("document", "InvoiceDate", "date",
+              [r"Date\s*Issued[:\s]*([A-Za-z0-9/\-]+)"]),
+    FieldRule("document", "DueDate", "due",
+              [r"Due\s*Date[:\s]*([A-Za-z0-9/\-]+)", r"Due[:\s]*([A-Za-z0-9/\-]+)"]),
+    FieldRule("document", "Terms", "terms", [r"Terms[:\s]*([A-Za-z0-9\s-]+)"]),
+    FieldRule("document", "VendorName", None,
+              [r"^([A-Za-z0-9 &.,-]+)\n(?:Invoice|INVOICE)"]),
+    FieldRule("document", "BillToName", "bill to", [r"Bill To[:\s]*([A-Za-z0-9 &.,-]+)"]),
+    FieldRule("document", "ShipToName", "ship to", [r"Ship To[:\s]*([A-Za-z0-9 &.,-]+)"]),
+    FieldRule("document", "BillToAddress", "bill to", [r"Bill To(?:.*)\n([A-Za-z0-9 ,.-]+)"]),
+    FieldRule("document", "ShipToAddress", "ship to", [r"Ship To(?:.*)\n([A-Za-z0-9 ,.-]+)"]),
+    FieldRule("document", "Subtotal", "subtotal", [r"Subtotal[:\s]*\$?([0-9,\.]+)"]),
+    FieldRule("document", "Tax", "tax", [r"Tax[:\s]*\$?([0-9,\.]+)"]),
+    FieldRule("document", "Freight", "freight", [r"Freight[:\s]*\$?([0-9,\.]+)"]),
+    FieldRule("document", "Total", "total", [r"Total[:\s]*\$?([0-9,\.]+)"]),
+    FieldRule("header", "SalesOrderNumber", "sales",
+              [r"Sales\s*Order[:\s]*([A-Za-z0-9-]+)"]),
+    FieldRule("header", "PurchaseOrderNumber", "po", [r"PO\s*(?:Number)?:\s*([A-Za-z0-9-]+)"]),
+    FieldRule("header", "AccountNumber", "account", [r"Account\s*Number[:\s]*([A-Za-z0-9-]+)"]),
+    FieldRule("header", "CustomerID", "customer", [r"Customer\s*ID[:\s]*([A-Za-z0-9-]+)"]),
+]
+
+# field rules that fall back to another field's value, like mock_extract does
+FIELD_FALLBACKS = [("header", "SalesOrderNumber", "document", "InvoiceNumber")]
+
+LINE_ITEM_GRAMMARS = []
+
+# ASCII line breaks str.splitlines() honours besides "\n" and "\r\n"
+_OTHER_LINE_BREAKS = ("\x0b", "\x0c", "\x1c", "\x1d", "\x1e")
+
+
+def _compile_rule(rule):
+    return (
+        rule.section,
+        rule.field,
+        [(rule.keyword, re.compile(pattern, re.IGNORECASE)) for pattern in rule.patterns],
+    )
+
+
+def _merge_rules(rules):
+    # "find(a) or find(b)" rules are declared as consecutive entries for one field
+    merged = []
+    for rule in rules:
+        section, field, patterns = _compile_rule(rule)
+        if merged and merged[-1][:2] == (section, field):
+            merged[-1][2].extend(patterns)
+        else:
+            merged.append((section, field, patterns))
+    return merged
+
+
+_COMPILED_RULES = _merge_rules(FIELD_RULES)
+
+
+def register_line_item_grammar(name, pattern, fields, trigger, flags=0):
+    # fields are (output_key, group_index, strip) in output order; trigger is a
+    # lowercase substring present in every line the pattern can match
+    compiled = re.compile(pattern, flags)
+    groups = [group for _, group, _ in fields]
+    if groups == list(range(1, compiled.groups + 1)):
+        values = re.Match.groups
+    else:
+        getter = itemgetter(*[group - 1 for group in groups])
+        if len(groups) == 1:
+            def values(match):
+                return (getter(match.groups()),)
+        else:
+            def values(match):
+                return getter(match.groups())
+    LINE_ITEM_GRAMMARS.append(
+        LineItemGrammar(
+            name,
+            trigger,
+            compiled,
+            tuple(key for key, _, _ in fields),
+            values,
+            tuple(key for key, _, strip in fields if strip),
+        )
+    )
+
+
+register_line_item_grammar(
+    "sku",
+    r"SKU\s*([A-Za-z0-9-]+)\s*-\s*([^\-]+)\s*-\s*Qty\s*(\d+)\s*-\s*Unit\s*\$?([0-9.]+)"
+    r"\s*-\s*Line\s*\$?([0-9.]+)",
+    [("ProductID", 1, False), ("ProductName", 2, True), ("OrderQty", 3, False),
+     ("UnitPrice", 4, False), ("LineTotal", 5, False)],
+    trigger="sku",
+    flags=re.IGNORECASE,
+)
+register_line_item_grammar(
+    "table",
+    r"(\d+)\s*\|\s*([A-Za-z0-9-]+)\s*\|\s*([^|]+)\|\s*([0-9.]+)\s*\|\s*([0-9.]+)",
+    [("OrderQty", 1, False), ("ProductID", 2, False), ("ProductName", 3, True),
+     ("UnitPrice", 4, False), ("LineTotal", 5, False)],
+    trigger="|",
+)
+
+
+def _find_fields(text, lower):
+    found = {}
+    for section, field, patterns in _COMPILED_RULES:
+        value = None
+        for keyword, pattern in patterns:
+            if keyword is None:
+                match = pattern.match(text)
+            elif lower is None:
+                match = pattern.search(text)
+            else:
+                match = None
+                pos = lower.find(keyword)
+                while pos != -1:
+                    match = pattern.match(text, pos)
+                    if match:
+                        break
+                    pos = lower.find(keyword, pos + 1)
+            value = match.group(1).strip() if match else None
+            if value:
+                break
+        found[(section, field)] = value
+    return found
+
+
+def _candidate_lines(text, lower):
+    # (line, lowercased line) pairs for lines containing any grammar trigger, in
+    # text order; None when splitting on "\n" would not match str.splitlines()
+    if lower is None or any(char in text for char in _OTHER_LINE_BREAKS):
+        return None
+    if "\r" in text:
+        if text.count("\r") != text.count("\r\n"):
+            return None
+        text = text.replace("\r\n", "\n")
+        lower = lower.replace("\r\n", "\n")
+
+    triggers = [grammar.trigger for grammar in LINE_ITEM_GRAMMARS]
+    candidates = []
+    for line, low in zip(text.split("\n"), lower.split("\n")):
+        for trigger in triggers:
+            if trigger in low:
+                candidates.append((line, low))
+                break
+    return candidates
+
+
+def _line_items(text, lower=None):
+    lines = _candidate_lines(text, lower)
+    if lines is None:
+        lines = [(line, None) for line in text.splitlines()]
+
+    items = []
+    for line, low in lines:
+        line = line.strip()
+        if not line or "Qty" in line and "Unit" in line:
+            continue
+        for grammar in LINE_ITEM_GRAMMARS:
+            if low is not None and grammar.trigger not in low:
+                continue
+            match = grammar.pattern.search(line)
+            if match:
+                item = dict(zip(grammar.keys, grammar.values(match)))
+                for key in grammar.strip_keys:
+                    item[key] = item[key].strip()
+                items.append(item)
+                break
+    return items
+
+
+def rules_extract(text):
+    text = text or ""
+    # keyword and trigger positions come from a lowercased copy; only valid for
+    # ASCII text, where lowercasing keeps offsets and IGNORECASE has no exotic folds
+    lower = text.lower() if text.isascii() else None
+    found = _find_fields(text, lower)
+    for section, field, fallback_section, fallback_field in FIELD_FALLBACKS:
+        found[(section, field)] = found[(section, field)] or found[(fallback_section,
+                                                                   fallback_field)]
+
+    result = {"document": {}, "header": {}, "details": []}
+    for (section, field), value in found.items():
+        result[section][field] = value
+    result["details"] = _line_items(text, lower)
+    return result
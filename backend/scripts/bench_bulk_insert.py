@@ -0,0 +1,69 @@
+"""Compare insert_order() in a loop with insert_orders() on a scratch database.
+
+    python scripts/bench_bulk_insert.py --orders 10000 --details 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_payloads(orders, details):
+    return [
+        {
+            "header": {"OrderDate": "2026-01-10", "SalesOrderNumber": f"SO-BENCH-{i}",
+                       "PurchaseOrderNumber": f"PO-{i}", "SubTotal": 100.0 * details,
+                       "TaxAmt": 8.0, "Freight": 0.0, "TotalDue": 100.0 * details + 8},
+            "document": {"Filename": f"bench-{i}.txt", "MimeType": "text/plain",
+                         "VendorName": "Bench Supplies", "InvoiceNumber": f"INV-{i}",
+                         "Currency": "USD", "Subtotal": 100.0 * details, "Total": 100.0},
+            "details": [
+                {"OrderQty": 1, "ProductID": f"P-{j}", "ProductName": f"Part {j}",
+                 "UnitPrice": 100.0, "UnitPriceDiscount": 0.0, "LineTotal": 100.0}
+                for j in range(details)
+            ],
+        }
+        for i in range(orders)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--details", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=1000,
+                        help="orders per insert_orders() call")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    import db
+
+    db.init_db()
+    rows_per_order = 2 + args.details  # header + document + details
+
+    start = time.perf_counter()
+    for payload in make_payloads(args.orders, args.details):
+        db.insert_order(payload)
+    loop_s = time.perf_counter() - start
+
+    payloads = make_payloads(args.orders, args.details)
+    start = time.perf_counter()
+    for i in range(0, len(payloads), args.chunk):
+        db.insert_orders(payloads[i:i + args.chunk])
+    bulk_s = time.perf_counter() - start
+
+    rows = args.orders * rows_per_order
+    print(f"{args.orders} orders x {args.details} details ({rows} rows)")
+    print(f"insert_order loop : {loop_s:8.2f}s  {rows / loop_s:10.0f} rows/s")
+    print(f"insert_orders     : {bulk_s:8.2f}s  {rows / bulk_s:10.0f} rows/s"
+          f"  (chunks of {args.chunk})")
+    print(f"speedup           : {loop_s / bulk_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
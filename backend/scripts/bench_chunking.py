@@ -0,0 +1,91 @@
+"""Time a long invoice through openai_compatible_extract as one request and as
+concurrently extracted chunks, against the fake LLM server:
+
+    python scripts/bench_chunking.py --pages 40 --chunk-tokens 1000 --concurrency 16
+
+The fake server answers with mock_extract() and sleeps --ms-per-token for every
+token of its answer, so a request's latency grows with the line items it returns
+the way a real model's does. The merged chunk result is compared with the
+single-request result.
+"""
+import argparse
+import os
+import sys
+import threading
+from time import perf_counter
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--items-per-page", type=int, default=5)
+    parser.add_argument("--chunk-tokens", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ms-per-token", type=float, default=2)
+    parser.add_argument("--latency-ms", type=float, default=300,
+                        help="fixed time per request (queueing, prompt processing)")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "LLM_PROVIDER": "openai_compatible",
+        "LLM_API_KEY": "bench",
+        "LLM_CHUNK_TOKENS": str(args.chunk_tokens),
+        "LLM_CHUNK_CONCURRENCY": str(args.concurrency),
+        "LLM_MAX_CONCURRENCY": str(args.concurrency),
+        "LLM_POOL_SIZE": str(args.concurrency),
+    })
+    from bench_rules import build_invoice
+    from fake_llm_server import build_parser, make_server
+
+    server = make_server(build_parser().parse_args([
+        "--port", "0", "--ms-per-token", str(args.ms_per_token),
+        "--latency-ms", str(args.latency_ms)]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    import llm
+
+    def timed(text, chunk_tokens):
+        llm.LLM_CHUNK_TOKENS = chunk_tokens
+        meta = {}
+        start = perf_counter()
+        result = llm.openai_compatible_extract(text, None, "text/plain", meta=meta)
+        return result, (perf_counter() - start) * 1000, meta["llm"]
+
+    one_page = build_invoice(1, args.items_per_page)
+    long_doc = build_invoice(args.pages, args.items_per_page)
+    timed(one_page, 0)  # warm the connection pool
+
+    _, page_ms, page_meta = timed(one_page, 0)
+    single, single_ms, single_meta = timed(long_doc, 0)
+    chunked, chunked_ms, chunked_meta = timed(long_doc, args.chunk_tokens)
+    server.shutdown()
+
+    print(f"1 page        : {page_ms:7.0f} ms  (~{page_meta['tokens']} tokens)")
+    print(f"{args.pages} pages, 1 request: {single_ms:7.0f} ms  (~{single_meta['tokens']} tokens)")
+    print(f"{args.pages} pages, chunked  : {chunked_ms:7.0f} ms  ({chunked_meta['chunks']} chunks "
+          f"of <= {args.chunk_tokens} tokens, concurrency {args.concurrency})")
+
+    problems = []
+    if chunked["details"] != single["details"]:
+        problems.append(f"details differ: {len(chunked['details'])} chunked vs "
+                        f"{len(single['details'])} single")
+    for section in ("document", "header"):
+        for key, value in single[section].items():
+            if chunked[section].get(key) != value:
+                problems.append(f"{section}.{key}: {chunked[section].get(key)!r} "
+                                f"vs {value!r}")
+    for problem in problems:
+        print(f"MISMATCH {problem}")
+    if problems:
+        raise SystemExit(1)
+    print(f"merged result matches the single request ({len(single['details'])} line items)")
+
+
+if __name__ == "__main__":
+    main()
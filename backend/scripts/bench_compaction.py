@@ -0,0 +1,184 @@
+"""Count input tokens with and without prompt compaction (LLM_COMPACT).
+
+Runs sample_invoices/*.txt, the long text invoice from bench_rules.py (a terms
+block between item runs) and a set of generated multi-page PDF invoices (padded
+columns, running headers and footers, a terms-and-conditions block per page)
+through the text extraction and openai_compatible_extract against the fake LLM
+server, once with LLM_COMPACT off and once on:
+
+    python scripts/bench_compaction.py --pdfs 6
+
+Token counts come from meta.llm: the chars/4 estimate the backend uses, plus a
+count of tokenizer pre-tokens (words, 1-3 digit runs, punctuation runs, space
+runs), which is closer to what a BPE tokenizer charges for whitespace. The
+extraction must be identical both ways.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+ROOT_DIR = os.path.join(BACKEND_DIR, "..")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+PRE_TOKENS = re.compile(r" ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]+|\s+(?!\S)|\s+")
+
+
+def pre_tokens(text):
+    return len(PRE_TOKENS.findall(text))
+
+
+def _pdf_string(line):
+    return "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def write_pdf(pages, path):
+    # the smallest PDF pypdf reads back line by line: one Helvetica text object
+    # per page, one Tj per line
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 8 Tf 10 TL 30 810 Td " + " ".join(
+            f"{_pdf_string(line)} Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def build_pdf_pages(page_count, items_per_page, seed):
+    from bench_rules import BOILERPLATE
+
+    rnd = random.Random(seed)
+    number = f"INV-{20000 + seed}"
+    pages = []
+    for page in range(1, page_count + 1):
+        lines = [f"NORTHWIND OUTFITTERS          Invoice {number}          Page {page} of {page_count}",
+                 "400 Market Street, Portland, OR 97201     Tel (503) 555-0100", ""]
+        if page == 1:
+            lines += [f"Invoice No: {number}", "Invoice Date: 2026-02-03",
+                      "Customer ID: 11015", "Account Number: AW00011015",
+                      "Terms: Net 30", "", "Bill To: Engineered Bike Systems",
+                      "123 Camelia Avenue", "Oxnard, CA 93030", ""]
+        lines += ["Qty    |   Item   |   Description                  |   Unit Price   |   Line Total"]
+        for _ in range(items_per_page):
+            qty = rnd.randint(1, 50)
+            unit = rnd.randint(100, 99999) / 100
+            lines.append(f"{qty:<6} |   {rnd.randint(1, 999):<6} |   {'Crown Race':<28} |   "
+                         f"{unit:>10.2f}   |   {qty * unit:>10.2f}")
+        if page == page_count:
+            lines += ["", "Subtotal:        $1000.00", "Tax:             $80.00",
+                      "Freight:         $0.00", "Total:           $1080.00"]
+        lines += [""] + BOILERPLATE.splitlines() + [
+            "", "Thank you for your business.       Please remit to accounts receivable.",
+            f"Page {page} of {page_count}"]
+        pages.append(lines)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", type=int, default=6)
+    parser.add_argument("--items-per-page", type=int, default=12)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "EXTRACTION_CACHE": "0",
+        "PDF_TEXT_CACHE": "0",
+        "PDF_WORKERS": "0",
+        "LLM_PROVIDER": "openai_compatible",
+        "LLM_API_KEY": "bench",
+        "LLM_CHUNK_TOKENS": "0",
+    })
+    from fake_llm_server import build_parser, make_server
+
+    server = make_server(build_parser().parse_args(["--port", "0"]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    import llm
+    from pipeline import load_text_from_file
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "sample_invoices", "*.txt"))):
+        documents.append((os.path.basename(path), path, "text/plain"))
+    from bench_rules import build_invoice
+
+    path = os.path.join(workdir, "generated.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(build_invoice(8, 5))
+    documents.append((os.path.basename(path), path, "text/plain"))
+    for i in range(args.pdfs):
+        path = os.path.join(workdir, f"generated_{i + 1}.pdf")
+        write_pdf(build_pdf_pages(2 + i * 2, args.items_per_page, seed=i), path)
+        documents.append((os.path.basename(path), path, "application/pdf"))
+
+    prompts = {}
+    real_payload = llm._chat_payload
+
+    def recording_payload(model, user_content):
+        payload = real_payload(model, user_content)
+        prompts[llm.LLM_COMPACT] = "".join(m["content"] for m in payload["messages"])
+        return payload
+
+    llm._chat_payload = recording_payload
+
+    print(f"{'document':22} {'est. tokens':>19} {'pre-tokens':>19}  dropped")
+    totals = {False: [0, 0], True: [0, 0]}
+    failures = 0
+    for name, path, mime_type in documents:
+        text = load_text_from_file(path, name, mime_type)
+        results = {}
+        for compact in (False, True):
+            llm.LLM_COMPACT = compact
+            llm.SYSTEM_PROMPT = llm.build_system_prompt(compact)
+            meta = {}
+            results[compact] = (llm.openai_compatible_extract(text, None, mime_type, meta=meta),
+                                meta)
+            totals[compact][0] += meta["llm"]["input_tokens"]
+            totals[compact][1] += pre_tokens(prompts[compact])
+        (plain, plain_meta), (compacted, compact_meta) = results[False], results[True]
+        same = plain == compacted
+        failures += not same
+        before, after = plain_meta["llm"]["input_tokens"], compact_meta["llm"]["input_tokens"]
+        pre_before, pre_after = pre_tokens(prompts[False]), pre_tokens(prompts[True])
+        stats = compact_meta["compaction"]
+        print(f"{name:22} {before:6d} -> {after:5d} ({1 - after / before:4.0%}) "
+              f"{pre_before:6d} -> {pre_after:5d} ({1 - pre_after / pre_before:4.0%})  "
+              f"{stats['repeated_lines']} repeated, {stats['page_numbers']} page numbers, "
+              f"{stats['boilerplate_blocks']} boilerplate  "
+              f"{'identical' if same else 'MISMATCH'}")
+    server.shutdown()
+
+    (before, pre_before), (after, pre_after) = totals[False], totals[True]
+    print(f"{'corpus':22} {before:6d} -> {after:5d} ({1 - after / before:4.0%}) "
+          f"{pre_before:6d} -> {pre_after:5d} ({1 - pre_after / pre_before:4.0%})")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Measure what image preprocessing saves on vision requests.
+
+Renders sample_invoices/*.txt as phone-style photos (12 MP JPEG on a darker
+background, stored sideways with an EXIF orientation tag), adds the repo's
+"Sales Invoice.png", and runs each through run_extraction against the fake LLM
+server with IMAGE_PREPROCESS off and on:
+
+    python scripts/bench_image_prep.py --upload-mbps 20 --repeat 3
+
+Reports request bytes and end-to-end latency. It also checks that extraction
+results match, and that cropping left a margin around all of the page's text.
+The fake server answers from the prompt text, not the pixels, so it cannot
+judge what a vision model would read.
+"""
+import argparse
+import glob
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+from time import perf_counter
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ROOT_DIR = os.path.join(BACKEND_DIR, "..")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+PHOTO_SIZE = (4032, 3024)
+
+
+def render_photo(text, path, seed=1):
+    # a white page with the invoice text on a noisy desk, saved rotated with
+    # EXIF orientation 6 the way phone cameras store portrait shots
+    rnd = random.Random(seed)
+    width, height = PHOTO_SIZE[1], PHOTO_SIZE[0]
+    photo = Image.effect_noise((width, height), 12).point(lambda v: v // 3 + 60).convert("RGB")
+    page = Image.new("RGB", (int(width * 0.8), int(height * 0.85)), (250, 248, 244))
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=44)
+    y = 120
+    for line in text.splitlines():
+        draw.text((110, y), line, fill=(20, 20, 25), font=font)
+        y += 60
+    photo.paste(page, (int(width * 0.1) + rnd.randint(-20, 20), int(height * 0.07)))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    photo.rotate(90, expand=True).save(path, "JPEG", quality=92, exif=exif)
+
+
+def text_margin_ok(data):
+    # the darkest pixels (text) must not touch the edges of the prepared image
+    image = Image.open(io.BytesIO(data)).convert("L")
+    box = image.point(lambda v: 255 if v < 50 else 0).getbbox()
+    return bool(box) and box[0] > 0 and box[1] > 0 and \
+        box[2] < image.width and box[3] < image.height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--upload-mbps", type=float, default=20,
+                        help="simulated uplink to the LLM provider")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="simulated model time per request")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "DATABASE_PATH": os.path.join(workdir, "bench.db"),
+        "UPLOAD_DIR": workdir,
+        "EXTRACTION_CACHE": "0",
+        "VENDOR_TEMPLATES": "0",
+        "LLM_PROVIDER": "openai_compatible",
+        "LLM_API_KEY": "bench",
+    })
+    from fake_llm_server import build_parser, make_server
+
+    server = make_server(build_parser().parse_args([
+        "--port", "0", "--upload-mbps", str(args.upload_mbps),
+        "--latency-ms", str(args.latency_ms)]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    stats = server.RequestHandlerClass.stats
+
+    import image_prep
+    from pipeline import run_extraction
+
+    images = []
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "sample_invoices", "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            photo = os.path.join(workdir, os.path.basename(path)[:-4] + ".jpg")
+            render_photo(f.read(), photo)
+            images.append((photo, "image/jpeg"))
+    images.append((os.path.join(ROOT_DIR, "Sales Invoice.png"), "image/png"))
+
+    print(f"uplink {args.upload_mbps:g} Mbit/s, model latency {args.latency_ms:g} ms, "
+          f"max dimension {image_prep.IMAGE_MAX_DIMENSION}, {image_prep.IMAGE_FORMAT} "
+          f"q{image_prep.IMAGE_QUALITY}")
+    failures = 0
+    for path, mime_type in images:
+        runs = {}
+        for enabled in (False, True):
+            image_prep.IMAGE_PREPROCESS = enabled
+            stats.clear()
+            start = perf_counter()
+            for _ in range(args.repeat):
+                result = run_extraction(path, os.path.basename(path), mime_type)
+            ms = (perf_counter() - start) * 1000 / args.repeat
+            runs[enabled] = (stats["request_bytes"] // args.repeat, ms, result)
+
+        (raw_bytes, raw_ms, raw), (prep_bytes, prep_ms, prep) = runs[False], runs[True]
+        same = {k: v for k, v in raw.items() if k != "meta"} == \
+            {k: v for k, v in prep.items() if k != "meta"}
+        data, _, meta = image_prep.prepare_image(path, mime_type)
+        margin = data is None or text_margin_ok(data)
+        failures += (not same) + (not margin)
+        print(f"{os.path.basename(path):22} request {raw_bytes / 1e6:6.2f} MB -> "
+              f"{prep_bytes / 1e6:5.2f} MB ({raw_bytes / prep_bytes:4.1f}x)  "
+              f"latency {raw_ms:6.0f} -> {prep_ms:5.0f} ms  "
+              f"(prep {prep['meta']['image'].get('preprocess_ms', 0):.0f} ms, "
+              f"{'x'.join(map(str, meta['size'])) if data else 'sent as-is'})  "
+              f"result {'identical' if same else 'MISMATCH'}, "
+              f"text margin {'ok' if margin else 'CUT'}")
+    server.shutdown()
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
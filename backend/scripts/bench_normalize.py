@@ -0,0 +1,300 @@
+"""Check normalize.normalize_extraction against the per-call implementation it
+replaced, on fuzzed extractions, and time both on a bulk batch:
+
+    python scripts/bench_normalize.py --cases 20000 --orders 5000
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import sys
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from normalize import normalize_extraction, normalize_extractions  # noqa: E402
+
+
+# normalize_extraction as it was before normalize.py, kept verbatim as the reference
+def legacy_normalize_extraction(data, raw_text=None, filename=None, mime_type=None):
+    data = data or {}
+    document = data.get("document") or {}
+    header = data.get("header") or {}
+    details = data.get("details") or []
+
+    if raw_text and not document.get("RawText"):
+        document["RawText"] = raw_text[:20000]
+    if filename:
+        document.setdefault("Filename", filename)
+    if mime_type:
+        document.setdefault("MimeType", mime_type)
+
+    def safe_float(value):  # sanitize to float
+        if value is None or value == "":
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        value = str(value).replace(",", "")
+        value = re.sub(r"[^0-9.\-]", "", value)
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    def safe_int(value):  # sanitize to int
+        if value is None or value == "":
+            return None
+        if isinstance(value, int):
+            return value
+        value = str(value).strip()
+        value = re.sub(r"[^0-9\-]", "", value)
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    def parse_date(value):  # sanitize to date
+        if not value:
+            return None
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        value = str(value).strip()
+        for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%b %d, %Y"):
+            try:
+                return datetime.strptime(value, fmt).date().isoformat()
+            except ValueError:
+                continue
+        return None
+
+    def apply_terms(invoice_date, terms):
+        if not invoice_date or not terms:
+            return None
+        match = re.search(r"net\s*(\d+)", terms, re.IGNORECASE)
+        if not match:
+            return None
+        try:
+            days = int(match.group(1))
+        except ValueError:
+            return None
+        date_obj = datetime.strptime(invoice_date, "%Y-%m-%d")
+        return (date_obj + timedelta(days=days)).date().isoformat()
+
+    # Normalize document fields
+    for key in ["Subtotal", "Tax", "Freight", "Total"]:
+        document[key] = safe_float(document.get(key))
+
+    if document.get("InvoiceDate"):
+        document["InvoiceDate"] = parse_date(document.get("InvoiceDate"))
+    if document.get("DueDate"):
+        document["DueDate"] = parse_date(document.get("DueDate"))
+
+    if not document.get("DueDate"):
+        due_from_terms = apply_terms(document.get("InvoiceDate"), document.get("Terms"))
+        if due_from_terms:
+            document["DueDate"] = due_from_terms
+
+    # sanitize header fields
+    header["OrderDate"] = parse_date(
+        header.get("OrderDate") or document.get("InvoiceDate"))
+    header["DueDate"] = parse_date(header.get("DueDate") or document.get("DueDate"))
+    header["ShipDate"] = parse_date(header.get("ShipDate"))
+    header["SalesOrderNumber"] = header.get(
+        "SalesOrderNumber") or document.get("InvoiceNumber")
+
+    header["CustomerID"] = safe_int(header.get("CustomerID"))
+
+    header["SubTotal"] = safe_float(header.get("SubTotal") or document.get("Subtotal"))
+    header["TaxAmt"] = safe_float(header.get("TaxAmt") or document.get("Tax"))
+    header["Freight"] = safe_float(header.get("Freight") or document.get("Freight"))
+    header["TotalDue"] = safe_float(header.get("TotalDue") or document.get("Total"))
+
+    if header.get("RevisionNumber") is None:
+        header["RevisionNumber"] = 0
+    if header.get("Status") is None:
+        header["Status"] = 5
+    if header.get("OnlineOrderFlag") is None:
+        header["OnlineOrderFlag"] = 1
+
+    normalized_details = []
+    for item in details:
+        item = item or {}
+        item["OrderQty"] = safe_int(item.get("OrderQty"))
+        item["UnitPrice"] = safe_float(item.get("UnitPrice"))
+        item["UnitPriceDiscount"] = safe_float(item.get("UnitPriceDiscount")) or 0.0
+        item["LineTotal"] = safe_float(item.get("LineTotal"))
+        if item.get("LineTotal") is None and item.get(
+                "OrderQty") and item.get("UnitPrice") is not None:
+            item["LineTotal"] = item["OrderQty"] * item["UnitPrice"]
+        normalized_details.append(item)
+
+    details = normalized_details
+
+    if header.get("SubTotal") is None:
+        line_sum = sum([item.get("LineTotal") or 0 for item in details])
+        header["SubTotal"] = line_sum if line_sum else None
+
+    if header.get("TotalDue") is None:
+        subtotal = header.get("SubTotal") or 0
+        tax = header.get("TaxAmt") or 0
+        freight = header.get("Freight") or 0
+        total = subtotal + tax + freight
+        header["TotalDue"] = total if total else None
+
+    if document.get("Subtotal") is None:
+        document["Subtotal"] = header.get("SubTotal")
+
+    if document.get("Tax") is None:
+        document["Tax"] = header.get("TaxAmt")
+
+    if document.get("Freight") is None:
+        document["Freight"] = header.get("Freight")
+
+    if document.get("Total") is None:
+        document["Total"] = header.get("TotalDue")
+    return {"document": document, "header": header, "details": details}
+
+
+DATE_VALUES = [
+    None, "", 0, 20260102, "2026-01-02", "2026-1-2", " 2026-01-02 ", "2026-02-30", "0000-01-01",
+    "2026-13-01", "2026-01-02T10:00", "01/02/2026", "1/2/2026", "1/2/26", "13/01/2026",
+    "02-Jan-2026", "2-jan-2026", "Jan 5, 2026", "jan 05,2026", "January 5, 2026",
+    "\uff12\uff10\uff12\uff16-01-02", "2026/01/02", "-", "n/a", "Feb 29, 2024",
+    "Feb 29, 2025", datetime(2026, 3, 4, 5, 6), date(2026, 3, 4),
+]
+NUMBER_VALUES = [
+    None, "", 0, 1, -3, 12.5, -0.0, 0.0, True, False, "0", "-0", "12.50", "$1,234.50",
+    "1e5", "-", "..", "12.5.3", "  42 ", "\u0661\u0662", "USD 99", "(15.00)", "1-2",
+    [1, 2], "7", "00012", "3.", ".5", "--1",
+]
+TERMS_VALUES = [None, "", "Net 30", "net30", "NET 45 days", "Due on receipt", "Net \u0663\u0660",
+                "2% 10 Net 30", "net 0"]
+TEXT_VALUES = [None, "", "INV-1001", "SO-77", "Acme Tools", 42]
+
+
+def maybe(rnd, values, missing=0.2):
+    return values[rnd.randrange(len(values))] if rnd.random() > missing else KeyError
+
+
+def put(rnd, record, key, values):
+    value = maybe(rnd, values)
+    if value is not KeyError:
+        record[key] = value
+
+
+def fuzz_case(rnd):
+    document, header = {}, {}
+    for key in ("Subtotal", "Tax", "Freight", "Total"):
+        put(rnd, document, key, NUMBER_VALUES)
+    for key in ("InvoiceDate", "DueDate"):
+        put(rnd, document, key, DATE_VALUES)
+    put(rnd, document, "Terms", TERMS_VALUES)
+    put(rnd, document, "InvoiceNumber", TEXT_VALUES)
+    put(rnd, document, "RawText", TEXT_VALUES)
+    for key in ("OrderDate", "DueDate", "ShipDate"):
+        put(rnd, header, key, DATE_VALUES)
+    for key in ("SubTotal", "TaxAmt", "Freight", "TotalDue", "CustomerID"):
+        put(rnd, header, key, NUMBER_VALUES)
+    for key in ("RevisionNumber", "Status", "OnlineOrderFlag"):
+        put(rnd, header, key, [None, 0, 1, 8, "", False])
+    put(rnd, header, "SalesOrderNumber", TEXT_VALUES)
+    details = []
+    for _ in range(rnd.randrange(4)):
+        if rnd.random() < 0.1:
+            details.append(rnd.choice([None, {}]))
+            continue
+        item = {"ProductName": "Part"}
+        for key in ("OrderQty", "UnitPrice", "UnitPriceDiscount", "LineTotal"):
+            put(rnd, item, key, NUMBER_VALUES)
+        details.append(item)
+    data = {}
+    if rnd.random() > 0.05:
+        data["document"] = document
+    if rnd.random() > 0.05:
+        data["header"] = header
+    if rnd.random() > 0.05:
+        data["details"] = details
+    extra = {}
+    if rnd.random() < 0.3:
+        extra = {"raw_text": rnd.choice(["", "x" * 25000, "Invoice text"]),
+                 "filename": rnd.choice([None, "a.txt"]), "mime_type": rnd.choice([None, "text/plain"])}
+    return (None if rnd.random() < 0.01 else data), extra
+
+
+def run(func, data, extra):
+    data = copy.deepcopy(data)
+    try:
+        out = func(data, **extra)
+    except Exception as exc:
+        return ("error", type(exc).__name__)
+    # output and the mutated input, key order and -0.0 included
+    return json.dumps([out, data], default=repr)
+
+
+def check_parity(cases, seed):
+    rnd = random.Random(seed)
+    mismatches = 0
+    for i in range(cases):
+        data, extra = fuzz_case(rnd)
+        expected = run(legacy_normalize_extraction, data, extra)
+        got = run(normalize_extraction, data, extra)
+        if expected != got:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"MISMATCH case {i}: {data!r} {extra!r}\n  legacy: {expected}\n  new:    {got}")
+    return mismatches
+
+
+def bulk_orders(count, seed):
+    rnd = random.Random(seed)
+    start = date(2025, 1, 1)
+    orders = []
+    for i in range(count):
+        day = start + timedelta(days=rnd.randrange(365))
+        fmt = rnd.choice(["%Y-%m-%d", "%m/%d/%Y", "%b %d, %Y"])
+        orders.append({
+            "document": {"VendorName": "Acme", "InvoiceNumber": f"INV-{i}",
+                         "InvoiceDate": day.strftime(fmt), "Terms": rnd.choice(["Net 30", "Net 45"]),
+                         "Subtotal": f"{rnd.randrange(100, 99999) / 100:,.2f}", "Tax": 8.25,
+                         "Freight": None, "Total": None},
+            "header": {"PurchaseOrderNumber": f"PO-{i}", "CustomerID": str(rnd.randrange(1, 999))},
+            "details": [{"OrderQty": str(rnd.randrange(1, 9)), "ProductID": f"P-{j}",
+                         "ProductName": "Part", "UnitPrice": f"${rnd.randrange(100, 9999) / 100}",
+                         "UnitPriceDiscount": None, "LineTotal": None}
+                        for j in range(rnd.randrange(1, 8))],
+        })
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20000, help="fuzzed extractions to compare")
+    parser.add_argument("--orders", type=int, default=5000, help="orders in the timed batch")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    mismatches = check_parity(args.cases, args.seed)
+    print(f"{args.cases} fuzzed extractions: "
+          f"{'identical' if not mismatches else f'{mismatches} MISMATCHES'}")
+    if mismatches:
+        raise SystemExit(1)
+
+    orders = bulk_orders(args.orders, args.seed)
+    legacy_input, batch_input = copy.deepcopy(orders), copy.deepcopy(orders)
+    start = perf_counter()
+    expected = [legacy_normalize_extraction(order) for order in legacy_input]
+    legacy_s = perf_counter() - start
+    start = perf_counter()
+    got = normalize_extractions(batch_input)
+    batch_s = perf_counter() - start
+    if json.dumps(expected) != json.dumps(got):
+        raise SystemExit("bulk batch: MISMATCH")
+    print(f"{args.orders} orders: legacy {legacy_s * 1000:.0f} ms, "
+          f"normalize_extractions {batch_s * 1000:.0f} ms, {legacy_s / batch_s:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Time order reads with the read cache (READ_CACHE) off and on.
+
+Fills a scratch database with --orders orders (each with a RawText document),
+then times fetch_order/fetch_orders/db_snapshot and the matching GET endpoints
+through the Flask test client. Every --write-every reads an order is updated, so
+the cached runs include invalidation:
+
+    python scripts/bench_read_cache.py --orders 5000 --reads 2000
+
+The endpoint timings skip If-None-Match, so each request reads and serializes.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--details", type=int, default=5)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--hot", type=int, default=50,
+                        help="distinct orders the detail reads pick from")
+    parser.add_argument("--write-every", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "DATABASE_PATH": os.path.join(workdir, "bench.db"),
+        "UPLOAD_DIR": workdir,
+        "JOB_WORKERS": "0",
+    })
+    from bench_bulk_insert import make_payloads
+
+    import db
+    from app import app
+
+    payloads = make_payloads(args.orders, args.details)
+    for payload in payloads:
+        payload["document"]["RawText"] = "Invoice line text\n" * 100
+    ids = []
+    for i in range(0, len(payloads), 1000):
+        ids.extend(db.insert_orders(payloads[i:i + 1000]))
+    client = app.test_client()
+    hot = ids[-args.hot:]
+
+    reads = {
+        "fetch_order": lambda rnd: db.fetch_order(rnd.choice(hot)),
+        "fetch_orders": lambda rnd: db.fetch_orders(limit=25),
+        "db_snapshot": lambda rnd: db.db_snapshot(limit=10),
+        "GET /api/orders/<id>": lambda rnd: client.get(f"/api/orders/{rnd.choice(hot)}"),
+        "GET /api/orders?limit=25": lambda rnd: client.get("/api/orders?limit=25"),
+        "GET /api/db_snapshot": lambda rnd: client.get("/api/db_snapshot"),
+    }
+
+    print(f"{args.orders} orders, {args.reads} reads each, an update every "
+          f"{args.write_every} reads")
+    print(f"{'read':26} {'uncached p50/p99':>18} {'cached p50/p99':>18}  hit rate")
+    for name, read in reads.items():
+        row = []
+        for cached in (False, True):
+            db.READ_CACHE = cached
+            db.clear_read_cache()
+            rnd = random.Random(1)
+            samples = []
+            for i in range(args.reads):
+                if args.write_every and i % args.write_every == args.write_every - 1:
+                    order_id = rnd.choice(hot)
+                    order = db.fetch_order(order_id)
+                    order["header"]["Freight"] = float(i)
+                    db.update_order(order_id, order)
+                start = time.perf_counter()
+                read(rnd)
+                samples.append((time.perf_counter() - start) * 1000)
+            row.append(f"{statistics.median(samples):7.3f}/{percentile(samples, 99):7.3f}ms")
+        hit_rate = db.read_cache_stats()["hit_rate"]
+        print(f"{name:26} {row[0]:>18} {row[1]:>18}  {hit_rate:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare LLM_PROVIDER=rules against mock_extract.
+
+Checks that both produce identical output on sample_invoices/ and times them on
+a synthetic multi-page invoice:
+
+    python scripts/bench_rules.py --pages 50
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+from time import perf_counter
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLES_DIR = os.path.join(BACKEND_DIR, "..", "sample_invoices")
+sys.path.insert(0, BACKEND_DIR)
+
+from llm import mock_extract  # noqa: E402
+from rules import rules_extract  # noqa: E402
+
+BOILERPLATE = """Terms and conditions: all goods remain the property of the seller until paid in full.
+Claims for shortages or damages must be made within five business days of receipt.
+Returns require an authorization number and are subject to a restocking fee.
+Late payments accrue interest at one and a half percent per month.
+Warranty coverage is limited to defects in materials and workmanship for twelve months.
+Questions about this statement? Contact accounts receivable at ar@example.com."""
+
+
+def build_invoice(pages, items_per_page, seed=1):
+    rnd = random.Random(seed)
+    with open(os.path.join(SAMPLES_DIR, "invoice_alpha.txt"), encoding="utf-8") as f:
+        top, bottom = f.read().split("Items:")
+    parts = [top.rstrip(), "", "Items:"]
+    for page in range(pages):
+        parts += [f"Northwind Outfitters   Page {page + 1} of {pages}",
+                  "Remit to: 400 Market Street, Portland, OR 97201", ""]
+        for _ in range(items_per_page):
+            qty = rnd.randint(1, 50)
+            unit = rnd.randint(100, 99999) / 100
+            parts.append(f"SKU {rnd.randint(1, 999)} - Crown Race - Qty {qty} - "
+                         f"Unit ${unit:.2f} - Line ${qty * unit:.2f}")
+            parts.append(f"{qty} | {rnd.randint(1, 999)} | Bearing Ball | {unit:.2f} | "
+                         f"{qty * unit:.2f}")
+        parts += ["", BOILERPLATE, ""]
+    parts.append(bottom.split("\n", 1)[1])
+    return "\n".join(parts)
+
+
+def time_ms(func, text, repeat):
+    start = perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--items-per-page", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(SAMPLES_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        same = mock_extract(text) == rules_extract(text)
+        print(f"{os.path.basename(path)}: {'identical' if same else 'MISMATCH'}")
+        if not same:
+            raise SystemExit(1)
+
+    text = build_invoice(args.pages, args.items_per_page)
+    if mock_extract(text) != rules_extract(text):
+        raise SystemExit("synthetic invoice: MISMATCH")
+    mock_ms = time_ms(mock_extract, text, args.repeat)
+    rules_ms = time_ms(rules_extract, text, args.repeat)
+    print(f"{args.pages}-page invoice ({len(text)} chars): mock {mock_ms:.2f} ms, "
+          f"rules {rules_ms:.2f} ms, {mock_ms / rules_ms:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
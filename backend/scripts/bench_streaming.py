@@ -0,0 +1,119 @@
+"""Compare time to first field for POST /api/extract and /api/extract/stream.
+
+Serves the app on a local port against the fake LLM server, which streams its
+answer at --ms-per-token after --latency-ms of queueing/prompt time, and posts
+every sample invoice to both endpoints:
+
+    python scripts/bench_streaming.py --ms-per-token 15 --latency-ms 300
+
+The blocking endpoint shows nothing until the whole answer is parsed; the stream
+reports each header field as the model finishes writing it. The streamed result
+must match the blocking one.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from time import perf_counter
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+ROOT_DIR = os.path.join(BACKEND_DIR, "..")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def read_events(response):
+    # (event, data) for each server-sent event
+    event = None
+    for line in response.iter_lines():
+        if line.startswith(b"event:"):
+            event = line[6:].strip().decode()
+        elif line.startswith(b"data:"):
+            yield event, json.loads(line[5:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ms-per-token", type=float, default=15)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "DATABASE_PATH": os.path.join(workdir, "bench.db"),
+        "UPLOAD_DIR": workdir,
+        "EXTRACTION_CACHE": "0",
+        "VENDOR_TEMPLATES": "0",
+        "LLM_PROVIDER": "openai_compatible",
+        "LLM_API_KEY": "bench",
+    })
+    import requests
+    from fake_llm_server import build_parser, make_server
+    from werkzeug.serving import make_server as make_app_server
+
+    llm_server = make_server(build_parser().parse_args([
+        "--port", "0", "--ms-per-token", str(args.ms_per_token),
+        "--latency-ms", str(args.latency_ms)]))
+    threading.Thread(target=llm_server.serve_forever, daemon=True).start()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{llm_server.server_port}/v1"
+
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    app_server = make_app_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{app_server.server_port}"
+    session = requests.Session()
+
+    print(f"model latency {args.latency_ms:g} ms, {args.ms_per_token:g} ms/token")
+    print(f"{'invoice':24} {'blocking':>9} {'first field':>12} {'first item':>11} "
+          f"{'result':>8}  fields")
+    failures = 0
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "sample_invoices", "*.txt"))):
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            body = f.read()
+
+        start = perf_counter()
+        blocking = session.post(f"{base}/api/extract",
+                                files={"file": (name, body, "text/plain")}).json()
+        blocking_ms = (perf_counter() - start) * 1000
+
+        marks = {}
+        fields = 0
+        streamed = None
+        start = perf_counter()
+        with session.post(f"{base}/api/extract/stream", stream=True,
+                          files={"file": (name, body, "text/plain")}) as response:
+            for event, data in read_events(response):
+                marks.setdefault(event, (perf_counter() - start) * 1000)
+                if event == "field" and data["value"] not in (None, ""):
+                    marks.setdefault("useful_field", marks[event])
+                fields += event == "field"
+                if event == "result":
+                    streamed = data
+                elif event == "error":
+                    print(f"{name}: {data['error']}")
+
+        same = streamed is not None and \
+            {k: v for k, v in streamed.items() if k != "meta"} == \
+            {k: v for k, v in blocking.items() if k != "meta"}
+        failures += not same
+        item_ms = f"{marks['line_item']:9.0f}ms" if "line_item" in marks else f"{'-':>11}"
+        print(f"{name:24} {blocking_ms:7.0f}ms {marks.get('useful_field', 0):10.0f}ms "
+              f"{item_ms} {marks.get('result', 0):6.0f}ms  "
+              f"{fields:3d}  result {'identical' if same else 'MISMATCH'}")
+    app_server.shutdown()
+    llm_server.shutdown()
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Local stand-in for an OpenAI-compatible /chat/completions endpoint.
+
+Answers with mock_extract() run over the user message, so the backend can be
+exercised end to end without an API key. Requests with "stream": true get the
+answer as server-sent-event deltas of about one token each:
+
+    python scripts/fake_llm_server.py --port 8900
+    LLM_PROVIDER=openai_compatible LLM_API_KEY=x LLM_BASE_URL=http://127.0.0.1:8900/v1 python app.py
+
+--latency-dist lognormal draws each request's latency around --latency-ms (the
+median) with --latency-sigma spread. --canned answers with the precomputed
+extraction of the sample_invoices/ file the prompt came from (and the first
+one for image-only prompts) instead of running mock_extract per request.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLES_DIR = os.path.join(BACKEND_DIR, "..", "sample_invoices")
+sys.path.insert(0, BACKEND_DIR)
+
+from llm import mock_extract  # noqa: E402
+
+
+def _user_text(messages):
+    for message in messages:
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        return "\n".join(
+            part.get("text", "") for part in content or [] if part.get("type") == "text")
+    return ""
+
+
+def load_canned(samples_dir=SAMPLES_DIR):
+    # [(invoice number, answer)] for every sample invoice
+    canned = []
+    for path in sorted(glob.glob(os.path.join(samples_dir, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            extracted = mock_extract(f.read())
+        canned.append((extracted["document"].get("InvoiceNumber"), json.dumps(extracted)))
+    return canned
+
+
+def latency_seconds(options):
+    if not options.latency_ms:
+        return 0
+    if options.latency_dist == "uniform":
+        # median latency_ms, spread +/- sigma of it
+        spread = options.latency_ms * min(options.latency_sigma, 1)
+        return random.uniform(options.latency_ms - spread, options.latency_ms + spread) / 1000
+    if options.latency_dist == "lognormal":
+        return random.lognormvariate(math.log(options.latency_ms), options.latency_sigma) / 1000
+    return options.latency_ms / 1000
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+    stats = None
+    canned = None
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, model, content):
+        # one delta per ~4 characters, spaced by --ms-per-token like a real model
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(content), 4):
+            if self.options.ms_per_token:
+                time.sleep(self.options.ms_per_token / 1000)
+            event = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": content[i:i + 4]}}]}
+            self._write_chunk(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _count(self, stat):
+        with self.stats_lock:
+            self.stats[stat] = self.stats.get(stat, 0) + 1
+
+    def do_GET(self):
+        # request counters, for load drivers running the server as a subprocess
+        if self.path.rstrip("/") != "/stats":
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        with self.stats_lock:
+            self._send(200, dict(self.stats))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self._count("requests")
+        with self.stats_lock:
+            self.stats["request_bytes"] = self.stats.get("request_bytes", 0) + length
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+
+        options = self.options
+        if options.reject_response_format and "response_format" in payload:
+            self._count("rejected_response_format")
+            self._send(400, {"error": {"message": "response_format is not supported"}})
+            return
+        if options.rate_limit_rate and random.random() < options.rate_limit_rate:
+            self._count("rate_limited")
+            self._send(429, {"error": {"message": "rate limited"}},
+                       {"Retry-After": str(options.retry_after)})
+            return
+        if options.error_rate and random.random() < options.error_rate:
+            self._count("errors")
+            self._send(500, {"error": {"message": "upstream error"}})
+            return
+
+        if options.latency_ms:
+            time.sleep(latency_seconds(options))
+        if options.upload_mbps:
+            # time the request body would take over a link of this speed
+            time.sleep(length * 8 / (options.upload_mbps * 1e6))
+        user_text = _user_text(payload.get("messages") or [])
+        if self.canned:
+            content = next((answer for number, answer in self.canned
+                            if number and number in user_text), self.canned[0][1])
+        else:
+            content = json.dumps(mock_extract(user_text))
+        if payload.get("stream"):
+            self._count("streamed")
+            self._stream(payload.get("model"), content)
+            return
+        if options.ms_per_token:
+            # generation time grows with the answer, roughly 4 characters a token
+            time.sleep(len(content) / 4 * options.ms_per_token / 1000)
+        self._send(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+        })
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"),
+                        default="fixed")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--ms-per-token", type=float, default=0,
+                        help="simulate generation time per output token")
+    parser.add_argument("--upload-mbps", type=float, default=0,
+                        help="simulate sending request bodies over a link this fast")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0)
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--reject-response-format", action="store_true")
+    parser.add_argument("--canned", action="store_true",
+                        help="answer with precomputed sample_invoices/ extractions")
+    return parser
+
+
+def make_server(options):
+    canned = load_canned() if options.canned else None
+    handler = type("Handler", (FakeLLMHandler,),
+                   {"options": options, "stats": {}, "canned": canned})
+    return ThreadingHTTPServer((options.host, options.port), handler)
+
+
+def main():
+    options = build_parser().parse_args()
+    server = make_server(options)
+    print(f"Fake LLM listening on http://{options.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,51 @@
-from db import HEADER_COLUMNS, DETAIL_COLUMNS, get_conn, init_db
+import argparse
 import os
 import sys
+import time
 from datetime import datetime
+
 import openpyxl
 from openpyxl.utils.datetime import from_excel
 
-
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 BACKEND_DIR = os.path.join(ROOT, "backend")
 sys.path.insert(0, BACKEND_DIR)
 
+from db import (  # noqa: E402
+    DETAIL_INSERT_COLUMNS,
+    HEADER_COLUMNS,
+    INSERT_DETAIL_SQL,
+    INSERT_HEADER_SQL,
+    get_conn,
+    init_db,
+    mark_orders_changed,
+    resume_search_triggers,
+    suspend_search_triggers,
+    sync_id_sequences,
+)
 
 EXCEL_PATH = os.path.join(ROOT, "data.xlsx")
 
+HEADER_DATE_COLUMNS = ("OrderDate", "DueDate", "ShipDate")
+
+# secondary indexes that nothing reads during the load and that --drop-indexes
+# may drop. idx_salesorderdetail_salesorderid stays: it is the foreign key
+# lookup, and every per-order query and trigger depends on it.
+DROPPABLE_INDEXES = (
+    "idx_salesorderheader_orderdate",
+    "idx_salesorderheader_totaldue",
+)
+
+# sheet -> (columns taken from the sheet, insert statement, date columns)
+SHEETS = {
+    "SalesOrderHeader": (
+        HEADER_COLUMNS,
+        INSERT_HEADER_SQL.replace("INSERT", "INSERT OR IGNORE", 1),
+        HEADER_DATE_COLUMNS,
+    ),
+    "SalesOrderDetail": (DETAIL_INSERT_COLUMNS, INSERT_DETAIL_SQL, ()),
+}
+
 
 def maybe_date(value):
     if value is None:
@@ -27,61 +60,172 @@ def maybe_date(value):
     return None
 
 
-def load_sheet(ws):
-    rows = list(ws.iter_rows(values_only=True))
-    if not rows:
-        return []
-    header = [str(h).strip() if h is not None else "" for h in rows[0]]
-    data = []
-    for row in rows[1:]:
+def iter_sheet_rows(ws, columns, date_columns, start_row=2):
+    # yields (sheet row number, values in `columns` order) without holding the sheet
+    rows = ws.iter_rows(min_row=1, values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [str(h).strip() if h is not None else "" for h in header]
+    positions = [header.index(col) if col in header else None for col in columns]
+    dates = {columns.index(col) for col in date_columns if col in header}
+
+    if start_row > 2:
+        rows = ws.iter_rows(min_row=start_row, values_only=True)
+    for row_number, row in enumerate(rows, start=start_row):
         if all(cell is None for cell in row):
             continue
-        data.append(dict(zip(header, row)))
-    return data
+        values = [row[pos] if pos is not None and pos < len(row) else None
+                  for pos in positions]
+        for index in dates:
+            values[index] = maybe_date(values[index])
+        yield row_number, values
 
 
-def main():
-    if not os.path.exists(EXCEL_PATH):
-        raise SystemExit(f"Missing {EXCEL_PATH}")
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-    init_db()
-    wb = openpyxl.load_workbook(EXCEL_PATH, data_only=True)
 
-    headers = load_sheet(wb["SalesOrderHeader"]
-                         ) if "SalesOrderHeader" in wb.sheetnames else []
-    details = load_sheet(wb["SalesOrderDetail"]
-                         ) if "SalesOrderDetail" in wb.sheetnames else []
+def source_id(path):
+    # a changed workbook must not resume from another file's checkpoint
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
 
+
+def load_checkpoint(source, sheet):
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT RowNumber, Rows FROM ImportCheckpoints WHERE Source = ? AND Sheet = ?",
+            (source, sheet),
+        ).fetchone()
+    return (row["RowNumber"], row["Rows"]) if row else (1, 0)
+
+
+def import_sheet(ws, sheet, source, batch_size, commit_every, resume=True):
+    columns, sql, date_columns = SHEETS[sheet]
+    last_row, done = load_checkpoint(source, sheet) if resume else (1, 0)
+    if done:
+        print(f"{sheet}: resuming after row {last_row} ({done} rows already imported)")
+
+    rows = iter_sheet_rows(ws, columns, date_columns, start_row=last_row + 1)
+    batches = batched(rows, batch_size)
+    imported = 0
+    start = time.perf_counter()
+    while True:
+        # one transaction per commit_every batches; the checkpoint is written in
+        # the same transaction so a crash can never double-insert or skip rows
+        group = 0
+        with get_conn() as conn:
+            for batch in batches:
+                conn.executemany(sql, [values for _, values in batch])
+                mark_orders_changed()
+                last_row = batch[-1][0]
+                imported += len(batch)
+                group += 1
+                if group >= commit_every:
+                    break
+            if group:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ImportCheckpoints "
+                    "(Source, Sheet, RowNumber, Rows, UpdatedAt) VALUES (?, ?, ?, ?, ?)",
+                    (source, sheet, last_row, done + imported,
+                     datetime.utcnow().isoformat()),
+                )
+        if not group:
+            break
+        elapsed = time.perf_counter() - start
+        print(f"{sheet}: {done + imported} rows (row {last_row}), "
+              f"{imported / elapsed:,.0f} rows/s", flush=True)
+    return imported
+
+
+def drop_indexes(names=DROPPABLE_INDEXES):
     with get_conn() as conn:
-        if "--reset" in sys.argv:
-            conn.execute("DELETE FROM SalesOrderDetail")
-            conn.execute("DELETE FROM SalesOrderHeader")
-            conn.execute("DELETE FROM Documents")
-
-        for row in headers:
-            row["OrderDate"] = maybe_date(row.get("OrderDate"))
-            row["DueDate"] = maybe_date(row.get("DueDate"))
-            row["ShipDate"] = maybe_date(row.get("ShipDate"))
-            values = {col: row.get(col) for col in HEADER_COLUMNS}
-            cols = ", ".join(values.keys())
-            placeholders = ", ".join(["?"] * len(values))
-            conn.execute(
-                f"INSERT OR IGNORE INTO SalesOrderHeader ({cols}) VALUES ({placeholders})",
-                list(
-                    values.values()),
-            )
-
-        for row in details:
-            values = {col: row.get(col)
-                      for col in DETAIL_COLUMNS if col != "SalesOrderDetailID"}
-            cols = ", ".join(values.keys())
-            placeholders = ", ".join(["?"] * len(values))
-            conn.execute(
-                f"INSERT INTO SalesOrderDetail ({cols}) VALUES ({placeholders})",
-                list(values.values()),
-            )
-
-    print(f"Imported {len(headers)} headers and {len(details)} details.")
+        marks = ", ".join(["?"] * len(names))
+        indexes = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            f"AND sql IS NOT NULL AND name IN ({marks})",
+            list(names),
+        ).fetchall()
+        for index in indexes:
+            conn.execute(f"DROP INDEX {index['name']}")
+    return [index["sql"] for index in indexes]
+
+
+def rebuild_indexes(statements):
+    start = time.perf_counter()
+    with get_conn() as conn:
+        for statement in statements:
+            conn.execute(statement)
+    print(f"Rebuilt {len(statements)} indexes in {time.perf_counter() - start:.1f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Stream SalesOrderHeader/SalesOrderDetail rows from data.xlsx into SQLite.")
+    parser.add_argument("path", nargs="?", default=EXCEL_PATH)
+    parser.add_argument("--reset", action="store_true",
+                        help="delete existing orders, documents and checkpoints first")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="rows per executemany call")
+    parser.add_argument("--commit-every", type=int, default=10,
+                        help="batches per transaction (and checkpoint)")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore checkpoints from an interrupted run")
+    parser.add_argument("--drop-indexes", action="store_true",
+                        help="drop the OrderDate/TotalDue header indexes during the load")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.path):
+        raise SystemExit(f"Missing {args.path}")
+
+    init_db()
+    # the search index is rebuilt once at the end instead of per inserted row;
+    # a resumed run rebuilds it too, and init_db() does if this one dies
+    suspend_search_triggers()
+    wb = None
+    index_sql = []
+    counts = {}
+    try:
+        if args.reset:
+            with get_conn() as conn:
+                conn.execute("DELETE FROM SalesOrderDetail")
+                conn.execute("DELETE FROM SalesOrderHeader")
+                conn.execute("DELETE FROM Documents")
+                mark_orders_changed()
+                conn.execute("DELETE FROM ImportCheckpoints")
+
+        source = source_id(args.path)
+        wb = openpyxl.load_workbook(args.path, read_only=True, data_only=True)
+        index_sql = drop_indexes() if args.drop_indexes else []
+        for sheet in SHEETS:
+            if sheet in wb.sheetnames:
+                counts[sheet] = import_sheet(
+                    wb[sheet], sheet, source, max(1, args.batch_size),
+                    max(1, args.commit_every), resume=not args.restart)
+    finally:
+        if wb is not None:
+            wb.close()
+        if index_sql:
+            rebuild_indexes(index_sql)
+        # imported rows keep their sheet ids; new orders must be allocated past them
+        sync_id_sequences()
+        start = time.perf_counter()
+        indexed = resume_search_triggers()
+        print(f"Indexed {indexed} orders for search in {time.perf_counter() - start:.1f}s")
+
+    print(f"Imported {counts.get('SalesOrderHeader', 0)} headers and "
+          f"{counts.get('SalesOrderDetail', 0)} details.")
 
 
 if __name__ == "__main__":
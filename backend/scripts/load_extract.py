@@ -0,0 +1,357 @@
+"""Load test POST /api/extract end to end against the fake LLM server.
+
+Starts the fake server and the app as subprocesses, then keeps --concurrency
+clients posting a mix of text, PDF and image uploads for --duration seconds (or
+--requests in total) and writes a JSON report:
+
+    python scripts/load_extract.py --concurrency 8 --duration 30 --output load.json
+
+The report has p50/p95/p99 latency, throughput and error rate, overall and per
+upload type. It also has the peak RSS of the app process tree, the fake server's
+counters, the git commit and every setting, so runs can be diffed across commits.
+--compare prints the change against an earlier report. Use --app-url (and
+--app-pid for RSS) to target an app that is already running, e.g. under
+gunicorn. The fake server's latency distribution, error rate and 429 rate are
+set with the --latency-*, --error-rate and --rate-limit-rate options.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+ROOT_DIR = os.path.abspath(os.path.join(BACKEND_DIR, ".."))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+APP_LAUNCHER = """
+import logging, sys
+from werkzeug.serving import run_simple
+from app import app
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+run_simple("127.0.0.1", int(sys.argv[1]), app, threaded=True)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, process=None, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"{url}: process exited with {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise SystemExit(f"{url} did not come up in {timeout}s")
+
+
+def _proc_kib(pid, field):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree(pid):
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+class RssSampler(threading.Thread):
+    # peak resident memory of a process and its children (PDF workers), sampled
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kib = 0
+        self.peak_processes = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            pids = process_tree(self.pid)
+            self.peak_kib = max(self.peak_kib, sum(_proc_kib(pid, "VmRSS:") for pid in pids))
+            self.peak_processes = max(self.peak_processes, len(pids))
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        # the kernel's high-water mark catches spikes between samples
+        return max(self.peak_kib, _proc_kib(self.pid, "VmHWM:"))
+
+
+def build_uploads(workdir):
+    # {kind: [(filename, bytes, mime type)]}
+    from bench_compaction import build_pdf_pages, write_pdf
+    from bench_image_prep import render_photo
+
+    uploads = {"txt": [], "pdf": [], "image": []}
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "sample_invoices", "*.txt"))):
+        with open(path, "rb") as f:
+            uploads["txt"].append((os.path.basename(path), f.read(), "text/plain"))
+    for pages in (1, 3, 8):
+        path = os.path.join(workdir, f"invoice_{pages}p.pdf")
+        write_pdf(build_pdf_pages(pages, 12, seed=pages), path)
+        with open(path, "rb") as f:
+            uploads["pdf"].append((os.path.basename(path), f.read(), "application/pdf"))
+    with open(os.path.join(ROOT_DIR, "Sales Invoice.png"), "rb") as f:
+        uploads["image"].append(("Sales Invoice.png", f.read(), "image/png"))
+    photo = os.path.join(workdir, "invoice_photo.jpg")
+    with open(os.path.join(ROOT_DIR, "sample_invoices", "invoice_alpha.txt"),
+              encoding="utf-8") as f:
+        render_photo(f.read(), photo)
+    with open(photo, "rb") as f:
+        uploads["image"].append(("invoice_photo.jpg", f.read(), "image/jpeg"))
+    return uploads
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values, q):
+    # nearest rank on sorted values
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return round(values[index], 1)
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(ms for _, ok, ms, _ in samples if ok)
+    errors = sum(not ok for _, ok, _, _ in samples)
+    statuses = {}
+    for _, _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "max": round(latencies[-1], 1) if latencies else None,
+        },
+        "statuses": statuses,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def compare(report, baseline):
+    # lines like "p95 latency  812.0 -> 905.3 ms (+11.5%)"
+    metrics = [("throughput", ("overall", "throughput_rps"), "req/s"),
+               ("p50 latency", ("overall", "latency_ms", "p50"), "ms"),
+               ("p95 latency", ("overall", "latency_ms", "p95"), "ms"),
+               ("p99 latency", ("overall", "latency_ms", "p99"), "ms"),
+               ("error rate", ("overall", "error_rate"), ""),
+               ("peak RSS", ("peak_rss_mb",), "MB")]
+    print(f"compared with {baseline.get('commit')} ({baseline.get('started_at')}):")
+    for label, path, unit in metrics:
+        old, new = baseline, report
+        for key in path:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        change = f" ({(new - old) / old:+.1%})" if old and new is not None else ""
+        print(f"  {label:12} {old} -> {new} {unit}{change}")
+
+
+def run_load(base_url, uploads, mix, concurrency, duration, total, warmup, seed):
+    # returns ([(kind, ok, ms, status)], seconds since the first measured request)
+    kinds = [kind for kind in mix if uploads.get(kind)]
+    weights = [mix[kind] for kind in kinds]
+    samples = []
+    lock = threading.Lock()
+    state = {"issued": 0, "first": None,
+             "deadline": time.monotonic() + duration if duration else None}
+
+    def worker(index):
+        rnd = random.Random(seed + index)
+        session = requests.Session()
+        while True:
+            with lock:
+                if total and state["issued"] >= total + warmup:
+                    return
+                if state["deadline"] and time.monotonic() >= state["deadline"]:
+                    return
+                state["issued"] += 1
+                measured = state["issued"] > warmup
+                if measured and state["first"] is None:
+                    state["first"] = time.monotonic()
+            kind = rnd.choices(kinds, weights)[0]
+            filename, body, mime_type = rnd.choice(uploads[kind])
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/api/extract",
+                                        files={"file": (filename, body, mime_type)},
+                                        timeout=300)
+                status = response.status_code
+                ok = status == 200
+            except requests.RequestException as exc:
+                status = type(exc).__name__
+                ok = False
+            if measured:
+                with lock:
+                    samples.append((kind, ok, (time.perf_counter() - start) * 1000, status))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - (state["first"] or time.monotonic())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="seconds (0 = use --requests)")
+    parser.add_argument("--requests", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=5, help="requests left out of the report")
+    parser.add_argument("--mix", default="txt=6,pdf=3,image=1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--latency-dist", default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.4)
+    parser.add_argument("--ms-per-token", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app setting, e.g. --env PDF_WORKERS=2")
+    parser.add_argument("--app-url", help="use a running app instead of starting one")
+    parser.add_argument("--app-pid", type=int, help="pid of --app-url, for RSS")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="an earlier JSON report to compare with")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("set --duration or --requests")
+
+    workdir = tempfile.mkdtemp(prefix="load-extract-")
+    processes = []
+    llm_port = free_port()
+    llm_cmd = [sys.executable, os.path.join(SCRIPTS_DIR, "fake_llm_server.py"),
+               "--port", str(llm_port), "--canned",
+               "--latency-ms", str(args.latency_ms), "--latency-dist", args.latency_dist,
+               "--latency-sigma", str(args.latency_sigma),
+               "--ms-per-token", str(args.ms_per_token),
+               "--error-rate", str(args.error_rate),
+               "--rate-limit-rate", str(args.rate_limit_rate),
+               "--retry-after", str(args.retry_after)]
+    processes.append(subprocess.Popen(llm_cmd, stdout=subprocess.DEVNULL))
+    llm_url = f"http://127.0.0.1:{llm_port}"
+
+    app_env = {
+        "DATABASE_PATH": os.path.join(workdir, "load.db"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "EXTRACTION_CACHE": "0",
+        "PDF_TEXT_CACHE": "0",
+        "VENDOR_TEMPLATES": "0",
+        "LLM_PROVIDER": "openai_compatible",
+        "LLM_API_KEY": "load",
+        "LLM_BASE_URL": f"{llm_url}/v1",
+    }
+    app_env.update(item.split("=", 1) for item in args.env)
+    try:
+        wait_for(f"{llm_url}/stats", processes[0])
+        if args.app_url:
+            base_url, app_pid = args.app_url.rstrip("/"), args.app_pid
+        else:
+            app_port = free_port()
+            app = subprocess.Popen([sys.executable, "-c", APP_LAUNCHER, str(app_port)],
+                                   cwd=BACKEND_DIR, env={**os.environ, **app_env})
+            processes.append(app)
+            base_url, app_pid = f"http://127.0.0.1:{app_port}", app.pid
+            wait_for(f"{base_url}/api/health", app)
+
+        uploads = build_uploads(workdir)
+        sampler = RssSampler(app_pid) if app_pid else None
+        if sampler:
+            sampler.start()
+        started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        samples, elapsed = run_load(base_url, uploads, parse_mix(args.mix), args.concurrency,
+                                    args.duration, args.requests, args.warmup, args.seed)
+        peak_kib = sampler.stop() if sampler else None
+        llm_stats = requests.get(f"{llm_url}/stats", timeout=5).json()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "started_at": started_at,
+        "settings": {**vars(args), "app_env": {k: v for k, v in app_env.items()
+                                                if k not in ("LLM_API_KEY",)}},
+        "uploads": {kind: [name for name, _, _ in files] for kind, files in uploads.items()},
+        "elapsed_s": round(elapsed, 2),
+        "overall": summarize(samples, elapsed),
+        "by_type": {kind: summarize([s for s in samples if s[0] == kind], elapsed)
+                    for kind in uploads},
+        "peak_rss_mb": round(peak_kib / 1024, 1) if peak_kib else None,
+        "peak_processes": sampler.peak_processes if sampler else None,
+        "llm_server": llm_stats,
+    }
+    overall = report["overall"]
+    print(f"{overall['requests']} requests in {elapsed:.1f}s at concurrency {args.concurrency}: "
+          f"{overall['throughput_rps']} req/s, p50 {overall['latency_ms']['p50']} ms, "
+          f"p95 {overall['latency_ms']['p95']} ms, p99 {overall['latency_ms']['p99']} ms, "
+          f"errors {overall['error_rate']:.2%}, peak RSS {report['peak_rss_mb']} MB")
+    for kind, summary in report["by_type"].items():
+        print(f"  {kind:6} {summary['requests']:5d} requests  p50 {summary['latency_ms']['p50']} ms"
+              f"  p99 {summary['latency_ms']['p99']} ms  errors {summary['errors']}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
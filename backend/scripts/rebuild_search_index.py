@@ -0,0 +1,23 @@
+"""Rebuild the OrderSearch full-text index from Documents and SalesOrderDetail.
+
+    python scripts/rebuild_search_index.py
+"""
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from db import init_db, rebuild_search_index  # noqa: E402
+
+
+def main():
+    init_db()
+    start = time.perf_counter()
+    count = rebuild_search_index()
+    print(f"Indexed {count} orders in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
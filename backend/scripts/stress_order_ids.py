@@ -0,0 +1,149 @@
+"""Fire concurrent order inserts from several processes and threads at a scratch
+database and check the SalesOrderIDs they were given.
+
+    python scripts/stress_order_ids.py --processes 4 --threads 8 --orders 250
+
+Fails (exit 1) on a duplicate or missing id, an insert error, or a gap that is
+not the unused tail of some process's last id block.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_payload(worker, i):
+    return {
+        "header": {"OrderDate": "2026-01-10", "SalesOrderNumber": f"SO-STRESS-{worker}-{i}",
+                   "SubTotal": 10.0, "TaxAmt": 0.0, "Freight": 0.0, "TotalDue": 10.0},
+        "document": {"Filename": f"stress-{worker}-{i}.txt", "VendorName": "Stress Co",
+                     "InvoiceNumber": f"INV-{worker}-{i}"},
+        "details": [{"OrderQty": 1, "ProductID": "P-1", "ProductName": "Part",
+                     "UnitPrice": 10.0, "UnitPriceDiscount": 0.0, "LineTotal": 10.0}],
+    }
+
+
+def insert_many(worker, orders, bulk):
+    # one thread: single inserts, with every fifth step a small bulk insert
+    import db
+
+    ids, errors = [], []
+    i = 0
+    while i < orders:
+        try:
+            if bulk and i % 5 == 4:
+                count = min(bulk, orders - i)
+                ids.extend(db.insert_orders(
+                    [make_payload(worker, i + j) for j in range(count)]))
+                i += count
+            else:
+                ids.append(db.insert_order(make_payload(worker, i))["header"]["SalesOrderID"])
+                i += 1
+        except Exception as exc:
+            errors.append(f"{type(exc).__name__}: {exc}")
+            i += 1
+    return ids, errors
+
+
+def run_process(process, threads, orders, bulk):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(
+            lambda t: insert_many(f"{process}-{t}", orders, bulk), range(threads)))
+    ids = [new_id for thread_ids, _ in results for new_id in thread_ids]
+    errors = [error for _, thread_errors in results for error in thread_errors]
+    return os.getpid(), ids, errors
+
+
+def check(by_process, first_id, block_size):
+    problems = []
+    owners = {}
+    for pid, ids in by_process.items():
+        for new_id in ids:
+            if new_id in owners:
+                problems.append(f"id {new_id} handed to {owners[new_id]} and {pid}")
+            owners[new_id] = pid
+
+    # blocks start at first_id and are block_size long, so an id's block is
+    # fixed; each block belongs to one process and is used from its start
+    blocks = {}
+    for new_id, pid in owners.items():
+        blocks.setdefault((new_id - first_id) // block_size, []).append((new_id, pid))
+    partial = {}
+    for index, members in sorted(blocks.items()):
+        start = first_id + index * block_size
+        pids = {pid for _, pid in members}
+        used = sorted(new_id for new_id, _ in members)
+        if len(pids) > 1:
+            problems.append(f"block at {start} shared by processes {sorted(pids)}")
+        if used != list(range(start, start + len(used))):
+            problems.append(f"block at {start} has holes: {len(used)} of {block_size} used")
+        if len(used) < block_size:
+            for pid in pids:
+                partial.setdefault(pid, []).append(start)
+    for pid, starts in partial.items():
+        if len(starts) > 1:
+            problems.append(f"process {pid} left {len(starts)} partial blocks {starts}")
+
+    highest = max(owners) if owners else first_id - 1
+    unused = highest - first_id + 1 - len(owners)
+    return problems, unused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--orders", type=int, default=250, help="orders per thread")
+    parser.add_argument("--bulk", type=int, default=10,
+                        help="orders per insert_orders() call (0 disables bulk inserts)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "stress.db")
+    import db
+
+    db.init_db()
+    if args.bulk > db.ID_BLOCK_SIZE:
+        raise SystemExit("--bulk must not exceed ID_BLOCK_SIZE for the block check")
+    first_id = db.ID_SEQUENCES["SalesOrderID"][2]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes,
+                             mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(run_process, p, args.threads, args.orders, args.bulk)
+                   for p in range(args.processes)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    by_process = {pid: ids for pid, ids, _ in results}
+    errors = [error for _, _, process_errors in results for error in process_errors]
+    expected = args.processes * args.threads * args.orders
+    inserted = sum(len(ids) for ids in by_process.values())
+    with db.get_conn() as conn:
+        rows = conn.execute("SELECT COUNT(*) AS n FROM SalesOrderHeader").fetchone()["n"]
+
+    problems, unused = check(by_process, first_id, db.ID_BLOCK_SIZE)
+    if errors:
+        problems.append(f"{len(errors)} insert errors, first: {errors[0]}")
+    if inserted != expected or rows != expected:
+        problems.append(f"expected {expected} orders, got {inserted} ids and {rows} rows")
+
+    print(f"{args.processes} processes x {args.threads} threads x {args.orders} orders: "
+          f"{inserted} inserts in {elapsed:.1f}s ({inserted / elapsed:,.0f}/s)")
+    print(f"block size {db.ID_BLOCK_SIZE}: {unused} unused ids "
+          f"(at most {args.processes * (db.ID_BLOCK_SIZE - 1)} allowed)")
+    for problem in problems[:20]:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print("OK: no duplicate ids, no gaps inside blocks")
+
+
+if __name__ == "__main__":
+    main()
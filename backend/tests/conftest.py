@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app modules read their settings at import time, so the scratch database
+# and data directories have to be in place before any test imports them.
+DATA_DIR = tempfile.mkdtemp(prefix="invoice-tests-")
+os.environ.update({
+    "DATABASE_PATH": os.path.join(DATA_DIR, "test.db"),
+    "UPLOAD_DIR": os.path.join(DATA_DIR, "uploads"),
+    "PROFILE_DIR": os.path.join(DATA_DIR, "profiles"),
+    "JOB_WORKERS": "0",
+    "PDF_WORKERS": "0",
+    "LLM_PROVIDER": "mock",
+})
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLE_DIR = os.path.abspath(os.path.join(BACKEND_DIR, "..", "sample_invoices"))
+# the benchmark scripts hold the reference implementations some tests compare against
+sys.path.insert(0, os.path.join(BACKEND_DIR, "scripts"))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def sample_texts():
+    texts = {}
+    for name in sorted(os.listdir(SAMPLE_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(SAMPLE_DIR, name), encoding="utf-8") as f:
+                texts[name] = f.read()
+    return texts
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    import db
+
+    db.init_db()
+    return db
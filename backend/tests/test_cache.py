@@ -0,0 +1,39 @@
+import pytest
+
+import cache
+import pipeline
+from bench_compaction import write_pdf
+
+
+@pytest.fixture
+def invoice_pdf(tmp_path):
+    path = tmp_path / "invoice.pdf"
+    write_pdf([["ACME SUPPLY", "Invoice Number: INV-7", "Total: 12.00"]], str(path))
+    cache.extraction_cache.purge()
+    cache.pdf_text_cache.purge()
+    return str(path)
+
+
+def _extract(path):
+    return pipeline.run_extraction(path, "invoice.pdf", "application/pdf")["meta"]
+
+
+def test_pdf_text_cache_is_separate_from_the_extraction_cache(invoice_pdf, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ENABLED", False)
+    assert _extract(invoice_pdf)["pdf"]["cached"] is False
+    assert _extract(invoice_pdf)["pdf"]["cached"] is True
+
+    pdf_stats = cache.pdf_text_cache.stats()
+    assert (pdf_stats["misses"], pdf_stats["memory_hits"], pdf_stats["sqlite_entries"]) == (1, 1, 1)
+    extraction_stats = cache.stats()
+    assert (extraction_stats["misses"], extraction_stats["writes"],
+            extraction_stats["sqlite_entries"]) == (0, 0, 0)
+
+
+def test_pdf_text_cache_has_its_own_switch(invoice_pdf, monkeypatch):
+    monkeypatch.setattr(cache, "PDF_TEXT_CACHE_ENABLED", False)
+    _extract(invoice_pdf)
+    cache.extraction_cache.purge()
+    assert _extract(invoice_pdf)["pdf"]["cached"] is False
+    assert cache.pdf_text_cache.stats()["sqlite_entries"] == 0
+    assert cache.stats()["writes"] == 1
@@ -0,0 +1,36 @@
+import copy
+import json
+import random
+
+import pytest
+
+from bench_normalize import bulk_orders, fuzz_case, legacy_normalize_extraction, run
+from conftest import sample_texts
+from llm import mock_extract
+from normalize import normalize_extraction, normalize_extractions
+
+SAMPLES = sorted(sample_texts().items())
+
+
+@pytest.mark.parametrize("name, text", SAMPLES, ids=[name for name, _ in SAMPLES])
+def test_matches_legacy_normalizer_on_sample_invoices(name, text):
+    extracted = mock_extract(text)
+    extra = {"raw_text": text, "filename": name, "mime_type": "text/plain"}
+    assert run(normalize_extraction, extracted, extra) == run(
+        legacy_normalize_extraction, extracted, extra)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_matches_legacy_normalizer_on_fuzzed_extractions(seed):
+    # run() compares the output and the mutated input, key order and -0.0 included
+    rnd = random.Random(seed)
+    for _ in range(2000):
+        data, extra = fuzz_case(rnd)
+        assert run(normalize_extraction, data, extra) == run(
+            legacy_normalize_extraction, data, extra), (data, extra)
+
+
+def test_batch_matches_one_at_a_time():
+    orders = bulk_orders(200, seed=1)
+    expected = [legacy_normalize_extraction(order) for order in copy.deepcopy(orders)]
+    assert json.dumps(normalize_extractions(copy.deepcopy(orders))) == json.dumps(expected)
@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import db
+from stress_order_ids import make_payload, run_process
+
+
+def _pool(workers):
+    # spawned workers inherit DATABASE_PATH, so they share the test database
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+
+
+def _allocate_many(rounds, count):
+    return [new_id for _ in range(rounds) for new_id in db.allocate_ids("SalesOrderID", count)]
+
+
+def _insert_explicit(ids):
+    inserted = []
+    for new_id in ids:
+        payload = make_payload("explicit", new_id)
+        payload["header"]["SalesOrderID"] = new_id
+        inserted.append(db.insert_order(payload)["header"]["SalesOrderID"])
+    return inserted
+
+
+def test_concurrent_allocate_ids_are_disjoint():
+    with _pool(3) as pool:
+        futures = [pool.submit(_allocate_many, 20, count) for count in (1, 7, 150)]
+        ids = [new_id for future in futures for new_id in future.result()]
+    ids += _allocate_many(20, 3)
+    assert len(ids) == len(set(ids)) == 20 * (1 + 7 + 150 + 3)
+
+
+def test_concurrent_inserts_get_disjoint_ids():
+    with _pool(3) as pool:
+        futures = [pool.submit(run_process, process, 4, 25, 5) for process in range(3)]
+        results = [future.result() for future in futures]
+    ids = [new_id for _, process_ids, _ in results for new_id in process_ids]
+    assert [error for _, _, errors in results for error in errors] == []
+    assert len(ids) == len(set(ids)) == 3 * 4 * 25
+
+
+def test_explicit_id_inside_another_process_block_is_skipped():
+    # this process reserves a block and uses its first id ...
+    first = db.insert_order(make_payload("owner", 0))["header"]["SalesOrderID"]
+    # ... another process writes explicit ids that fall inside that block ...
+    explicit = [first + 1, first + 3]
+    with _pool(1) as pool:
+        assert pool.submit(_insert_explicit, explicit).result() == explicit
+    # ... and the ids this process hands out next skip them instead of failing
+    ids = [db.insert_order(make_payload("owner", i))["header"]["SalesOrderID"]
+           for i in range(1, 6)]
+    ids += db.insert_orders([make_payload("owner", i) for i in range(6, 9)])
+    assert len(set(ids)) == 8
+    assert not set(ids) & set(explicit)
+    assert first not in ids
@@ -0,0 +1,32 @@
+import pytest
+
+import profiling
+from app import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", "sécret")
+    return app.test_client()
+
+
+def test_profile_endpoints_need_the_profile_secret(client):
+    secret = "sécret".encode().decode("latin-1")  # as the raw header bytes arrive
+    for path in ("/api/admin/profiles", "/api/admin/profiles/20260101T000000-abcd1234"):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers={"X-Profile-Secret": "wrong"}).status_code == 403
+        assert client.get(path, headers={"X-Profile-Secret": "€"}).status_code == 403
+    assert client.get("/api/admin/profiles",
+                      headers={"X-Profile-Secret": secret}).status_code == 200
+    assert client.get("/api/admin/profiles/20260101T000000-abcd1234",
+                      headers={"X-Profile-Secret": secret}).status_code == 404
+
+
+def test_profile_endpoints_are_off_without_a_secret(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", "")
+    assert client.get("/api/admin/profiles").status_code == 404
+    assert client.get("/api/admin/profiles", headers={"X-Profile-Secret": ""}).status_code == 404
+
+
+def test_non_ascii_trigger_header_does_not_raise(client):
+    assert profiling._trigger({profiling.PROFILE_HEADER: "é€"}) is None
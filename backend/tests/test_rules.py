@@ -0,0 +1,33 @@
+import pytest
+
+from bench_rules import build_invoice
+from conftest import sample_texts
+from llm import mock_extract
+from rules import rules_extract
+
+SAMPLES = sorted(sample_texts().items())
+
+# rewrites that mock_extract's splitlines()/regex handling has to agree on
+VARIANTS = {
+    "as-is": lambda text: text,
+    "crlf": lambda text: text.replace("\n", "\r\n"),
+    "form-feeds": lambda text: text.replace("\n\n", "\n\x0c\n"),
+    "vertical-tabs": lambda text: text.replace("\n", "\x0b", 3),
+    "unicode-line-separators": lambda text: text.replace("\n", " ", 3),
+    "upper-case": lambda text: text.upper(),
+}
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+@pytest.mark.parametrize("name, text", SAMPLES, ids=[name for name, _ in SAMPLES])
+def test_rules_match_mock_extract_on_sample_invoices(name, text, variant):
+    text = VARIANTS[variant](text)
+    assert rules_extract(text) == mock_extract(text)
+
+
+def test_rules_match_mock_extract_on_a_long_invoice():
+    text = build_invoice(pages=20, items_per_page=10)
+    expected = mock_extract(text)
+    assert len(expected["details"]) >= 200
+    assert rules_extract(text) == expected
+
@@ -0,0 +1,47 @@
+import db
+from bench_bulk_insert import make_payloads
+
+
+def _insert(vendor, count):
+    payloads = make_payloads(count, 2)
+    for payload in payloads:
+        payload["document"]["VendorName"] = vendor
+    return db.insert_orders(payloads)
+
+
+def _triggers():
+    with db.get_conn() as conn:
+        return {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+
+
+def test_truncated_only_when_matches_fall_outside_the_rank_window(monkeypatch):
+    monkeypatch.setattr(db, "SEARCH_RANK_WINDOW", 3)
+    _insert("Quillfeather", 3)
+    result = db.search_orders("Quillfeather")
+    assert (len(result["results"]), result["truncated"]) == (3, False)
+    _insert("Quillfeather", 1)
+    result = db.search_orders("Quillfeather")
+    assert (len(result["results"]), result["truncated"]) == (3, True)
+
+
+def test_suspended_triggers_are_resumed_with_a_full_reindex():
+    db.suspend_search_triggers()
+    try:
+        assert not _triggers() & set(db.SEARCH_TRIGGERS)
+        ids = _insert("Marrowdale", 4)
+        assert db.search_orders("Marrowdale")["results"] == []
+    finally:
+        db.resume_search_triggers()
+    assert set(db.SEARCH_TRIGGERS) <= _triggers()
+    found = {row["SalesOrderID"] for row in db.search_orders("Marrowdale")["results"]}
+    assert found == set(ids)
+
+
+def test_init_db_reindexes_after_a_load_that_died():
+    db.suspend_search_triggers()
+    ids = _insert("Thistlewick", 2)
+    db.init_db()
+    assert set(db.SEARCH_TRIGGERS) <= _triggers()
+    found = {row["SalesOrderID"] for row in db.search_orders("Thistlewick")["results"]}
+    assert found == set(ids)
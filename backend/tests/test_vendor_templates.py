@@ -0,0 +1,39 @@
+import vendor_templates
+from conftest import sample_texts
+from llm import mock_extract
+from normalize import normalize_extraction
+
+BRAVO = sample_texts()["invoice_bravo.txt"]
+
+
+def _confirmed(text):
+    return normalize_extraction(mock_extract(text), raw_text=text,
+                                filename="invoice.txt", mime_type="text/plain")
+
+
+def test_learns_from_non_iso_dates_and_hits_the_next_invoice():
+    assert "Date Issued: 01/20/2026" in BRAVO
+    assert vendor_templates.learn_template(_confirmed(BRAVO)) is not None
+
+    second = (BRAVO.replace("SO-60009", "SO-61234")
+              .replace("01/20/2026", "03/05/2026")
+              .replace("02/19/2026", "04/04/2026")
+              .replace("50 | 1 | Adjustable Race | 9.98 | 499.00",
+                       "20 | 1 | Adjustable Race | 9.98 | 199.60\n"
+                       "3 | 7 | Bearing Ball | 10.00 | 30.00")
+              .replace("Subtotal: 499.00", "Subtotal: 229.60"))
+    extracted, meta = vendor_templates.apply_template(second)
+    assert meta["hit"]
+
+    normalized = normalize_extraction(extracted, raw_text=second)
+    assert normalized["document"]["InvoiceNumber"] == "SO-61234"
+    assert normalized["document"]["InvoiceDate"] == "2026-03-05"
+    assert normalized["header"]["OrderDate"] == "2026-03-05"
+    assert [(item["ProductName"], item["LineTotal"]) for item in normalized["details"]] == [
+        ("Adjustable Race", 199.6), ("Bearing Ball", 30.0)]
+
+
+def test_compares_captured_text_as_normalized_values():
+    assert vendor_templates._same("document", "InvoiceDate", "2026-01-20", "01/20/2026")
+    assert not vendor_templates._same("document", "InvoiceDate", "2026-01-21", "01/20/2026")
+    assert vendor_templates._same("document", "Total", 546.44, "$546.44")
@@ -0,0 +1,422 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from time import perf_counter
+
+import normalize
+from db import get_conn
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_ENABLED = os.getenv("VENDOR_TEMPLATES", "1") not in ("0", "false", "FALSE")
+FINGERPRINT_LABELS = int(os.getenv("VENDOR_TEMPLATE_LABELS", 8))
+# allowed drift per line item when checking line totals against SubTotal
+LINE_TOLERANCE = 0.01
+
+SKIP_FIELDS = {
+    "RawText",
+    "Filename",
+    "MimeType",
+    "SalesOrderID",
+    "DocumentID",
+    "CreatedAt",
+    "RevisionNumber",
+    "Status",
+    "OnlineOrderFlag",
+}
+# per-vendor values that are often absent from the text itself
+CONSTANT_FIELDS = {"VendorName", "Currency"}
+NUMERIC_FIELDS = {
+    "Subtotal",
+    "Tax",
+    "Freight",
+    "Total",
+    "SubTotal",
+    "TaxAmt",
+    "TotalDue",
+    "OrderQty",
+    "UnitPrice",
+    "UnitPriceDiscount",
+    "LineTotal",
+}
+DETAIL_FIELDS = ("ProductName", "ProductID", "OrderQty", "UnitPrice", "LineTotal",
+                 "UnitPriceDiscount")
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%b %d, %Y")
+
+NUMBER = r"[0-9][0-9,]*(?:\.[0-9]+)?"
+DETAIL_CAPTURES = {
+    "ProductName": r".+?",
+    "ProductID": r"[^\s|]+",
+}
+LABEL_RE = re.compile(r"^([A-Za-z][A-Za-z .#/&-]{0,40}?)\s*[:#]")
+LABEL_SPLIT_RE = re.compile(r"[(\[,;|]")
+# the normalizer's converter per (section, field): templates capture raw text
+# ("01/20/2026", "$1,024.00") while confirmed payloads hold normalized values
+NORMALIZERS = {
+    (section, field.name): normalize.CONVERTERS[field.kind]
+    for section, fields in (("document", normalize.DOCUMENT_FIELDS),
+                            ("header", normalize.HEADER_FIELDS),
+                            ("details", normalize.DETAIL_FIELDS))
+    for field in fields
+    if field.kind
+}
+
+_templates = {}
+_templates_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "fallbacks": 0, "llm_calls": 0, "llm_ms": 0.0}
+_stats_lock = threading.Lock()
+
+
+def fingerprint(text):
+    # first line (usually the vendor banner) plus the leading field labels
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    if not lines:
+        return None
+    labels = []
+    for line in lines[1:]:
+        match = LABEL_RE.match(line)
+        if match:
+            labels.append(match.group(1).strip().lower())
+            if len(labels) == FINGERPRINT_LABELS:
+                break
+    key = "\n".join([re.sub(r"\d", "#", lines[0].lower())] + labels)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _to_number(value):
+    if value is None:
+        return None
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _renderings(field, value):
+    if field in NUMERIC_FIELDS:
+        number = _to_number(value)
+        if number is None:
+            return []
+        rendered = [f"{number:,.2f}", f"{number:.2f}"]
+        if number == int(number):
+            rendered += [f"{int(number):,}", str(int(number))]
+        return list(dict.fromkeys(rendered))
+    value = str(value).strip()
+    rendered = [value]
+    try:
+        date = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return rendered
+    return list(dict.fromkeys(rendered + [date.strftime(fmt) for fmt in DATE_FORMATS]))
+
+
+def _occurrences(line, needle, start=0):
+    lower = line.lower()
+    needle = needle.lower()
+    pos = lower.find(needle, start)
+    while pos != -1:
+        end = pos + len(needle)
+        before = line[pos - 1] if pos else " "
+        after = line[end] if end < len(line) else " "
+        if not before.isalnum() and not after.isalnum() and not (
+                after == "." and end + 1 < len(line) and line[end + 1].isdigit()):
+            yield pos, end
+        pos = lower.find(needle, pos + 1)
+
+
+def _label(prefix):
+    label = LABEL_SPLIT_RE.split(prefix)[-1].rstrip().rstrip("$").rstrip()
+    if not re.search(r"[A-Za-z]", label) or re.search(r"\d", label) or len(label) > 60:
+        return None
+    return label.strip()
+
+
+def _literal(text):
+    # escaped literal text with flexible whitespace, optional $ and any digits
+    pieces = []
+    for chunk in re.split(r"(\s+)", text):
+        if not chunk:
+            continue
+        if chunk.isspace():
+            pieces.append(r"[ \t]*")
+            continue
+        for part in re.split(r"(\d+)", chunk):
+            if not part:
+                continue
+            if part.isdigit():
+                pieces.append(r"[0-9]+")
+            else:
+                pieces.append(re.escape(part).replace(r"\$", r"\$?"))
+    return "".join(pieces)
+
+
+def _capture(field, rest):
+    if field in NUMERIC_FIELDS:
+        return rf"\$?({NUMBER})"
+    rest = rest.strip()
+    if not rest:
+        return r"(.+?)[ \t]*$"
+    return r"(.+?)[ \t]*" + re.escape(rest[0])
+
+
+def _learn_field(lines, field, value):
+    for rendered in _renderings(field, value):
+        for line in lines:
+            for start, end in _occurrences(line, rendered):
+                label = _label(line[:start])
+                if label:
+                    return {
+                        "kind": "label",
+                        "pattern": r"(?<![A-Za-z0-9])" + _literal(label) + r"[ \t]*"
+                        + _capture(field, line[end:]),
+                    }
+
+    # value on the line(s) right after a labelled line, e.g. "Bill To:" + address
+    value = str(value).strip().lower()
+    for index, line in enumerate(lines):
+        match = LABEL_RE.match(line.strip())
+        if not match:
+            continue
+        following = [item.strip() for item in lines[index + 1:index + 4]]
+        for count in range(1, len(following) + 1):
+            if ", ".join(following[:count]).lower() == value:
+                pattern = r"^[ \t]*" + _literal(match.group(0)) + r".*\n"
+                pattern += r"\n".join([r"[ \t]*(.+?)[ \t]*"] * count) + "$"
+                return {"kind": "next_lines", "pattern": pattern}
+    return None
+
+
+def _learn_line_pattern(line, item):
+    spans = []
+    for field in DETAIL_FIELDS:
+        value = item.get(field)
+        if value in (None, "") or (field == "UnitPriceDiscount" and not _to_number(value)):
+            continue
+        found = False
+        for rendered in _renderings(field, value):
+            for start, end in _occurrences(line, rendered):
+                if all(end <= s or start >= e for s, e, _ in spans):
+                    spans.append((start, end, field))
+                    found = True
+                    break
+            if found:
+                break
+    fields = {field for _, _, field in spans}
+    if "ProductName" not in fields or "LineTotal" not in fields:
+        return None
+
+    spans.sort()
+    pieces = [r"^[ \t]*"]
+    cursor = 0
+    for start, end, field in spans:
+        pieces.append(_literal(line[cursor:start]))
+        capture = DETAIL_CAPTURES.get(field, NUMBER)
+        pieces.append(f"(?P<{field}>{capture})")
+        cursor = end
+    pieces.append(_literal(line[cursor:].rstrip()) + r"[ \t]*$")
+    return "".join(pieces)
+
+
+def _same(section, field, expected, actual):
+    # compare the way both values will be stored, e.g. "01/20/2026" == "2026-01-20"
+    convert = NORMALIZERS.get((section, field))
+    if convert is not None and convert(expected) is not None:
+        expected, actual = convert(expected), convert(actual)
+    if field in NUMERIC_FIELDS:
+        expected, actual = _to_number(expected), _to_number(actual)
+        return expected is not None and actual is not None and abs(expected - actual) < 0.005
+    return str(expected).strip().lower() == str(actual).strip().lower()
+
+
+def _compile(template):
+    compiled = {"template": template, "fields": [], "line": None}
+    for section, field, rule in template["fields"]:
+        pattern = re.compile(rule["pattern"], re.MULTILINE)
+        compiled["fields"].append((section, field, rule["kind"], pattern))
+    if template.get("line_pattern"):
+        compiled["line"] = re.compile(template["line_pattern"])
+    return compiled
+
+
+def _run(compiled, text):
+    template = compiled["template"]
+    result = {"document": {}, "header": {}, "details": []}
+    for section, field, value in template.get("constants", []):
+        result[section][field] = value
+
+    for section, field, kind, pattern in compiled["fields"]:
+        match = pattern.search(text)
+        if not match:
+            return None
+        if kind == "next_lines":
+            result[section][field] = ", ".join(group.strip() for group in match.groups())
+        else:
+            result[section][field] = match.group(1).strip()
+
+    line_pattern = compiled["line"]
+    if line_pattern is not None:
+        for line in text.splitlines():
+            match = line_pattern.match(line)
+            if match:
+                item = {key: value.strip() for key, value in match.groupdict().items()}
+                result["details"].append(item)
+    return result
+
+
+def _validate(compiled, result):
+    if result is None:
+        return False
+    details = result["details"]
+    if compiled["line"] is not None and not details:
+        return False
+    subtotal = _to_number(result["document"].get("Subtotal") or result["header"].get("SubTotal"))
+    if subtotal is None or not details:
+        return True
+    line_sum = sum(_to_number(item.get("LineTotal")) or 0 for item in details)
+    return abs(line_sum - subtotal) <= LINE_TOLERANCE * max(1, len(details))
+
+
+def learn_template(payload):
+    # build a template from a confirmed extraction; returns the fingerprint or None
+    document = payload.get("document") or {}
+    raw_text = document.get("RawText")
+    details = payload.get("details") or []
+    if not raw_text or not details:
+        return None
+    key = fingerprint(raw_text)
+    if key is None:
+        return None
+
+    lines = raw_text.splitlines()
+    fields = []
+    constants = []
+    expected = []
+    for section in ("document", "header"):
+        for field, value in (payload.get(section) or {}).items():
+            if field in SKIP_FIELDS or value in (None, ""):
+                continue
+            rule = _learn_field(lines, field, value)
+            if rule:
+                fields.append((section, field, rule))
+                expected.append((section, field, value))
+            elif field in CONSTANT_FIELDS:
+                constants.append((section, field, value))
+
+    # keep the line pattern that reproduces the most confirmed line items
+    best = None
+    for item in details:
+        for line in lines:
+            if not any(_occurrences(line, rendered)
+                       for rendered in _renderings("ProductName", item.get("ProductName") or "")):
+                continue
+            pattern = _learn_line_pattern(line, item)
+            if not pattern:
+                continue
+            compiled_line = re.compile(pattern)
+            matched = sum(1 for text_line in lines if compiled_line.match(text_line))
+            if best is None or matched > best[0]:
+                best = (matched, pattern)
+    if best is None:
+        return None
+
+    template = {
+        "fingerprint": key,
+        "vendor": document.get("VendorName"),
+        "fields": fields,
+        "constants": constants,
+        "line_pattern": best[1],
+    }
+    compiled = _compile(template)
+    result = _run(compiled, raw_text)
+    if not _validate(compiled, result) or len(result["details"]) != len(details):
+        return None
+    for section, field, value in expected:
+        if not _same(section, field, value, result[section].get(field)):
+            return None
+    for confirmed, extracted in zip(details, result["details"]):
+        for field, value in extracted.items():
+            if not _same("details", field, confirmed.get(field), value):
+                return None
+
+    now = datetime.utcnow().isoformat()
+    with get_conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO VendorTemplates (Fingerprint, VendorName, Template, CreatedAt, UpdatedAt)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (Fingerprint) DO UPDATE SET
+                VendorName = excluded.VendorName,
+                Template = excluded.Template,
+                UpdatedAt = excluded.UpdatedAt
+            """,
+            (key, template["vendor"], json.dumps(template), now, now),
+        )
+    with _templates_lock:
+        _templates[key] = compiled
+    return key
+
+
+def learn_template_safely(payload):
+    # learning must never fail a save
+    try:
+        return learn_template(payload)
+    except Exception:
+        logger.exception("Failed to learn vendor template")
+        return None
+
+
+def _load(key):
+    compiled = _templates.get(key)
+    if compiled is not None:
+        return compiled
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT Template FROM VendorTemplates WHERE Fingerprint = ?",
+            (key,),
+        ).fetchone()
+    if row is None:
+        return None
+    compiled = _compile(json.loads(row["Template"]))
+    with _templates_lock:
+        _templates[key] = compiled
+    return compiled
+
+
+def record_llm_call(ms):
+    with _stats_lock:
+        _stats["llm_calls"] += 1
+        _stats["llm_ms"] += ms
+
+
+def apply_template(text):
+    # returns (extracted or None, meta); None means "ask the LLM"
+    start = perf_counter()
+    key = fingerprint(text)
+    compiled = _load(key) if key else None
+    result = _run(compiled, text) if compiled else None
+    hit = _validate(compiled, result) if compiled else False
+
+    with _stats_lock:
+        _stats["lookups"] += 1
+        if hit:
+            _stats["hits"] += 1
+        elif compiled:
+            _stats["fallbacks"] += 1
+        stats = dict(_stats)
+
+    avg_llm_ms = stats["llm_ms"] / stats["llm_calls"] if stats["llm_calls"] else None
+    meta = {
+        "hit": hit,
+        "fingerprint": key,
+        "matched": compiled is not None,
+        "vendor": compiled["template"].get("vendor") if compiled else None,
+        "extract_ms": round((perf_counter() - start) * 1000, 3),
+        "hit_rate": round(stats["hits"] / stats["lookups"], 4),
+        "llm_calls_saved": stats["hits"],
+        "est_ms_saved": round(stats["hits"] * avg_llm_ms, 1) if avg_llm_ms else None,
+    }
+    return (result if hit else None), meta
@@ -3,6 +3,8 @@ export default function OrdersTable({
   loading,
   error,
   onSelect,
+  hasMore,
+  onLoadMore,
 }) {
   return (
     <div className="card" style={{ animationDelay: "0.08s" }}>
@@ -39,6 +41,13 @@ export default function OrdersTable({
           </tbody>
         </table>
       )}
+      {hasMore && (
+        <div className="button-row" style={{ marginTop: "16px" }}>
+          <button className="button secondary" onClick={onLoadMore} disabled={loading}>
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -9,6 +9,16 @@ import UploadCard from "./components/UploadCard";
 const API_BASE =
   process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:5000";
 
+// only the columns OrdersTable renders
+const ORDER_LIST_FIELDS = [
+  "SalesOrderID",
+  "SalesOrderNumber",
+  "InvoiceNumber",
+  "VendorName",
+  "CustomerID",
+  "TotalDue",
+].join(",");
+
 const emptyExtraction = {
   document: {
     VendorName: "",
@@ -58,6 +68,7 @@ export default function Home() {
   const [showResults, setShowResults] = useState(false);
 
   const [orders, setOrders] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
   const [ordersLoading, setOrdersLoading] = useState(false);
   const [ordersError, setOrdersError] = useState("");
   const [selectedOrder, setSelectedOrder] = useState(null);
@@ -65,17 +76,23 @@ export default function Home() {
   const [modalLoading, setModalLoading] = useState(false);
   const [modalError, setModalError] = useState("");
 
-  const fetchOrders = async () => {
+  const fetchOrders = async (after = null) => {
     setOrdersLoading(true);
     setOrdersError("");
     try {
-      const res = await fetch(`${API_BASE}/api/orders?limit=25`);
+      const params = new URLSearchParams({ limit: "25", fields: ORDER_LIST_FIELDS });
+      if (after) {
+        params.set("after", after);
+      }
+      const res = await fetch(`${API_BASE}/api/orders?${params}`);
       const data = await res.json();
       // console.log(data);
       if (!res.ok) {
         throw new Error(data.error || "Failed to load orders.");
       }
-      setOrders(data || []);
+      const page = data.orders || [];
+      setOrders((current) => (after ? [...current, ...page] : page));
+      setOrdersCursor(data.next_cursor || null);
     } catch (error) {
       setOrdersError(error.message);
     } finally {
@@ -92,24 +109,69 @@ export default function Home() {
       setStatus({ loading: false, message: "Pick a file to extract." });
       return;
     }
-    setStatus({ loading: true, message: "Running extraction..." });
+    setStatus({ loading: true, message: "Uploading..." });
     const formData = new FormData();
     formData.append("file", file);
+    // fields fill in as the model writes them; the final result replaces them
+    const applyEvent = (event, data) => {
+      if (event === "text") {
+        setStatus({ loading: true, message: "Reading invoice..." });
+      } else if (event === "field") {
+        setShowResults(true);
+        updateSection(data.section, data.name, data.value ?? "");
+      } else if (event === "line_item") {
+        setExtraction((prev) => {
+          const base = prev || emptyExtraction;
+          const nextDetails = [...(base.details || [])];
+          nextDetails[data.index] = data.item;
+          return { ...base, details: nextDetails };
+        });
+      } else if (event === "tokens") {
+        setStatus({ loading: true, message: `Extracting... ${data.tokens} tokens` });
+      } else if (event === "result") {
+        setExtraction(data);
+        setShowResults(true);
+        const runtime = data.meta?.processing_ms
+          ? `${data.meta.processing_ms}ms`
+          : "";
+        setStatus({ loading: false, message: `Extraction complete ${runtime}` });
+      } else if (event === "error") {
+        throw new Error(data.error || "Extraction failed.");
+      }
+    };
     try {
-      const res = await fetch(`${API_BASE}/api/extract`, {
+      setExtraction(null);
+      const res = await fetch(`${API_BASE}/api/extract/stream`, {
         method: "POST",
         body: formData,
       });
-      const data = await res.json();
       if (!res.ok) {
+        const data = await res.json();
         throw new Error(data.error || "Extraction failed.");
       }
-      setExtraction(data);
-      setShowResults(true);
-      const runtime = data.meta?.processing_ms
-        ? `${data.meta.processing_ms}ms`
-        : "";
-      setStatus({ loading: false, message: `Extraction complete ${runtime}` });
+      const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+          break;
+        }
+        buffer += value;
+        const messages = buffer.split("\n\n");
+        buffer = messages.pop();
+        for (const message of messages) {
+          let event = "message";
+          let data = "";
+          for (const line of message.split("\n")) {
+            if (line.startsWith("event:")) {
+              event = line.slice(6).trim();
+            } else if (line.startsWith("data:")) {
+              data += line.slice(5);
+            }
+          }
+          applyEvent(event, JSON.parse(data || "null"));
+        }
+      }
     } catch (error) {
       setStatus({ loading: false, message: error.message });
     }
@@ -252,6 +314,8 @@ export default function Home() {
           loading={ordersLoading}
           error={ordersError}
           onSelect={openOrder}
+          hasMore={Boolean(ordersCursor)}
+          onLoadMore={() => fetchOrders(ordersCursor)}
         />
       </section>
 